@@ -1,8 +1,17 @@
 from __future__ import annotations
 
 import argparse
-import os
+import asyncio
+import json
 import sys
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+from app.envfiles import load_layered_env  # noqa: E402
+from app.netprobe import parse_port, tcp_connect_latency  # noqa: E402
 
 MODES = {
     "local-dev": {
@@ -40,19 +49,25 @@ MODES = {
 }
 
 
-def check_mode(mode: str) -> int:
+# TCP endpoints to probe per mode: (host var, port var, default port).
+PROBES = {
+    "server-ops": ("LUNAVERSE_HOST", "LUNAVERSE_SSH_PORT", 22),
+    "db-local": ("POSTGRES_HOST", "POSTGRES_PORT", 5432),
+    "db-do": ("DO_PG_HOST", "DO_PG_PORT", 25060),
+}
+
+
+def missing_vars(mode: str, env: Mapping[str, str]) -> list[str]:
+    return [v for v in MODES[mode]["required"] if not env.get(v, "").strip()]
+
+
+def check_mode(mode: str, env: Mapping[str, str] | None = None) -> int:
     if mode not in MODES:
         print(f"Unknown mode: {mode}", file=sys.stderr)
         print(f"Available modes: {', '.join(MODES.keys())}", file=sys.stderr)
         return 2
 
-    config = MODES[mode]
-    missing = []
-
-    for var_name in config["required"]:
-        value = os.getenv(var_name, "").strip()
-        if not value:
-            missing.append(var_name)
+    missing = missing_vars(mode, load_layered_env() if env is None else env)
 
     if missing:
         print(f"Missing required environment variables for mode '{mode}':", file=sys.stderr)
@@ -64,17 +79,103 @@ def check_mode(mode: str) -> int:
     return 0
 
 
+async def _probe(mode: str, host: str, port_text: str, timeout: float) -> dict:
+    result = {"mode": mode, "host": host, "port": port_text, "ok": False, "latency_ms": None}
+    try:
+        port = parse_port(port_text)
+    except ValueError:
+        result["error"] = f"invalid port {port_text!r}"
+        return result
+    result["port"] = port
+    try:
+        latency = await asyncio.wait_for(tcp_connect_latency(host, port), timeout)
+    except TimeoutError:
+        result["error"] = f"timed out after {timeout:g}s"
+    except OSError as exc:
+        result["error"] = exc.strerror or str(exc)
+    else:
+        result["ok"] = True
+        result["latency_ms"] = round(latency * 1000, 2)
+    return result
+
+
+async def probe_modes(modes: list[str], env: Mapping[str, str], timeout: float) -> list[dict]:
+    """TCP-connect to every configured endpoint of ``modes`` concurrently.
+
+    Endpoints whose host variable is unset are skipped (the variable check
+    reports them). Total time is bounded by the slowest probe, not the sum.
+    """
+    probes = []
+    for mode in modes:
+        if mode not in PROBES:
+            continue
+        host_var, port_var, default_port = PROBES[mode]
+        host = env.get(host_var, "").strip()
+        if host:
+            port = env.get(port_var, "").strip() or str(default_port)
+            probes.append(_probe(mode, host, port, timeout))
+    return list(await asyncio.gather(*probes))
+
+
+def print_probe_table(results: list[dict]) -> None:
+    if not results:
+        print("No endpoints configured to probe")
+        return
+    endpoints = [f"{r['host']}:{r['port']}" for r in results]
+    width = max(len("ENDPOINT"), *(len(e) for e in endpoints))
+    print(f"{'MODE':<12} {'ENDPOINT':<{width}} {'STATUS':<6} {'LATENCY':>10}  DETAIL")
+    for r, endpoint in zip(results, endpoints, strict=True):
+        status = "ok" if r["ok"] else "FAIL"
+        latency = f"{r['latency_ms']:.2f} ms" if r["ok"] else "-"
+        detail = r.get("error", "")
+        print(f"{r['mode']:<12} {endpoint:<{width}} {status:<6} {latency:>10}  {detail}".rstrip())
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(
         description="Check that required environment variables are set for a given mode"
     )
     ap.add_argument(
         "mode",
-        choices=list(MODES.keys()),
-        help=f"Mode to check: {', '.join(MODES.keys())}",
+        choices=[*MODES.keys(), "all"],
+        help=f"Mode to check: {', '.join(MODES.keys())}, or all",
+    )
+    ap.add_argument(
+        "--probe",
+        action="store_true",
+        help="Also TCP-connect to the mode's hosts concurrently and report latency",
     )
+    ap.add_argument(
+        "--timeout", type=float, default=3.0, help="Per-probe timeout in seconds (default 3)"
+    )
+    ap.add_argument("--json", action="store_true", help="Print a JSON report instead of text")
     args = ap.parse_args()
-    return check_mode(args.mode)
+
+    modes = list(MODES) if args.mode == "all" else [args.mode]
+    env = load_layered_env()
+    probes: list[dict] = []
+    elapsed_ms = 0.0
+    if args.probe:
+        start = time.perf_counter()
+        probes = asyncio.run(probe_modes(modes, env, args.timeout))
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    if args.json:
+        missing = {mode: missing_vars(mode, env) for mode in modes}
+        report = {"missing": missing, "probes": probes}
+        if args.probe:
+            report["probe_elapsed_ms"] = elapsed_ms
+        print(json.dumps(report, indent=2))
+        rc = 2 if any(missing.values()) else 0
+    else:
+        rc = max(check_mode(mode, env) for mode in modes)
+        if args.probe:
+            print_probe_table(probes)
+            print(f"Probed {len(probes)} endpoint(s) in {elapsed_ms:.2f} ms")
+
+    if rc == 0 and any(not p["ok"] for p in probes):
+        return 1
+    return rc
 
 
 if __name__ == "__main__":
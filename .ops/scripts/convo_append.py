@@ -1,10 +1,28 @@
 from __future__ import annotations
 
+import shutil
 import sys
 from datetime import datetime
 from pathlib import Path
 
 
+def _stamp() -> str:
+    return f"\n\n[{datetime.now().isoformat()}] APPEND\n"
+
+
+def append_text(log_path: Path, content: str) -> None:
+    with open(log_path, "a", encoding="utf-8") as log:
+        log.write(_stamp() + content + "\n")
+
+
+def append_file(log_path: Path, source: Path) -> None:
+    """Append ``source`` to the log in chunks, without reading either file whole."""
+    with open(log_path, "ab") as log, open(source, "rb") as src:
+        log.write(_stamp().encode("utf-8"))
+        shutil.copyfileobj(src, log)
+        log.write(b"\n")
+
+
 def main() -> int:
     if len(sys.argv) < 3:
         print(
@@ -21,13 +39,9 @@ def main() -> int:
 
     source = sys.argv[2]
     if source == "-":
-        content = sys.stdin.read()
+        append_text(log_path, sys.stdin.read())
     else:
-        content = Path(source).read_text(encoding="utf-8", errors="ignore")
-
-    stamp = f"\n\n[{datetime.now().isoformat()}] APPEND\n"
-    existing = log_path.read_text(encoding="utf-8")
-    log_path.write_text(existing + stamp + content + "\n", encoding="utf-8")
+        append_file(log_path, Path(source))
     print(f"Appended to {log_path}")
     return 0
 
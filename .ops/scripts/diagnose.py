@@ -1,23 +1,519 @@
+"""Capture a failing command's output and environment, and record it in the Error KB.
+
+Everything runs in this one interpreter:
+
+- the environment fingerprint (JSON; see ``fingerprint_env.py``) is taken
+  on a worker thread while the command runs;
+- the command's output is copied to the failure file in fixed-size chunks
+  (so memory stays bounded however much it prints), optionally teed to the
+  terminal;
+- with ``--timeout`` the command's whole process group is terminated, then
+  killed;
+- KB recording and the convo-log append are plain function calls.
+
+For intermittent failures, ``--repeat N --jobs J`` runs the command N
+times, J at a time, each with its own temp dir (``TMPDIR``) and
+``DIAGNOSE_RUN`` index. It reports the pass rate, exit codes and wall-time
+percentiles, and groups the failing outputs by Error KB signature: each
+distinct failure mode is recorded once, with one occurrence per run that hit it.
+
+Every run also records the resource usage of the command's whole process
+tree (see ``proc_usage.py``). ``--profile`` samples the stacks of every
+Python process in the tree (see ``pyprofile/sitecustomize.py``); the
+collapsed stacks feed flamegraph.pl or speedscope. Both are written next
+to the failure output and into the KB case: usage is appended to the
+case's ``resources.json`` and the profile is kept as ``profile.collapsed``.
+
+``--bisect GOOD..BAD`` finds the commit that broke the command. Candidate
+commits are tested in parallel, one process-pool worker per ``git worktree``
+checkout, and the range narrows by k-ary search (see ``git_bisect.py``).
+Every verdict and output is cached by commit hash under
+``.ops/logs/bisect/``, so a rerun only tests commits it has not seen
+(timed-out runs are not cached). The
+first bad commit's output is recorded as a KB case, with the bisection
+in its ``bisect.json``.
+
+Usage:
+    python .ops/scripts/diagnose.py --cmd "pytest -q tests/test_x.py" [--tee] [--timeout 600]
+    python .ops/scripts/diagnose.py --cmd "pytest -q tests/test_x.py" --repeat 50 --jobs 8
+    python .ops/scripts/diagnose.py --cmd "python -m app.slow_job" --profile
+    python .ops/scripts/diagnose.py --cmd "pytest -q tests/test_x.py" --bisect v1.2.0..HEAD
+"""
+
 from __future__ import annotations
 
 import argparse
+import json
+import os
+import selectors
+import shutil
+import signal
 import subprocess
 import sys
-from datetime import datetime
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import AbstractContextManager
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
 from pathlib import Path
+from typing import BinaryIO
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import convo_append  # noqa: E402
+import fingerprint_env  # noqa: E402
+import git_bisect  # noqa: E402
+import record_failure  # noqa: E402
+from kb_ingest import digest_file  # noqa: E402
+from kb_store import journal_lock  # noqa: E402
+from proc_usage import ResourceUsage, TreeSampler, format_usage, reap, wait_exited  # noqa: E402
 
 LOG_DIR = Path(".ops/logs")
+CHUNK_SIZE = 64 * 1024
+KILL_GRACE = 2.0  # seconds between SIGTERM and SIGKILL
+TIMEOUT_EXIT = 124  # same as coreutils timeout(1)
+SAMPLE_EVERY = 0.2  # seconds between /proc scans of the process tree
+PROFILER_DIR = Path(__file__).resolve().parent / "pyprofile"
+MAX_RESOURCE_RECORDS = 50  # per case, most recent kept
+
+
+@dataclass(frozen=True)
+class CommandRun:
+    exit_code: int
+    bytes: int
+    seconds: float
+    timed_out: bool
+    usage: ResourceUsage
 
 
-def run_capture(cmd: str) -> tuple[int, str]:
-    p = subprocess.run(
+@dataclass(frozen=True)
+class RepeatRun:
+    index: int
+    run: CommandRun
+    output: Path
+    sig: str | None  # Error KB signature of the output, for failing runs
+
+
+def fingerprint_json() -> str:
+    """The environment fingerprint as JSON, the form stored in the KB and diffed."""
+    return json.dumps(fingerprint_env.fingerprint_data(), indent=2) + "\n"
+
+
+def kill_tree(proc: subprocess.Popen, grace: float = KILL_GRACE) -> None:
+    """SIGTERM the command's process group, then SIGKILL whatever is left after ``grace``."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        # Leave the shell unreaped so its resource usage can still be collected.
+        if wait_exited(proc.pid, grace):
+            try:
+                # The shell is gone; make sure no grandchild survived it.
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            return
+
+
+def stream_command(
+    cmd: str,
+    out: BinaryIO,
+    tee: BinaryIO | None = None,
+    timeout: float | None = None,
+    env: dict[str, str] | None = None,
+    cwd: str | Path | None = None,
+) -> CommandRun:
+    """Run ``cmd`` in a shell, copying stdout+stderr to ``out`` (and ``tee``) as it arrives.
+
+    The command gets its own process group (so a timeout reaches every
+    process it started, and ``/proc`` sampling can find them) and no stdin.
+    """
+    start = time.monotonic()
+    deadline = start + timeout if timeout else None
+    proc = subprocess.Popen(
         cmd,
         shell=True,
-        text=True,
+        stdin=subprocess.DEVNULL,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
+        start_new_session=True,
+        env=env,
+        cwd=cwd,
+    )
+    assert proc.stdout is not None
+    fd = proc.stdout.fileno()
+    total = 0
+    timed_out = False
+    sampler = TreeSampler(proc.pid)
+    next_sample = start
+    try:
+        with selectors.DefaultSelector() as sel:
+            sel.register(fd, selectors.EVENT_READ)
+            while True:
+                now = time.monotonic()
+                if now >= next_sample and not timed_out:
+                    sampler.sample()
+                    next_sample = now + SAMPLE_EVERY
+                if deadline is not None and now >= deadline:
+                    if timed_out:
+                        break  # a process outside the group still holds the pipe
+                    timed_out = True
+                    kill_tree(proc)
+                    deadline = time.monotonic() + KILL_GRACE  # drain output written so far
+                    continue
+                wait = next_sample - now if not timed_out else None
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                if not sel.select(wait):
+                    continue
+                chunk = os.read(fd, CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                out.write(chunk)
+                if tee is not None:
+                    tee.write(chunk)
+                    tee.flush()
+    except BaseException:
+        kill_tree(proc, grace=0)
+        raise
+    finally:
+        proc.stdout.close()
+    usage = reap(proc, start, sampler)
+    return CommandRun(
+        TIMEOUT_EXIT if timed_out else proc.returncode, total, usage.wall_s, timed_out, usage
+    )
+
+
+def resource_record(cmd: str, run: CommandRun, profile: str | None = None) -> dict:
+    return {
+        "captured_at": datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "command": cmd,
+        "exit_code": run.exit_code,
+        "timed_out": run.timed_out,
+        "output_bytes": run.bytes,
+        "usage": run.usage.to_dict(),
+        "profile": profile,
+    }
+
+
+def case_lock(case_dir: Path) -> AbstractContextManager[None]:
+    """The journal lock of the KB that ``case_dir`` (``<kb>/cases/<sig>``) belongs to.
+
+    Everything that writes case files holds it, kb-compact included.
+    """
+    return journal_lock(case_dir.parent.parent)
+
+
+def save_resources(case_dir: Path, records: list[dict]) -> None:
+    """Append ``records`` to the case's ``resources.json`` (a JSON list, newest last)."""
+    path = case_dir / "resources.json"
+    with case_lock(case_dir):
+        existing = json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+        merged = (existing + records)[-MAX_RESOURCE_RECORDS:]
+        path.write_text(json.dumps(merged, indent=2) + "\n", encoding="utf-8")
+
+
+def profile_env(profile_dir: Path, interval: float) -> dict[str, str]:
+    """Environment that makes every Python process in the tree sample itself."""
+    pythonpath = os.environ.get("PYTHONPATH")
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(PROFILER_DIR), pythonpath])),
+        "DIAGNOSE_PROFILE_DIR": str(profile_dir),
+        "DIAGNOSE_PROFILE_INTERVAL": str(interval),
+    }
+
+
+def merge_profiles(profile_dir: Path, out: Path) -> int:
+    """Merge per-process collapsed stacks into ``out``; return the number of samples."""
+    counts: Counter[str] = Counter()
+    for path in profile_dir.glob("*.collapsed"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, n = line.rstrip("\n").rpartition(" ")
+                if stack and n.isdigit():
+                    counts[stack] += int(n)
+    if counts:
+        with open(out, "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+    return sum(counts.values())
+
+
+def run_isolated(cmd: str, index: int, root: Path, timeout: float | None = None) -> RepeatRun:
+    """Run ``cmd`` once with a private temp dir under ``root``; output goes to ``root``."""
+    run_dir = root / f"run{index:04d}"
+    tmp = run_dir / "tmp"
+    tmp.mkdir(parents=True)
+    env = {
+        **os.environ,
+        "TMPDIR": str(tmp),
+        "TMP": str(tmp),
+        "TEMP": str(tmp),
+        "DIAGNOSE_RUN": str(index),
+    }
+    output = run_dir / "output.txt"
+    with open(output, "wb") as out:
+        run = stream_command(cmd, out, timeout=timeout, env=env)
+    shutil.rmtree(tmp, ignore_errors=True)
+    # The streaming digest hashes to the same value as signature_from_text.
+    sig = digest_file(output).sig if run.exit_code != 0 else None
+    return RepeatRun(index, run, output, sig)
+
+
+def repeat_command(
+    cmd: str, repeat: int, jobs: int, root: Path, timeout: float | None = None
+) -> list[RepeatRun]:
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(lambda i: run_isolated(cmd, i, root, timeout), range(repeat)))
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile (``q`` in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+def failure_modes(runs: list[RepeatRun]) -> list[tuple[str, list[RepeatRun]]]:
+    """Failing runs grouped by signature, most frequent first."""
+    groups: dict[str, list[RepeatRun]] = {}
+    for r in runs:
+        if r.sig is not None:
+            groups.setdefault(r.sig, []).append(r)
+    return sorted(groups.items(), key=lambda item: (-len(item[1]), item[1][0].index))
+
+
+def summarize(runs: list[RepeatRun]) -> list[str]:
+    failed = sum(1 for r in runs if r.run.exit_code != 0)
+    codes = Counter(r.run.exit_code for r in runs)
+    times = [r.run.seconds for r in runs]
+    cpu = [r.run.usage.user_s + r.run.usage.sys_s for r in runs]
+    rss = [r.run.usage.max_rss_kb / 1024 for r in runs]
+    return [
+        f"[diagnose] runs:    {len(runs)}, {len(runs) - failed} passed, {failed} failed "
+        f"({100 * failed / len(runs):.1f}% failure rate)",
+        "[diagnose] exits:   " + ", ".join(f"{c} x{n}" for c, n in sorted(codes.items())),
+        "[diagnose] wall:    "
+        + "  ".join(f"p{q} {percentile(times, q):.2f}s" for q in (50, 90, 99))
+        + f"  max {max(times):.2f}s",
+        "[diagnose] cpu:     "
+        + "  ".join(f"p{q} {percentile(cpu, q):.2f}s" for q in (50, 90, 99))
+        + f"  max {max(cpu):.2f}s",
+        f"[diagnose] maxrss:  p50 {percentile(rss, 50):.1f} MiB  max {max(rss):.1f} MiB",
+    ]
+
+
+def _append_convo(convo_log: str, source: Path) -> None:
+    log_path = Path(convo_log)
+    if log_path.exists():
+        convo_append.append_file(log_path, source)
+        print(f"Appended to {log_path}")
+    else:
+        print(f"Log not found: {log_path}")
+        print("[diagnose] WARNING: failed to append to convo log")
+
+
+def main_repeat(args: argparse.Namespace, ts: str, started: float) -> int:
+    jobs = args.jobs or min(args.repeat, os.cpu_count() or 1)
+    fingerprint_path = LOG_DIR / f"{ts}__env_fingerprint.json"
+    root = Path(tempfile.mkdtemp(prefix="diagnose-"))
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            fingerprint = pool.submit(fingerprint_json)
+            runs = repeat_command(args.cmd, args.repeat, jobs, root, timeout=args.timeout)
+            fp_text = fingerprint.result()
+        elapsed = time.monotonic() - started
+        fingerprint_path.write_text(fp_text, encoding="utf-8")
+        resources_path = LOG_DIR / f"{ts}__resources.json"
+        records = [resource_record(args.cmd, r.run) for r in runs]
+        resources_path.write_text(json.dumps(records, indent=2) + "\n", encoding="utf-8")
+
+        print(f"[diagnose] env:     {fingerprint_path}")
+        print(f"[diagnose] usage:   {resources_path}")
+        for line in summarize(runs):
+            print(line)
+        modes = failure_modes(runs)
+        if modes:
+            print(f"[diagnose] failure modes: {len(modes)}")
+
+        kb_code = 0
+        for sig, group in modes:
+            failure_path = LOG_DIR / f"{ts}__failure_output_{sig}.txt"
+            shutil.move(group[0].output, failure_path)
+            codes = ", ".join(str(c) for c in sorted({r.run.exit_code for r in group}))
+            try:
+                recorded = record_failure.record(
+                    failure_path, env_fingerprint=fp_text, occurrences=len(group)
+                )
+            except Exception as exc:
+                print(f"[diagnose] ERROR: failed to record failure in the KB: {exc}")
+                kb_code = 1
+                continue
+            save_resources(recorded.case_dir, [records[r.index] for r in group])
+            print(
+                f"  {len(group)}x  {recorded.sig}  exit {codes}  -> {recorded.case_dir} "
+                f"(occurrence {recorded.stats.count}); output {failure_path}"
+            )
+            if args.convo_log:
+                _append_convo(args.convo_log, failure_path)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"[diagnose] time:    {elapsed:.2f}s for {len(runs)} runs ({jobs} at a time)")
+    return kb_code
+
+
+def test_commit(
+    worktree: str, sha: str, cmd: str, output: str, timeout: float | None = None
+) -> CommandRun:
+    """Check out ``sha`` in ``worktree`` and run ``cmd`` there; runs in a worker process."""
+    git_bisect.checkout(worktree, sha)
+    tmp = Path(f"{worktree}.tmp")  # outside the checkout, so `git clean` leaves it alone
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    env = {
+        **os.environ,
+        "TMPDIR": str(tmp),
+        "TMP": str(tmp),
+        "TEMP": str(tmp),
+        "DIAGNOSE_COMMIT": sha,
+    }
+    partial = f"{output}.part"
+    with open(partial, "wb") as out:
+        run = stream_command(cmd, out, timeout=timeout, env=env, cwd=worktree)
+    os.replace(partial, output)
+    shutil.rmtree(tmp, ignore_errors=True)
+    return run
+
+
+def bisect_commits(
+    args: argparse.Namespace, repo: str, cache: git_bisect.BisectCache, jobs: int
+) -> git_bisect.BisectResult:
+    good, commits = git_bisect.commit_range(args.bisect, repo)
+    print(f"[diagnose] bisect:  {len(commits)} commit(s) after {good[:12]}, {jobs} at a time")
+    counts: Counter[str] = Counter()
+    root = tempfile.mkdtemp(prefix="diagnose-bisect-")
+    cache.output(good).parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with git_bisect.Worktrees(root, repo) as trees, ProcessPoolExecutor(jobs) as pool:
+
+            def test(shas: list[str]) -> dict[str, str]:
+                verdicts = {}
+                todo = []
+                for sha in shas:
+                    entry = cache.get(sha)
+                    if entry is None:
+                        todo.append(sha)
+                        continue
+                    verdicts[sha] = entry["verdict"]
+                    counts["cached"] += 1
+                    print(f"  {entry['verdict']:4}  {git_bisect.subject(sha, repo)}  (cached)")
+                futures = {
+                    pool.submit(
+                        test_commit,
+                        str(trees.slot(i, sha)),
+                        sha,
+                        args.cmd,
+                        str(cache.output(sha)),
+                        args.timeout,
+                    ): sha
+                    for i, sha in enumerate(todo)
+                }
+                for future in as_completed(futures):
+                    sha = futures[future]
+                    run = future.result()
+                    verdict = git_bisect.verdict(run.exit_code)
+                    record = resource_record(args.cmd, run) | {"commit": sha}
+                    # A timeout says nothing about the commit under a longer --timeout.
+                    cache.put(
+                        sha,
+                        {"exit_code": run.exit_code, "verdict": verdict, **record},
+                        persist=not run.timed_out,
+                    )
+                    verdicts[sha] = verdict
+                    counts["tested"] += 1
+                    print(
+                        f"  {verdict:4}  {git_bisect.subject(sha, repo)}  "
+                        f"(exit {run.exit_code}, {run.seconds:.1f}s)"
+                    )
+                return verdicts
+
+            first_bad, rounds, skipped = git_bisect.kary_bisect(good, commits, test, jobs)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return git_bisect.BisectResult(
+        good=good,
+        bad=commits[-1],
+        first_bad=first_bad,
+        rounds=rounds,
+        tested=counts["tested"],
+        cached=counts["cached"],
+        skipped=[sha for sha in commits if sha in skipped],
+        ambiguous=git_bisect.ambiguous_before(first_bad, commits, skipped),
+    )
+
+
+def main_bisect(args: argparse.Namespace, ts: str, started: float) -> int:
+    jobs = args.jobs or os.cpu_count() or 1
+    fingerprint_path = LOG_DIR / f"{ts}__env_fingerprint.json"
+    failure_path = LOG_DIR / f"{ts}__failure_output.txt"
+    try:
+        repo = git_bisect.git("rev-parse", "--show-toplevel")
+        cache = git_bisect.BisectCache(LOG_DIR / "bisect", args.cmd)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            fingerprint = pool.submit(fingerprint_json)
+            result = bisect_commits(args, repo, cache, jobs)
+            fp_text = fingerprint.result()
+    except git_bisect.BisectError as exc:
+        print(f"[diagnose] ERROR: bisect failed: {exc}")
+        return 1
+    fingerprint_path.write_text(fp_text, encoding="utf-8")
+    shutil.copyfile(cache.output(result.first_bad), failure_path)
+    first_bad = git_bisect.subject(result.first_bad, repo)
+
+    print(f"[diagnose] env:     {fingerprint_path}")
+    print(f"[diagnose] failure: {failure_path}")
+    print(f"[diagnose] first bad commit: {first_bad}")
+    if result.ambiguous:
+        print(f"[diagnose]   or one of {len(result.ambiguous)} untestable commit(s) before it:")
+        for sha in result.ambiguous:
+            print(f"    {git_bisect.subject(sha, repo)}")
+    print(
+        f"[diagnose] rounds:  {result.rounds}, {result.tested} commit(s) tested, "
+        f"{result.cached} cached, {len(result.skipped)} skipped"
     )
-    return p.returncode, p.stdout
+
+    kb_code = 0
+    try:
+        recorded = record_failure.record(failure_path, env_fingerprint=fp_text)
+        bisect = {
+            "captured_at": datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "command": args.cmd,
+            "range": args.bisect,
+            "first_bad_subject": first_bad.split(" ", 1)[-1],
+            **asdict(result),
+        }
+        entry = cache.get(result.first_bad) or {}
+        record = {k: v for k, v in entry.items() if k not in ("cmd", "at", "verdict")}
+        with case_lock(recorded.case_dir):
+            (recorded.case_dir / "bisect.json").write_text(
+                json.dumps(bisect, indent=2) + "\n", encoding="utf-8"
+            )
+            save_resources(recorded.case_dir, [record])
+        record_failure.report(recorded)
+    except Exception as exc:
+        print(f"[diagnose] ERROR: failed to record failure in the KB: {exc}")
+        kb_code = 1
+
+    if args.convo_log:
+        _append_convo(args.convo_log, failure_path)
+
+    print(f"[diagnose] time:    {time.monotonic() - started:.2f}s")
+    return kb_code
 
 
 def main() -> int:
@@ -28,40 +524,104 @@ def main() -> int:
         default=None,
         help="Optional path to a raw conversation log to append to",
     )
+    ap.add_argument("--tee", action="store_true", help="Also stream the output to the terminal")
+    ap.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help=f"Kill the command and everything it started after N seconds (exit {TIMEOUT_EXIT})",
+    )
+    ap.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Run the command N times to characterize an intermittent failure",
+    )
+    ap.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Concurrent runs with --repeat or --bisect (default: CPU count)",
+    )
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="Sample the stacks of Python processes in the command (collapsed-stack output)",
+    )
+    ap.add_argument(
+        "--profile-interval",
+        type=float,
+        default=0.01,
+        help="Seconds between profile samples (default 0.01)",
+    )
+    ap.add_argument(
+        "--bisect",
+        metavar="GOOD..BAD",
+        default=None,
+        help="Find the first commit in GOOD..BAD where the command fails",
+    )
     args = ap.parse_args()
+    if args.repeat < 1:
+        ap.error("--repeat must be at least 1")
+    if args.repeat > 1 and (args.tee or args.profile):
+        ap.error("--tee and --profile cannot be combined with --repeat")
+    if args.bisect and (args.repeat > 1 or args.tee or args.profile):
+        ap.error("--bisect cannot be combined with --repeat, --tee or --profile")
 
+    started = time.monotonic()
     LOG_DIR.mkdir(parents=True, exist_ok=True)
 
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    fingerprint_path = LOG_DIR / f"{ts}__env_fingerprint.txt"
+    if args.repeat > 1:
+        return main_repeat(args, ts, started)
+    if args.bisect:
+        return main_bisect(args, ts, started)
+    fingerprint_path = LOG_DIR / f"{ts}__env_fingerprint.json"
     failure_path = LOG_DIR / f"{ts}__failure_output.txt"
+    resources_path = LOG_DIR / f"{ts}__resources.json"
+    profile_path = LOG_DIR / f"{ts}__profile.collapsed"
 
-    fp_cmd = f"{sys.executable} .ops/scripts/fingerprint_env.py"
-    _, fp_out = run_capture(fp_cmd)
-    fingerprint_path.write_text(fp_out, encoding="utf-8")
-
-    code, out = run_capture(args.cmd)
-    failure_path.write_text(out, encoding="utf-8")
+    with tempfile.TemporaryDirectory(prefix="diagnose-profile-") as profile_dir:
+        env = profile_env(Path(profile_dir), args.profile_interval) if args.profile else None
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            fingerprint = pool.submit(fingerprint_json)
+            with open(failure_path, "wb") as out:
+                tee = sys.stdout.buffer if args.tee else None
+                run = stream_command(args.cmd, out, tee=tee, timeout=args.timeout, env=env)
+            fp_text = fingerprint.result()
+        samples = merge_profiles(Path(profile_dir), profile_path) if args.profile else 0
+    fingerprint_path.write_text(fp_text, encoding="utf-8")
+    resources = resource_record(args.cmd, run, profile="profile.collapsed" if samples else None)
+    resources_path.write_text(json.dumps(resources, indent=2) + "\n", encoding="utf-8")
 
     print(f"[diagnose] env:     {fingerprint_path}")
     print(f"[diagnose] failure: {failure_path}")
-    print(f"[diagnose] exit:    {code}")
+    print(f"[diagnose] exit:    {run.exit_code}" + (" (timed out)" if run.timed_out else ""))
+    print(f"[diagnose] usage:   {format_usage(run.usage)}")
+    if args.profile:
+        if samples:
+            print(f"[diagnose] profile: {profile_path} ({samples} samples)")
+        else:
+            print("[diagnose] profile: no Python samples collected")
 
-    kb_cmd = f"{sys.executable} .ops/scripts/record_failure.py {failure_path}"
-    kb_code, kb_out = run_capture(kb_cmd)
-    print(kb_out.strip())
+    kb_code = 0
+    try:
+        recorded = record_failure.record(failure_path, env_fingerprint=fp_text)
+        with case_lock(recorded.case_dir):
+            save_resources(recorded.case_dir, [resources])
+            if samples:
+                shutil.copyfile(profile_path, recorded.case_dir / "profile.collapsed")
+        record_failure.report(recorded)
+    except Exception as exc:
+        print(f"[diagnose] ERROR: failed to record failure in the KB: {exc}")
+        kb_code = 1
 
     if args.convo_log:
-        append_cmd = (
-            f"{sys.executable} .ops/scripts/convo_append.py "
-            f"{args.convo_log} {failure_path}"
-        )
-        a_code, a_out = run_capture(append_cmd)
-        print(a_out.strip())
-        if a_code != 0:
-            print("[diagnose] WARNING: failed to append to convo log")
-
-    return 0 if kb_code == 0 else kb_code
+        _append_convo(args.convo_log, failure_path)
+
+    overhead = time.monotonic() - started - run.seconds
+    print(f"[diagnose] time:    command {run.seconds:.2f}s, overhead {overhead * 1000:.0f} ms")
+    return kb_code
 
 
 if __name__ == "__main__":
@@ -1,21 +1,217 @@
+"""Fingerprint the toolchain: Python, platform and the versions of the dev tools.
+
+The tool probes run concurrently, each with a timeout. A probe's output is
+cached in ``.ops/logs/fingerprint_cache.json``. The cache key is the
+probe's command, the resolved path, mtime and size of its binary (for
+``python -m`` probes, also of the module), and ``PATH``. An unchanged tool is
+never executed again; upgrading, reinstalling or re-pointing ``PATH``
+invalidates it. Failed and timed-out probes are not cached.
+
+Usage:
+    python .ops/scripts/fingerprint_env.py [--json] [--no-cache] [--timeout 10]
+    python .ops/scripts/fingerprint_env.py --diff OLD NEW   # text or JSON fingerprints
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
 import platform
+import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+CACHE_PATH = Path(".ops/logs/fingerprint_cache.json")
+PROBE_TIMEOUT = 10.0
+NOT_AVAILABLE = "n/a"
+
+
+@dataclass(frozen=True)
+class Probe:
+    name: str
+    argv: tuple[str, ...]
+    module: str | None = None  # for ``python -m`` probes: the module that decides the version
+
+
+PROBES = (
+    Probe("pip", (sys.executable, "-m", "pip", "--version"), module="pip"),
+    Probe("ruff", ("ruff", "--version")),
+    Probe("pytest", ("pytest", "--version")),
+    Probe("pyright", ("pyright", "--version")),
+    Probe("node", ("node", "--version")),
+    Probe("pnpm", ("pnpm", "--version")),
+    Probe("git", ("git", "--version")),
+)
+
+
+def _stat(path: str | None) -> list:
+    if path is None:
+        return [None, None, None]
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [path, None, None]
+    return [path, st.st_mtime_ns, st.st_size]
+
+
+def cache_key(probe: Probe) -> tuple[str, bool]:
+    """Return ``(key, found)`` for ``probe``; ``found`` is False if its binary is missing."""
+    binary = shutil.which(probe.argv[0])
+    resolved = os.path.realpath(binary) if binary else None
+    parts = [list(probe.argv), _stat(resolved), os.environ.get("PATH", "")]
+    if probe.module:
+        spec = importlib.util.find_spec(probe.module)
+        parts.append(_stat(spec.origin if spec else None))
+    key = hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+    return key, resolved is not None
+
+
+def run(cmd: list[str] | tuple[str, ...], timeout: float = PROBE_TIMEOUT) -> tuple[str, bool]:
+    """Run one probe; return ``(output, cacheable)``."""
+    try:
+        out = subprocess.run(
+            cmd, capture_output=True, text=True, timeout=timeout, stdin=subprocess.DEVNULL
+        )
+    except FileNotFoundError:
+        return NOT_AVAILABLE, True
+    except subprocess.TimeoutExpired:
+        return f"{NOT_AVAILABLE} (timed out after {timeout:g}s)", False
+    except OSError:
+        return NOT_AVAILABLE, False
+    if out.returncode != 0:
+        return NOT_AVAILABLE, False
+    return out.stdout.strip(), True
+
+
+def _load_cache(path: Path) -> dict[str, str]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
 
 
-def run(cmd: list[str]) -> str:
+def _save_cache(path: Path, cache: dict[str, str]) -> None:
     try:
-        return subprocess.check_output(cmd, text=True).strip()
-    except Exception:
-        return "n/a"
-
-
-print("python_version:", sys.version.replace("\n", " "))
-print("platform:", platform.platform())
-print("pip:", run([sys.executable, "-m", "pip", "--version"]))
-print("ruff:", run(["ruff", "--version"]))
-print("pytest:", run(["pytest", "--version"]))
-print("pyright:", run(["pyright", "--version"]))
-print("node:", run(["node", "--version"]))
-print("pnpm:", run(["pnpm", "--version"]))
-print("git:", run(["git", "--version"]))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(cache, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass  # a read-only checkout still gets its fingerprint
+
+
+def probe_tools(
+    probes: tuple[Probe, ...] = PROBES,
+    timeout: float = PROBE_TIMEOUT,
+    cache_path: Path | None = CACHE_PATH,
+) -> dict[str, str]:
+    """Tool name -> version output, in ``probes`` order; ``cache_path=None`` disables caching."""
+    cache = _load_cache(cache_path) if cache_path else {}
+    results: dict[str, str] = {}
+    pending: list[tuple[Probe, str]] = []
+    dirty = False
+    for probe in probes:
+        key, found = cache_key(probe)
+        if key in cache:
+            results[probe.name] = cache[key]
+        elif not found:
+            results[probe.name] = cache[key] = NOT_AVAILABLE
+            dirty = True
+        else:
+            pending.append((probe, key))
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            outputs = list(pool.map(lambda p: run(p[0].argv, timeout), pending))
+        for (probe, key), (output, cacheable) in zip(pending, outputs, strict=True):
+            results[probe.name] = output
+            if cacheable:
+                cache[key] = output
+                dirty = True
+    if cache_path and dirty:
+        _save_cache(cache_path, cache)
+    return {probe.name: results[probe.name] for probe in probes}
+
+
+def fingerprint_data(
+    timeout: float = PROBE_TIMEOUT, cache_path: Path | None = CACHE_PATH
+) -> dict[str, str]:
+    """The fingerprint as an ordered, flat dict (the ``--json`` output)."""
+    return {
+        "python_version": sys.version.replace("\n", " "),
+        "platform": platform.platform(),
+        **probe_tools(PROBES, timeout, cache_path),
+    }
+
+
+def to_text(data: dict[str, str]) -> str:
+    return "".join(f"{key}: {value}\n" for key, value in data.items())
+
+
+def fingerprint() -> str:
+    return to_text(fingerprint_data())
+
+
+def parse_fingerprint(text: str) -> dict[str, str]:
+    """Read a fingerprint in either format (JSON, or the ``key: value`` text)."""
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            return {k: str(v) for k, v in json.loads(stripped).items()}
+        except ValueError:
+            pass
+    data = {}
+    for line in stripped.splitlines():
+        key, sep, value = line.partition(": ")
+        if sep:
+            data[key] = value
+    return data
+
+
+def diff_fingerprints(old: dict[str, str], new: dict[str, str]) -> list[str]:
+    """Human-readable ``key: old -> new`` lines for every key that differs."""
+    lines = []
+    for key in [*old, *(k for k in new if k not in old)]:
+        before, after = old.get(key, "(absent)"), new.get(key, "(absent)")
+        if before != after:
+            lines.append(f"{key}: {before} -> {after}")
+    return lines
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Print the environment fingerprint")
+    ap.add_argument("--json", action="store_true", help="Print JSON instead of key: value lines")
+    ap.add_argument("--no-cache", action="store_true", help="Re-run every probe")
+    ap.add_argument(
+        "--timeout",
+        type=float,
+        default=PROBE_TIMEOUT,
+        help=f"Seconds each probe may take (default {PROBE_TIMEOUT:g})",
+    )
+    ap.add_argument(
+        "--diff",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="Compare two saved fingerprints instead of taking one",
+    )
+    args = ap.parse_args()
+
+    if args.diff:
+        old, new = (parse_fingerprint(Path(p).read_text(encoding="utf-8")) for p in args.diff)
+        changes = diff_fingerprints(old, new)
+        sys.stdout.write("".join(f"{line}\n" for line in changes) or "No changes\n")
+        return 1 if changes else 0
+
+    data = fingerprint_data(args.timeout, None if args.no_cache else CACHE_PATH)
+    sys.stdout.write(json.dumps(data, indent=2) + "\n" if args.json else to_text(data))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
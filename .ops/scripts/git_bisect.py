@@ -0,0 +1,217 @@
+"""Git plumbing and k-ary search for ``diagnose.py --bisect``.
+
+The range ``GOOD..BAD`` is walked along BAD's first-parent history, so a
+merged branch is tested as one step (like ``git bisect --first-parent``).
+Each round tests ``k`` commits spread evenly over the unresolved range in
+parallel, shrinking it by a factor of ``k + 1``; binary search is ``k = 1``.
+
+Verdicts follow ``git bisect run``: exit 0 is good, 125 means the commit
+cannot be tested (skip), anything else is bad.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import subprocess
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+
+SKIP_EXIT = 125
+GOOD, BAD, SKIP = "good", "bad", "skip"
+
+
+class BisectError(RuntimeError):
+    pass
+
+
+def git(*args: str, cwd: str | Path = ".") -> str:
+    out = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise BisectError(f"git {' '.join(args)}: {out.stderr.strip()}")
+    return out.stdout.strip()
+
+
+def verdict(exit_code: int) -> str:
+    if exit_code == 0:
+        return GOOD
+    return SKIP if exit_code == SKIP_EXIT else BAD
+
+
+def commit_range(spec: str, repo: str | Path = ".") -> tuple[str, list[str]]:
+    """Resolve ``GOOD..BAD`` to the good commit and the commits after it, oldest first.
+
+    The last commit returned is BAD itself.
+    """
+    good, sep, bad = spec.partition("..")
+    if not sep or not good or not bad:
+        raise BisectError(f"expected GOOD..BAD, got {spec!r}")
+    good = git("rev-parse", "--verify", f"{good}^{{commit}}", cwd=repo)
+    bad = git("rev-parse", "--verify", f"{bad}^{{commit}}", cwd=repo)
+    listed = git(
+        "rev-list", "--reverse", "--first-parent", "--ancestry-path", f"{good}..{bad}", cwd=repo
+    )
+    commits = listed.split()
+    if not commits:
+        raise BisectError(f"{good[:12]} is not an ancestor of {bad[:12]} on its first-parent line")
+    return good, commits
+
+
+def subject(sha: str, repo: str | Path = ".") -> str:
+    return git("log", "-1", "--format=%h %s", sha, cwd=repo)
+
+
+@dataclass
+class BisectResult:
+    good: str
+    bad: str
+    first_bad: str
+    rounds: int
+    tested: int  # commits actually run (cache hits excluded)
+    cached: int
+    skipped: list[str] = field(default_factory=list)
+    # Untestable commits just before first_bad; any of them may be the culprit.
+    ambiguous: list[str] = field(default_factory=list)
+
+
+def pick(inner: list[str], k: int) -> list[str]:
+    """Up to ``k`` commits spread evenly over ``inner``, in order."""
+    if len(inner) <= k:
+        return list(inner)
+    m = len(inner)
+    return [inner[i] for i in sorted({min(m - 1, j * m // (k + 1)) for j in range(1, k + 1)})]
+
+
+def kary_bisect(
+    good: str,
+    commits: list[str],
+    test: Callable[[list[str]], dict[str, str]],
+    k: int,
+) -> tuple[str, int, set[str]]:
+    """Return ``(first_bad, rounds, skipped)``.
+
+    ``test`` maps a list of commits to their verdicts and runs them in
+    parallel. The first round also checks both endpoints, within the same
+    ``k`` slots (it tests ``k - 2`` commits of the range). A good commit
+    after a bad one (non-monotonic history) is ignored in favour of the
+    earliest bad commit seen.
+    """
+    bad = commits[-1]
+    cand = list(commits)  # unresolved commits; the last one is known bad
+    skipped: set[str] = set()
+    rounds = 0
+    while len(cand) > 1 or rounds == 0:
+        picks = pick(cand[:-1], max(1, k - 2) if rounds == 0 else k)
+        results = test([good, *picks, bad] if rounds == 0 else picks)
+        rounds += 1
+        if rounds == 1:
+            if results[good] != GOOD:
+                raise BisectError(f"GOOD commit {good[:12]} is not good ({results[good]})")
+            if results[bad] != BAD:
+                raise BisectError(f"BAD commit {bad[:12]} is not bad ({results[bad]})")
+        start, end = 0, len(cand) - 1
+        for sha in picks:
+            if results[sha] == SKIP:
+                skipped.add(sha)
+            elif results[sha] == GOOD:
+                start = cand.index(sha) + 1
+            else:
+                end = cand.index(sha)
+                break
+        cand = [sha for sha in cand[start : end + 1] if sha not in skipped]
+    return cand[0], rounds, skipped
+
+
+def ambiguous_before(first_bad: str, commits: list[str], skipped: set[str]) -> list[str]:
+    """Skipped commits directly preceding ``first_bad``: the culprit may be among them."""
+    out = []
+    for sha in reversed(commits[: commits.index(first_bad)]):
+        if sha not in skipped:
+            break
+        out.append(sha)
+    return out[::-1]
+
+
+class BisectCache:
+    """Per-command verdicts, keyed by commit hash, in an append-only JSONL file.
+
+    Each commit's full output is kept next to it as ``<cmd key>/<sha>.log``,
+    so a cached bad commit can still be recorded in the KB. Entries put with
+    ``persist=False`` (e.g. timed-out runs, which depend on ``--timeout`` and
+    machine load) only last for this run.
+    """
+
+    def __init__(self, cache_dir: str | Path, cmd: str) -> None:
+        self.dir = Path(cache_dir)
+        self.key = hashlib.sha256(cmd.encode("utf-8")).hexdigest()[:16]
+        self.path = self.dir / "cache.jsonl"
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line from an interrupted run
+                    if entry.get("cmd") == self.key and self.output(entry["commit"]).exists():
+                        self.entries[entry["commit"]] = entry
+
+    def output(self, sha: str) -> Path:
+        return self.dir / self.key / f"{sha}.log"
+
+    def get(self, sha: str) -> dict | None:
+        return self.entries.get(sha)
+
+    def put(self, sha: str, entry: dict, persist: bool = True) -> None:
+        entry = {
+            "cmd": self.key,
+            "commit": sha,
+            "at": datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            **entry,
+        }
+        if persist:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, sort_keys=True) + "\n")
+        self.entries[sha] = entry
+
+
+class Worktrees:
+    """Detached ``git worktree`` checkouts under ``root``, one per slot, removed on exit."""
+
+    def __init__(self, root: str | Path, repo: str | Path = ".") -> None:
+        self.root = Path(root)
+        self.repo = Path(repo)
+        self.slots: list[Path] = []
+
+    def __enter__(self) -> Worktrees:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def slot(self, i: int, sha: str) -> Path:
+        """Path of slot ``i``, creating it at ``sha`` on first use."""
+        while len(self.slots) <= i:
+            path = self.root / f"wt{len(self.slots)}"
+            git("worktree", "add", "--detach", "--quiet", str(path), sha, cwd=self.repo)
+            self.slots.append(path)
+        return self.slots[i]
+
+    def close(self) -> None:
+        for path in self.slots:
+            try:
+                git("worktree", "remove", "--force", str(path), cwd=self.repo)
+            except BisectError:
+                shutil.rmtree(path, ignore_errors=True)
+        self.slots = []
+        git("worktree", "prune", cwd=self.repo)
+
+
+def checkout(worktree: str | Path, sha: str) -> None:
+    """Force ``worktree`` to ``sha`` with no untracked or ignored leftovers."""
+    git("checkout", "--quiet", "--force", "--detach", sha, cwd=worktree)
+    git("clean", "-fdxq", cwd=worktree)
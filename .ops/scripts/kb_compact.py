@@ -0,0 +1,299 @@
+"""Compact the Error KB: merge duplicate cases, pack cold ones, rebuild the index.
+
+1. Every case (loose or packed) is re-digested from its full log, or from
+   ``symptoms.md`` for cases recorded before logs were kept, in a process
+   pool. Cases whose content now hashes to the same signature are exact
+   duplicates (typically recorded under an older normalization); cases
+   whose MinHash similarity reaches ``--threshold`` are near-duplicates.
+   Each group is folded into its most frequent case: filled-in notes are
+   appended to the target's, and the journal records a ``merge`` event so
+   later occurrences of the old signature count against the target.
+2. Cases not seen for ``--cold-days`` move into ``cases.kbpack`` (see
+   ``kb_pack.py``); their directories are removed once the pack is safely
+   written. Packed cases stay readable by every KB tool. Steps 1 and 2
+   modify cases under the journal lock, which recording also holds, so a
+   concurrent ``make diagnose`` never writes into a case being removed.
+3. The SQLite index (occurrences, similarity, frames, search) is rebuilt.
+
+Usage:
+    python .ops/scripts/kb_compact.py [--dry-run] [--threshold 0.9] [--cold-days 90]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import lzma
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from itertools import repeat
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from kb_frames import FrameIndex  # noqa: E402
+from kb_ingest import SKELETONS, LogDigest, digest_stream  # noqa: E402
+from kb_pack import PACK_NAME, CaseFiles, PackWriter  # noqa: E402
+from kb_search import KBSearchIndex  # noqa: E402
+from kb_similarity import SimilarityIndex, fenced_text  # noqa: E402
+from kb_store import CaseStats, KBStore  # noqa: E402
+
+KB_DIR = Path(".ops/error_kb")
+NOTE_FILES = ("root_cause.md", "fix.md", "regression_test.md")
+LOG_FILES = {"failure.log.gz": gzip.open, "failure.log.xz": lzma.open}
+
+
+@dataclass
+class CompactPlan:
+    merges: list[tuple[str, str, str]] = field(default_factory=list)  # (src, dst, reason)
+    pack: list[str] = field(default_factory=list)  # loose cases to pack
+    keep_packed: list[str] = field(default_factory=list)
+
+
+def digest_case(kb_dir: str, sig: str) -> tuple[str, LogDigest | None]:
+    """Re-digest one case from its stored log; runs in a worker process."""
+    with CaseFiles(kb_dir) as cases:
+        for name, opener in LOG_FILES.items():
+            if cases.exists(sig, name):
+                with opener(cases.open(sig, name), "rb") as f:  # type: ignore[operator]
+                    return sig, digest_stream(f)
+        if cases.exists(sig, "symptoms.md"):
+            text = fenced_text(cases.read_text(sig, "symptoms.md"))
+            return sig, digest_stream(io.BytesIO(text.encode("utf-8")))
+    return sig, None
+
+
+def _rank(sig: str, stats: dict[str, CaseStats]) -> tuple:
+    """Sort key: the case that absorbs a group comes first."""
+    s = stats.get(sig)
+    return (-(s.count if s else 0), s.first_seen if s else "~", sig)
+
+
+def plan_merges(
+    digests: dict[str, LogDigest], stats: dict[str, CaseStats], threshold: float
+) -> list[tuple[str, str, str]]:
+    merges = []
+    by_content: dict[str, list[str]] = {}
+    for sig, digest in digests.items():
+        by_content.setdefault(digest.sig, []).append(sig)
+    survivors = []
+    for content_sig, group in by_content.items():
+        # A case already named by its current signature keeps it.
+        group.sort(key=lambda s: (s != content_sig, *_rank(s, stats)))
+        survivors.append(group[0])
+        merges += [(src, group[0], "duplicate") for src in group[1:]]
+
+    if threshold > 1:
+        return merges
+    # Greedy star clustering: each case joins the first (most frequent)
+    # center it is similar to, so chains of pairwise matches don't fuse
+    # unrelated failures.
+    survivors.sort(key=lambda s: _rank(s, stats))
+    with tempfile.TemporaryDirectory() as tmp:
+        with SimilarityIndex(Path(tmp) / "sketches.sqlite3") as index:
+            index.add_many([(sig, digests[sig].sketch) for sig in survivors])
+            assigned: set[str] = set()
+            for center in survivors:
+                if center in assigned:
+                    continue
+                assigned.add(center)
+                for other, score in index.query(
+                    digests[center].sketch, k=50, exclude=center, min_score=threshold
+                ):
+                    if other not in assigned:
+                        assigned.add(other)
+                        merges.append((other, center, f"similar {score:.2f}"))
+    return merges
+
+
+def _note_body(text: str) -> str:
+    lines = text.strip().splitlines()
+    if lines and lines[0].startswith("# "):
+        lines = lines[1:]
+    return "\n".join(lines).strip()
+
+
+def merge_case(cases: CaseFiles, store: KBStore, src: str, dst: str) -> None:
+    """Fold ``src`` into ``dst``: notes, resource history, files ``dst`` lacks, occurrences."""
+    cases.unpack(dst)
+    dst_dir = cases.cases_dir / dst
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    for name in NOTE_FILES:
+        if not cases.exists(src, name):
+            continue
+        text = cases.read_text(src, name)
+        if not _note_body(text) or text == SKELETONS[name]:
+            continue
+        target = dst_dir / name
+        current = target.read_text(encoding="utf-8") if target.exists() else SKELETONS[name]
+        if _note_body(text) in current:
+            continue
+        if current == SKELETONS[name]:
+            target.write_text(text, encoding="utf-8")
+        else:
+            merged = f"{current.rstrip()}\n\n## Merged from {src}\n\n{_note_body(text)}\n"
+            target.write_text(merged, encoding="utf-8")
+    if cases.exists(src, "resources.json"):
+        records = json.loads(cases.read_text(src, "resources.json"))
+        target = dst_dir / "resources.json"
+        if target.exists():
+            records += json.loads(target.read_text(encoding="utf-8"))
+        records.sort(key=lambda r: r.get("captured_at", ""))
+        target.write_text(json.dumps(records, indent=2) + "\n", encoding="utf-8")
+    for name in ("profile.collapsed", "bisect.json"):
+        if cases.exists(src, name) and not (dst_dir / name).exists():
+            with cases.open(src, name) as f, open(dst_dir / name, "wb") as out:
+                shutil.copyfileobj(f, out)
+    if not any((dst_dir / name).exists() for name in LOG_FILES):
+        for name in LOG_FILES:
+            if cases.exists(src, name):
+                with cases.open(src, name) as f, open(dst_dir / name, "wb") as out:
+                    shutil.copyfileobj(f, out)
+                break
+    store.merge(src, dst)
+    if not cases.is_packed(src) and (cases.cases_dir / src).is_dir():
+        shutil.rmtree(cases.cases_dir / src)
+
+
+def write_pack(cases: CaseFiles, keep_packed: list[str], pack: list[str]) -> int:
+    """Write a new pack with ``keep_packed`` (already packed) plus loose ``pack``; return bytes."""
+    pack_path = cases.kb_dir / PACK_NAME
+    if not keep_packed and not pack:
+        if pack_path.exists():
+            pack_path.unlink()
+        return 0
+    writer = PackWriter(pack_path)
+    try:
+        for sig in sorted([*keep_packed, *pack]):
+            for name in cases.names(sig):
+                with cases.open(sig, name) as f:
+                    writer.add(sig, name, f)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    for sig in pack:
+        shutil.rmtree(cases.cases_dir / sig)
+    return pack_path.stat().st_size
+
+
+def compact(
+    kb_dir: str | Path = KB_DIR,
+    threshold: float = 0.9,
+    cold_days: float = 90,
+    merge: bool = True,
+    pack: bool = True,
+    dry_run: bool = False,
+    jobs: int | None = None,
+) -> CompactPlan:
+    kb_dir = Path(kb_dir)
+    with KBStore(kb_dir) as store, CaseFiles(kb_dir) as cases:
+        stats = {s.sig: s for s in store.cases()}
+        sigs = cases.sigs()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(digest_case, repeat(str(kb_dir)), sigs, chunksize=16)
+        digests = {sig: d for sig, d in results if d is not None}
+
+    plan = CompactPlan()
+    if merge:
+        plan.merges = plan_merges(digests, stats, threshold)
+    merged = {src for src, _, _ in plan.merges}
+    cutoff = (datetime.now(UTC) - timedelta(days=cold_days)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    with CaseFiles(kb_dir) as cases:
+        for sig in sigs:
+            if sig in merged:
+                continue
+            if cases.is_packed(sig):
+                plan.keep_packed.append(sig)
+            elif pack and (sig not in stats or stats[sig].last_seen < cutoff):
+                plan.pack.append(sig)
+    targets = {dst for _, dst, _ in plan.merges}
+    plan.pack = [sig for sig in plan.pack if sig not in targets]  # just edited
+    plan.keep_packed = [sig for sig in plan.keep_packed if sig not in targets]
+    if dry_run:
+        return plan
+
+    # Recording holds the journal lock while it writes a case directory, so
+    # under it no case can change between the checks below and its removal.
+    with KBStore(kb_dir) as store, store.locked():
+        with CaseFiles(kb_dir) as cases:
+            # Cases that recurred since planning are no longer cold.
+            recent = {s.sig for s in store.cases() if s.last_seen >= cutoff}
+            plan.pack = [sig for sig in plan.pack if sig not in recent]
+            plan.keep_packed = [sig for sig in plan.keep_packed if cases.is_packed(sig)]
+            for src, dst, _ in plan.merges:
+                merge_case(cases, store, src, dst)
+        # Rewriting also drops packed copies of merged or unpacked cases.
+        with CaseFiles(kb_dir) as cases:
+            write_pack(cases, plan.keep_packed, plan.pack)
+        store.rebuild()
+
+    live = [sig for sig in sigs if sig not in merged]
+    with SimilarityIndex(kb_dir / "kb_index.sqlite3") as similar:
+        with similar.conn:
+            similar.conn.execute("DELETE FROM lsh")
+            similar.conn.execute("DELETE FROM minhash")
+        similar.add_many([(sig, digests[sig].sketch) for sig in live if sig in digests])
+    with FrameIndex(kb_dir) as frames:
+        frames.replace_many([(s, digests[s].traces) for s in live if s in digests], clear=True)
+    with KBSearchIndex(kb_dir) as search:
+        search.update()
+    return plan
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Merge, pack and re-index Error KB cases")
+    ap.add_argument(
+        "--threshold",
+        type=float,
+        default=0.9,
+        help="Similarity at which cases merge as near-duplicates (default 0.9; >1 disables)",
+    )
+    ap.add_argument(
+        "--cold-days",
+        type=float,
+        default=90,
+        help="Pack cases not seen for this many days (default 90)",
+    )
+    ap.add_argument("--no-merge", action="store_true", help="Skip duplicate merging")
+    ap.add_argument("--no-pack", action="store_true", help="Skip packing cold cases")
+    ap.add_argument("--dry-run", action="store_true", help="Print the plan without changing files")
+    ap.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = ap.parse_args()
+
+    start = time.perf_counter()
+    plan = compact(
+        KB_DIR,
+        threshold=args.threshold,
+        cold_days=args.cold_days,
+        merge=not args.no_merge,
+        pack=not args.no_pack,
+        dry_run=args.dry_run,
+        jobs=args.jobs,
+    )
+    for src, dst, reason in plan.merges:
+        print(f"merge  {src} -> {dst}  ({reason})")
+    for sig in plan.pack:
+        print(f"pack   {sig}")
+    verb = "Would merge" if args.dry_run else "Merged"
+    print(
+        f"{verb} {len(plan.merges)} case(s); "
+        f"{len(plan.pack)} newly packed, {len(plan.keep_packed)} already packed "
+        f"({time.perf_counter() - start:.2f}s)"
+    )
+    if not args.dry_run:
+        pack_path = KB_DIR / PACK_NAME
+        if pack_path.exists():
+            print(f"Pack: {pack_path} ({pack_path.stat().st_size:,} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,490 @@
+"""Structured stack frames for Error KB cases.
+
+Stack traces in a failure log are parsed into frames (file, function, line)
+plus the exception type, and stored in ``kb_index.sqlite3`` so questions
+like "which failures went through app/settings.py:_require_env" are
+answered from an index instead of by grepping every case.
+
+Parsers are fed one line at a time (so they run inside the streaming
+ingest pass) and are pluggable: decorate a class with ``register_parser``.
+Built in: Python tracebacks, pytest failure reports (``--tb=auto``, ``long``
+and ``short``) and Node.js/V8 ``at`` stacks.
+
+Usage:
+    python .ops/scripts/kb_frames.py query --file app/settings.py --function _require_env
+    python .ops/scripts/kb_frames.py query --module app.settings --exception KeyError --json
+    python .ops/scripts/kb_frames.py rebuild [--jobs N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import lzma
+import re
+import sqlite3
+import sys
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import repeat
+from pathlib import Path
+from typing import IO, Protocol
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from kb_pack import CaseFiles  # noqa: E402
+
+KB_DIR = Path(".ops/error_kb")
+
+MAX_TRACES = 50  # distinct traces kept per log
+MAX_FRAMES = 200  # frames kept per trace
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS traces (
+    id INTEGER PRIMARY KEY,
+    sig TEXT NOT NULL,
+    parser TEXT NOT NULL,
+    exception TEXT NOT NULL,
+    exc_name TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS traces_sig ON traces (sig);
+CREATE INDEX IF NOT EXISTS traces_exception ON traces (exception);
+CREATE INDEX IF NOT EXISTS traces_exc_name ON traces (exc_name);
+CREATE TABLE IF NOT EXISTS frames (
+    trace_id INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    rfile TEXT NOT NULL,
+    function TEXT NOT NULL,
+    line INTEGER,
+    PRIMARY KEY (trace_id, depth)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS frames_rfile ON frames (rfile);
+CREATE INDEX IF NOT EXISTS frames_function ON frames (function);
+"""
+
+
+@dataclass(frozen=True)
+class Frame:
+    file: str
+    function: str
+    line: int | None
+
+
+@dataclass(frozen=True)
+class Trace:
+    parser: str
+    exception: str
+    message: str
+    frames: tuple[Frame, ...]
+
+
+@dataclass(frozen=True)
+class FrameMatch:
+    sig: str
+    exception: str
+    file: str
+    function: str
+    line: int | None
+
+
+class StackParser(Protocol):
+    """Line-fed parser for one stack-trace format."""
+
+    name: str
+
+    def feed(self, line: str) -> Trace | None:
+        """Consume one log line; return a trace when one has just ended."""
+        ...
+
+    def close(self) -> Trace | None:
+        """Flush a trace still open at end of input."""
+        ...
+
+
+PARSERS: dict[str, Callable[[], StackParser]] = {}
+
+
+def register_parser(cls: type) -> type:
+    """Class decorator adding a parser to ``PARSERS`` under its ``name``."""
+    PARSERS[cls.name] = cls
+    return cls
+
+
+_PY_START = "Traceback (most recent call last):"
+_PY_FRAME_RE = re.compile(r'\s*File "(?P<file>[^"]+)", line (?P<line>\d+)(?:, in (?P<func>.+))?$')
+_EXC_RE = re.compile(r"(?P<exc>[A-Za-z_][\w.]*)(?::\s?(?P<msg>.*))?$")
+
+
+@register_parser
+class PythonTracebackParser:
+    name = "python"
+
+    def __init__(self) -> None:
+        self._frames: list[Frame] | None = None
+        self._prefix_len = 0
+
+    def feed(self, line: str) -> Trace | None:
+        if self._frames is None:
+            pos = line.find(_PY_START)
+            if pos != -1:
+                # A log prefix before "Traceback" repeats on every line of the block.
+                self._prefix_len = pos
+                self._frames = []
+            return None
+        rest = line[self._prefix_len :]
+        if rest[:1].isspace() or not rest:
+            match = _PY_FRAME_RE.match(rest)
+            if match and len(self._frames) < MAX_FRAMES:
+                func = (match["func"] or "").strip()
+                self._frames.append(Frame(match["file"], func, int(match["line"])))
+            return None
+        frames, self._frames = self._frames, None
+        exc = _EXC_RE.match(rest.strip())
+        if exc is None:
+            return Trace(self.name, "", "", tuple(frames))
+        return Trace(self.name, exc["exc"], (exc["msg"] or "")[:500], tuple(frames))
+
+    def close(self) -> Trace | None:
+        frames, self._frames = self._frames, None
+        return Trace(self.name, "", "", tuple(frames)) if frames else None
+
+
+_PYTEST_HEADER_RE = re.compile(r"(?P<prefix>.*?)_{3,} (?P<test>\S.*?) _{3,}$")
+_PYTEST_SHORT_RE = re.compile(r"(?P<file>\S.*?):(?P<line>\d+): in (?P<func>.+)$")
+_PYTEST_LONG_RE = re.compile(r"(?P<file>\S.*?):(?P<line>\d+): ?(?P<exc>[\w.]*)$")
+_PYTEST_DEF_RE = re.compile(r"[\s>]+(?:async\s+)?def\s+(?P<func>\w+)")
+
+
+@register_parser
+class PytestReportParser:
+    """pytest's own failure sections, one trace per ``____ test_name ____`` header.
+
+    Short entries read ``path.py:3: in func``. Long entries print the
+    function's source first and end with a bare ``path.py:3:`` location (the
+    last one followed by the exception type), so the function name comes
+    from the ``def`` line above it. The first ``E`` line of the last ``E``
+    block gives the exception.
+    """
+
+    name = "pytest"
+
+    def __init__(self) -> None:
+        self._frames: list[Frame] | None = None
+        self._prefix_len = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._func = ""
+        self._exc = self._msg = ""
+        self._in_e = False
+
+    def _end(self) -> Trace | None:
+        frames, self._frames = self._frames, None
+        if not frames:
+            return None
+        return Trace(self.name, self._exc, self._msg[:500], tuple(frames))
+
+    def feed(self, line: str) -> Trace | None:
+        header = _PYTEST_HEADER_RE.match(line)
+        if header is not None:
+            trace = self._end()
+            self._frames, self._prefix_len = [], len(header["prefix"])
+            self._reset()
+            return trace
+        if self._frames is None:
+            return None
+        rest = line[self._prefix_len :]
+        if rest.startswith("==="):
+            return self._end()
+        if rest.startswith("E ") or rest == "E":
+            if not self._in_e:
+                self._in_e = True
+                text = rest[1:].strip()
+                exc = _EXC_RE.match(text)
+                if exc is not None:
+                    self._exc, self._msg = exc["exc"], exc["msg"] or ""
+                elif text.startswith("assert "):  # rewritten assert with no message
+                    self._exc, self._msg = "AssertionError", text
+            return None
+        self._in_e = False
+        match = _PYTEST_SHORT_RE.match(rest)
+        if match is not None:
+            func = match["func"].strip()
+        else:
+            match = _PYTEST_LONG_RE.match(rest)
+            if match is None:
+                if not self._func and (defn := _PYTEST_DEF_RE.match(rest)):
+                    self._func = defn["func"]
+                return None
+            func = self._func
+            if match["exc"] and not self._exc:
+                self._exc = match["exc"]
+        if len(self._frames) < MAX_FRAMES:
+            self._frames.append(Frame(match["file"], func, int(match["line"])))
+        self._func = ""
+        return None
+
+    def close(self) -> Trace | None:
+        return self._end()
+
+
+_NODE_FRAME_RE = re.compile(
+    r"\sat (?:(?P<func>.+?) \()?(?P<file>[^()\s]+?):(?P<line>\d+)(?::\d+)?\)?$"
+)
+_NODE_HEADER_RE = re.compile(
+    r"(?:^|\s)(?:Uncaught )?(?P<exc>(?:[A-Za-z_$][\w$]*\.)*[A-Za-z_$]*(?:Error|Exception))"
+    r"(?: \[[\w-]+\])?: ?(?P<msg>.*)$"
+)
+
+
+@register_parser
+class NodeStackParser:
+    name = "node"
+
+    def __init__(self) -> None:
+        self._header = ""
+        self._frames: list[Frame] | None = None
+        self._exc = self._msg = ""
+
+    def feed(self, line: str) -> Trace | None:
+        match = _NODE_FRAME_RE.search(line) if " at " in line or "\tat " in line else None
+        if match is not None:
+            if self._frames is None:
+                header = _NODE_HEADER_RE.search(self._header)
+                self._exc = header["exc"] if header else ""
+                self._msg = header["msg"][:500] if header else ""
+                self._frames = []
+            if len(self._frames) < MAX_FRAMES:
+                func = match["func"] or "<anonymous>"
+                self._frames.append(Frame(match["file"], func, int(match["line"])))
+            return None
+        self._header = line
+        return self.close()
+
+    def close(self) -> Trace | None:
+        frames, self._frames = self._frames, None
+        if not frames:
+            return None
+        return Trace(self.name, self._exc, self._msg, tuple(frames))
+
+
+class FrameExtractor:
+    """Runs every registered parser over a stream of lines; keeps distinct traces."""
+
+    def __init__(self, parsers: Iterable[str] | None = None) -> None:
+        self.parsers = [PARSERS[name]() for name in (parsers or PARSERS)]
+        self.traces: list[Trace] = []
+        self._seen: set[Trace] = set()
+
+    def _keep(self, trace: Trace | None) -> None:
+        if trace is not None and trace not in self._seen and len(self.traces) < MAX_TRACES:
+            self._seen.add(trace)
+            self.traces.append(trace)
+
+    def feed(self, line: str) -> None:
+        for parser in self.parsers:
+            self._keep(parser.feed(line))
+
+    def close(self) -> list[Trace]:
+        for parser in self.parsers:
+            self._keep(parser.close())
+        return self.traces
+
+
+def extract_traces(lines: Iterable[str]) -> list[Trace]:
+    extractor = FrameExtractor()
+    for line in lines:
+        extractor.feed(line.rstrip("\r\n"))
+    return extractor.close()
+
+
+def _reverse(path: str) -> str:
+    return path.replace("\\", "/")[::-1]
+
+
+class FrameIndex:
+    def __init__(self, kb_dir: str | Path = KB_DIR) -> None:
+        self.kb_dir = Path(kb_dir)
+        self.kb_dir.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.kb_dir / "kb_index.sqlite3", timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> FrameIndex:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _delete(self, sig: str) -> None:
+        self.conn.execute(
+            "DELETE FROM frames WHERE trace_id IN (SELECT id FROM traces WHERE sig = ?)", (sig,)
+        )
+        self.conn.execute("DELETE FROM traces WHERE sig = ?", (sig,))
+
+    def replace(self, sig: str, traces: list[Trace]) -> None:
+        """Set the traces stored for ``sig``."""
+        self.replace_many([(sig, traces)])
+
+    def replace_many(self, items: Iterable[tuple[str, list[Trace]]], clear: bool = False) -> None:
+        """Set the traces of several cases in one transaction (``clear``: drop all others)."""
+        with self.conn:
+            if clear:
+                self.conn.execute("DELETE FROM frames")
+                self.conn.execute("DELETE FROM traces")
+            for sig, traces in items:
+                if not clear:
+                    self._delete(sig)
+                for trace in traces:
+                    trace_id = self.conn.execute(
+                        "INSERT INTO traces (sig, parser, exception, exc_name, message)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (
+                            sig,
+                            trace.parser,
+                            trace.exception,
+                            trace.exception.rsplit(".", 1)[-1],
+                            trace.message,
+                        ),
+                    ).lastrowid
+                    self.conn.executemany(
+                        "INSERT INTO frames (trace_id, depth, file, rfile, function, line)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (trace_id, depth, f.file, _reverse(f.file), f.function, f.line)
+                            for depth, f in enumerate(trace.frames)
+                        ],
+                    )
+
+    def query(
+        self,
+        file: str | None = None,
+        function: str | None = None,
+        exception: str | None = None,
+        limit: int = 1000,
+    ) -> list[FrameMatch]:
+        """Frames matching every given filter (all indexed lookups).
+
+        ``file`` matches a path suffix on a directory boundary, so
+        ``app/settings.py`` finds ``/home/ci/src/app/settings.py``.
+        ``exception`` matches the qualified name, or the bare class name
+        when given without dots.
+        """
+        where, params = [], []
+        if file:
+            rev = _reverse(file)
+            where.append("(f.rfile = ? OR (f.rfile >= ? AND f.rfile < ?))")
+            params += [rev, rev + "/", rev + "0"]  # "0" sorts right after "/"
+        if function:
+            where.append("f.function = ?")
+            params.append(function)
+        if exception:
+            where.append("t.exc_name = ?" if "." not in exception else "t.exception = ?")
+            params.append(exception)
+        rows = self.conn.execute(
+            f"""
+            SELECT t.sig, t.exception, f.file, f.function, f.line
+            FROM traces AS t JOIN frames AS f ON f.trace_id = t.id
+            WHERE {" AND ".join(where) or "1"}
+            ORDER BY t.sig, t.id, f.depth LIMIT ?
+            """,
+            (*params, limit),
+        )
+        return [FrameMatch(*row) for row in rows]
+
+
+def module_to_file(module: str) -> str:
+    return module.replace(".", "/") + ".py"
+
+
+def _open_log(cases: CaseFiles, sig: str) -> IO[str] | None:
+    for name, opener in (("failure.log.gz", gzip.open), ("failure.log.xz", lzma.open)):
+        if cases.exists(sig, name):
+            raw = cases.open(sig, name)
+            return opener(raw, "rt", encoding="utf-8", errors="ignore")  # type: ignore[operator]
+    if cases.exists(sig, "symptoms.md"):
+        return io.TextIOWrapper(cases.open(sig, "symptoms.md"), encoding="utf-8", errors="ignore")
+    return None
+
+
+def case_traces(kb_dir: str | Path, sig: str) -> tuple[str, list[Trace]]:
+    """Parse a case's full log (or its symptoms.md when no log was kept)."""
+    with CaseFiles(kb_dir) as cases:
+        f = _open_log(cases, sig)
+        if f is None:
+            return sig, []
+        with f:
+            return sig, extract_traces(f)
+
+
+def rebuild(kb_dir: str | Path = KB_DIR, jobs: int | None = None) -> tuple[int, int]:
+    """Re-index every case, loose or packed, in parallel; return (cases, traces)."""
+    with CaseFiles(kb_dir) as cases:
+        sigs = cases.sigs()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(case_traces, repeat(str(kb_dir)), sigs, chunksize=16))
+    with FrameIndex(kb_dir) as index:
+        index.replace_many(results, clear=True)
+    return len(results), sum(len(traces) for _, traces in results)
+
+
+def _print_matches(matches: list[FrameMatch]) -> None:
+    by_case: dict[str, list[FrameMatch]] = {}
+    for match in matches:
+        by_case.setdefault(match.sig, []).append(match)
+    for sig, rows in by_case.items():
+        exceptions = sorted({r.exception for r in rows if r.exception})
+        print(f"{sig}  {', '.join(exceptions) or '-'}")
+        for r in rows:
+            print(f"    {r.file}:{r.line if r.line is not None else '?'} in {r.function}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Query or rebuild the Error KB frame index")
+    sub = ap.add_subparsers(dest="command", required=True)
+    q = sub.add_parser("query", help="Find cases whose stack traces match all filters")
+    q.add_argument("--file", help="Path suffix, e.g. app/settings.py")
+    q.add_argument("--module", help="Dotted Python module, e.g. app.settings")
+    q.add_argument("--function", help="Function name, e.g. _require_env")
+    q.add_argument("--exception", help="Exception type, bare or qualified")
+    q.add_argument("--limit", type=int, default=1000, help="Maximum frames (default 1000)")
+    q.add_argument("--json", action="store_true", help="Print matching frames as JSON")
+    r = sub.add_parser("rebuild", help="Re-index all cases in parallel")
+    r.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = ap.parse_args(argv)
+
+    if args.command == "rebuild":
+        start = time.perf_counter()
+        cases, traces = rebuild(KB_DIR, args.jobs)
+        elapsed = time.perf_counter() - start
+        print(f"Indexed {traces} trace(s) from {cases} case(s) in {elapsed:.2f}s")
+        return 0
+
+    file = args.file or (module_to_file(args.module) if args.module else None)
+    if not (file or args.function or args.exception):
+        print("Give at least one of --file, --module, --function, --exception", file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    with FrameIndex(KB_DIR) as index:
+        matches = index.query(file, args.function, args.exception, args.limit)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps([asdict(m) for m in matches], indent=2))
+        return 0
+    _print_matches(matches)
+    cases = len({m.sig for m in matches})
+    print(f"{cases} case(s), {len(matches)} frame(s) in {elapsed * 1000:.1f} ms")
+    return 0 if matches else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,276 @@
+"""Bulk import of failure logs into the Error KB.
+
+Accepts any mix of directories (walked recursively), glob patterns and
+tar/zip archives. Logs are digested in a process pool with the same
+streaming path as ``record_failure.py``; duplicates within the batch share
+one case, and every occurrence plus the similarity and frame indexes are
+committed together at the end. A log that cannot be read (e.g. a corrupt
+archive member) is reported and skipped; the rest of the batch is imported.
+
+Usage:
+    python .ops/scripts/kb_import.py ci-logs/ 'nightly/**/*.log' failures.tar.gz
+    python .ops/scripts/kb_import.py logs.zip --jobs 8 --compress xz
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from kb_frames import FrameIndex  # noqa: E402
+from kb_ingest import COMPRESSORS, LogDigest, digest_file, digest_stream, write_case  # noqa: E402
+from kb_pack import CaseFiles  # noqa: E402
+from kb_similarity import SimilarityIndex  # noqa: E402
+from kb_store import KBStore  # noqa: E402
+
+KB_DIR = Path(".ops/error_kb")
+CASES_DIR = KB_DIR / "cases"
+STAGING_DIR = KB_DIR / ".staging"
+
+_TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+_GLOB_CHARS = frozenset("*?[")
+
+
+@dataclass(frozen=True)
+class ImportItem:
+    """One log to digest: a file on disk, or a member of a zip archive."""
+
+    path: str
+    source: str
+    mtime: float
+    member: str | None = None  # zip member name
+    temporary: bool = False  # extracted from a tar; deleted once digested
+
+
+@dataclass(frozen=True)
+class ImportSummary:
+    files: int
+    bytes: int
+    cases: int
+    new_cases: int
+    seconds: float
+    failed: tuple[str, ...] = ()  # "source: error" for each log that was skipped
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _is_tar(path: str) -> bool:
+    return path.endswith(_TAR_SUFFIXES)
+
+
+def _tar_items(path: str, extract_dir: Path) -> Iterator[ImportItem]:
+    # Compressed tars are not seekable, so members are streamed out in one
+    # sequential pass and handed to the pool as plain files.
+    extract_dir.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(path, "r:*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            src = tar.extractfile(member)
+            if src is None:
+                continue
+            fd, tmp = tempfile.mkstemp(dir=extract_dir, suffix=".log")
+            with src, os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(src, out)
+            yield ImportItem(tmp, f"{path}:{member.name}", member.mtime, temporary=True)
+
+
+def _zip_items(path: str) -> Iterator[ImportItem]:
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            mtime = datetime(*info.date_time, tzinfo=UTC).timestamp()
+            yield ImportItem(path, f"{path}:{info.filename}", mtime, member=info.filename)
+
+
+def _file_item(path: str) -> ImportItem:
+    return ImportItem(path, path, os.stat(path).st_mtime)
+
+
+def expand_inputs(inputs: list[str], extract_dir: Path) -> Iterator[ImportItem]:
+    """Yield every log named by ``inputs`` (directories, globs, archives or files)."""
+    for spec in inputs:
+        if _GLOB_CHARS & set(spec) and not os.path.exists(spec):
+            paths = sorted(glob.glob(spec, recursive=True))
+        elif os.path.isdir(spec):
+            paths = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(spec)
+                for name in names
+                if not name.startswith(".")
+            )
+        else:
+            paths = [spec]
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            if _is_tar(path):
+                yield from _tar_items(path, extract_dir)
+            elif path.endswith(".zip") and zipfile.is_zipfile(path):
+                yield from _zip_items(path)
+            else:
+                yield _file_item(path)
+
+
+def digest_item(item: ImportItem, staging_dir: str, compress: str) -> LogDigest:
+    """Digest one import item; runs in a worker process."""
+    try:
+        if item.member is None:
+            digest = digest_file(item.path, staging_dir, compress)
+        else:
+            with zipfile.ZipFile(item.path) as zf, zf.open(item.member) as f:
+                digest = digest_stream(f, staging_dir, compress)  # type: ignore[arg-type]
+    finally:
+        if item.temporary:
+            os.unlink(item.path)
+    digest.source = item.source
+    return digest
+
+
+def _discard_staged(digest: LogDigest) -> None:
+    if digest.staged_log:
+        try:
+            os.unlink(digest.staged_log)
+        except FileNotFoundError:
+            pass
+        digest.staged_log = None
+
+
+def import_logs(
+    inputs: list[str],
+    kb_dir: str | Path = KB_DIR,
+    jobs: int | None = None,
+    compress: str = "gzip",
+) -> ImportSummary:
+    kb_dir = Path(kb_dir)
+    cases_dir = kb_dir / "cases"
+    staging_dir = kb_dir / ".staging"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+
+    by_sig: dict[str, LogDigest] = {}  # one digest per signature, before alias resolution
+    seen: list[tuple[str, ImportItem]] = []
+    digests: dict[str, LogDigest] = {}
+    occurrences: list[dict] = []
+    failed: list[str] = []
+    total_bytes = 0
+    try:
+        with tempfile.TemporaryDirectory(dir=staging_dir) as extract_dir:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures: list[tuple[ImportItem, Future[LogDigest]]] = []
+                try:
+                    for item in expand_inputs(inputs, Path(extract_dir)):
+                        futures.append(
+                            (item, pool.submit(digest_item, item, str(staging_dir), compress))
+                        )
+                    for item, future in futures:
+                        try:
+                            digest = future.result()
+                        except Exception as exc:
+                            failed.append(f"{item.source}: {type(exc).__name__}: {exc}")
+                            continue
+                        total_bytes += digest.size
+                        if digest.sig in by_sig:
+                            # Duplicate within the batch: one case, one more occurrence.
+                            _discard_staged(digest)
+                        else:
+                            by_sig[digest.sig] = digest
+                        seen.append((digest.sig, item))
+                except BaseException:
+                    pool.shutdown(cancel_futures=True)
+                    for _, future in futures:
+                        if not future.cancelled() and future.exception() is None:
+                            _discard_staged(future.result())
+                    raise
+
+        with KBStore(kb_dir) as store, store.locked():
+            resolved = {raw: store.resolve(raw) for raw in by_sig}  # kb-compact merges
+            for raw, digest in by_sig.items():
+                if resolved[raw] in digests:
+                    _discard_staged(digest)
+                else:
+                    digests[resolved[raw]] = digest
+            occurrences = [
+                {
+                    "sig": resolved[raw],
+                    "case_dir": cases_dir / resolved[raw],
+                    "log_path": item.source,
+                    "seen_at": _iso(item.mtime),
+                }
+                for raw, item in seen
+            ]
+            with CaseFiles(kb_dir) as cases:
+                for sig in digests:
+                    cases.unpack(sig)  # a packed case that recurs is no longer cold
+            new_cases = sum(write_case(cases_dir / sig, d) for sig, d in digests.items())
+            store.record_many(occurrences)
+    finally:
+        for digest in by_sig.values():
+            _discard_staged(digest)  # only logs no case took over are still staged
+
+    fresh = [(sig, d) for sig, d in digests.items() if sig == d.sig]
+    with SimilarityIndex(kb_dir / "kb_index.sqlite3") as similar:
+        similar.add_many([(sig, d.sketch) for sig, d in fresh])
+    with FrameIndex(kb_dir) as frames:
+        frames.replace_many([(sig, d.traces) for sig, d in fresh])
+
+    return ImportSummary(
+        files=len(occurrences),
+        bytes=total_bytes,
+        cases=len(digests),
+        new_cases=new_cases,
+        seconds=time.perf_counter() - start,
+        failed=tuple(failed),
+    )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Bulk import failure logs into the Error KB")
+    ap.add_argument("inputs", nargs="+", help="Log files, directories, globs or tar/zip archives")
+    ap.add_argument(
+        "--jobs", type=int, default=None, help="Worker processes (default: CPU count)"
+    )
+    ap.add_argument(
+        "--compress",
+        choices=list(COMPRESSORS),
+        default="gzip",
+        help="Compression for the full logs kept in new cases (default gzip)",
+    )
+    args = ap.parse_args()
+
+    summary = import_logs(args.inputs, KB_DIR, args.jobs, args.compress)
+    for failure in summary.failed:
+        print(f"Skipped {failure}", file=sys.stderr)
+    if not summary.files:
+        print("No logs imported." if summary.failed else "No logs found.")
+        return 1
+    seconds = max(summary.seconds, 1e-9)
+    print(
+        f"Imported {summary.files} log(s) into {summary.cases} case(s) "
+        f"({summary.new_cases} new) in {summary.seconds:.2f}s: "
+        f"{summary.files / seconds:.1f} files/s, "
+        f"{summary.bytes / seconds / 1e6:.1f} MB/s"
+        + (f"; {len(summary.failed)} skipped" if summary.failed else "")
+    )
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
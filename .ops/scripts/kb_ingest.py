@@ -0,0 +1,245 @@
+"""Streaming ingestion of failure logs into Error KB cases.
+
+``digest_file`` reads a log once, line by line, and never holds more than a
+bounded amount of it in memory. In that single pass it:
+
+- hashes the normalized lines into the case signature (identical to
+  ``signature_from_text`` on the whole text),
+- builds the MinHash sketch,
+- keeps the first ``HEAD_LINES`` and last ``TAIL_LINES`` lines plus up to
+  ``MAX_TRACEBACKS`` distinct Python traceback blocks for ``symptoms.md``,
+- parses stack traces into frames for the frame index (``kb_frames``),
+- streams a compressed copy of the full log to a staging file.
+
+Lines longer than ``MAX_LINE_BYTES`` are processed in pieces of that size.
+Each piece then counts as a line of its own for the signature and sketch,
+so for such a log the signature differs from ``signature_from_text``
+(which never splits). A UTF-8 character cut at a piece boundary is carried
+over to the next piece, never dropped.
+"""
+
+from __future__ import annotations
+
+import codecs
+import gzip
+import hashlib
+import lzma
+import os
+import re
+import shutil
+import tempfile
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO
+
+from kb_frames import FrameExtractor, Trace
+from kb_similarity import MinHasher, normalize_line
+
+HEAD_LINES = 200
+TAIL_LINES = 200
+MAX_TRACEBACKS = 20
+MAX_TRACEBACK_LINES = 200
+MAX_KEPT_LINE_CHARS = 2000
+MAX_LINE_BYTES = 1024 * 1024
+
+COMPRESSORS = {"gzip": ".log.gz", "xz": ".log.xz"}
+
+# Created once per case; never overwritten, so filled-in notes survive new occurrences.
+SKELETONS = {
+    "root_cause.md": "# Root Cause\n\nTBD\n",
+    "fix.md": "# Fix\n\nTBD\n",
+    "regression_test.md": "# Regression Test\n\nTBD\n",
+}
+
+_TRACEBACK_START = "Traceback (most recent call last):"
+_SPLIT_LINES_RE = re.compile(r"[\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")  # str.splitlines()
+
+
+@dataclass
+class LogDigest:
+    sig: str
+    sketch: array
+    size: int
+    lines: int
+    head: list[str]
+    tail: list[str]
+    tracebacks: list[str]
+    staged_log: str | None = None
+    source: str = ""
+    traces: list[Trace] = field(default_factory=list)
+
+    @property
+    def truncated(self) -> bool:
+        return self.lines > len(self.head) + len(self.tail)
+
+
+@dataclass
+class _TracebackCollector:
+    blocks: list[str] = field(default_factory=list)
+    _seen: set[str] = field(default_factory=set)
+    _current: list[str] | None = None
+    _prefix_len: int = 0
+
+    def feed(self, line: str) -> None:
+        if self._current is None:
+            pos = line.find(_TRACEBACK_START)
+            if pos != -1 and len(self.blocks) < MAX_TRACEBACKS:
+                # Any log prefix (timestamp, step name) before "Traceback" is
+                # assumed to repeat on every line of the block and is skipped.
+                self._prefix_len = pos
+                self._current = [line[pos:]]
+            return
+        rest = line[self._prefix_len :]
+        if len(self._current) < MAX_TRACEBACK_LINES:
+            self._current.append(rest[:MAX_KEPT_LINE_CHARS])
+        if rest[:1].isspace() or not rest:
+            return
+        self._finish()
+
+    def _finish(self) -> None:
+        if self._current is not None:
+            block = "\n".join(self._current)
+            if block not in self._seen:
+                self._seen.add(block)
+                self.blocks.append(block)
+        self._current = None
+
+    def close(self) -> list[str]:
+        self._finish()
+        return self.blocks
+
+
+def _open_compressed(path: str, compress: str) -> BinaryIO:
+    if compress == "xz":
+        return lzma.open(path, "wb", preset=3)  # type: ignore[return-value]
+    return gzip.open(path, "wb", compresslevel=6)  # type: ignore[return-value]
+
+
+def digest_stream(
+    f: BinaryIO,
+    staging_dir: str | Path | None = None,
+    compress: str = "gzip",
+    source: str = "",
+) -> LogDigest:
+    """Digest a binary log stream in one pass; see the module docstring."""
+    sig_hash = hashlib.sha256()
+    hasher = MinHasher()
+    head: list[str] = []
+    tail: deque[str] = deque(maxlen=TAIL_LINES)
+    tracebacks = _TracebackCollector()
+    frames = FrameExtractor()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    size = lines = 0
+    first = True
+
+    staged = out = None
+    if staging_dir is not None:
+        Path(staging_dir).mkdir(parents=True, exist_ok=True)
+        fd, staged = tempfile.mkstemp(dir=staging_dir, suffix=COMPRESSORS[compress])
+        os.close(fd)
+        out = _open_compressed(staged, compress)
+    try:
+        while raw := f.readline(MAX_LINE_BYTES):
+            size += len(raw)
+            if out is not None:
+                out.write(raw)
+            text = decoder.decode(raw).rstrip("\r\n")
+            for line in _SPLIT_LINES_RE.split(text) if _SPLIT_LINES_RE.search(text) else (text,):
+                lines += 1
+                kept = line[:MAX_KEPT_LINE_CHARS]
+                if len(head) < HEAD_LINES:
+                    head.append(kept)
+                else:
+                    tail.append(kept)
+                tracebacks.feed(line)
+                frames.feed(line)
+                stripped = line.strip()
+                if not stripped:
+                    continue
+                norm = normalize_line(stripped)
+                sig_hash.update(norm.encode("utf-8") if first else b"\n" + norm.encode("utf-8"))
+                first = False
+                hasher.update(norm)
+    except BaseException:
+        if out is not None:
+            out.close()
+            os.unlink(staged)  # type: ignore[arg-type]
+        raise
+    if out is not None:
+        out.close()
+
+    return LogDigest(
+        sig=sig_hash.hexdigest()[:16],
+        sketch=hasher.digest(),
+        size=size,
+        lines=lines,
+        head=head,
+        tail=list(tail),
+        tracebacks=tracebacks.close(),
+        staged_log=staged,
+        source=source,
+        traces=frames.close(),
+    )
+
+
+def digest_file(
+    path: str | Path, staging_dir: str | Path | None = None, compress: str = "gzip"
+) -> LogDigest:
+    with open(path, "rb") as f:
+        return digest_stream(f, staging_dir, compress, source=str(path))
+
+
+def symptoms_markdown(digest: LogDigest, captured: str | None = None) -> str:
+    captured = captured or f"{datetime.utcnow().isoformat()}Z"
+    if not digest.truncated:
+        body = "\n".join(digest.head + digest.tail)
+        return f"# Symptoms\n\nCaptured: {captured}\n\n```\n{body}\n```\n"
+    stats = f"Log: {digest.size:,} bytes, {digest.lines:,} lines"
+    if digest.staged_log:
+        stats += f"; full log in {_log_name(digest.staged_log)}"
+    parts = [
+        "# Symptoms\n",
+        f"Captured: {captured}",
+        stats,
+        f"\n## Head (first {len(digest.head)} lines)\n",
+        "```\n" + "\n".join(digest.head) + "\n```",
+    ]
+    if digest.tracebacks:
+        parts.append(f"\n## Tracebacks ({len(digest.tracebacks)})\n")
+        parts.extend(f"```\n{block}\n```" for block in digest.tracebacks)
+    parts.append(f"\n## Tail (last {len(digest.tail)} lines)\n")
+    parts.append("```\n" + "\n".join(digest.tail) + "\n```")
+    return "\n".join(parts) + "\n"
+
+
+def _log_name(staged_log: str) -> str:
+    return "failure" + "".join(Path(staged_log).suffixes[-2:])
+
+
+def write_case(case_dir: Path, digest: LogDigest) -> bool:
+    """Create the case files for ``digest`` if missing; return True for a new case.
+
+    The staged compressed log is moved into the case (or discarded if the
+    case already has one).
+    """
+    case_dir.mkdir(parents=True, exist_ok=True)
+    symptoms = case_dir / "symptoms.md"
+    is_new = not symptoms.exists()
+    if is_new:
+        symptoms.write_text(symptoms_markdown(digest), encoding="utf-8")
+    for name, skeleton in SKELETONS.items():
+        if not (case_dir / name).exists():
+            (case_dir / name).write_text(skeleton, encoding="utf-8")
+    if digest.staged_log:
+        existing = [case_dir / f"failure{s}" for s in COMPRESSORS.values()]
+        if any(p.exists() for p in existing):
+            os.unlink(digest.staged_log)
+        else:
+            target = case_dir / _log_name(digest.staged_log)
+            shutil.move(digest.staged_log, target)
+            target.chmod(0o644)  # mkstemp creates it 0600
+        digest.staged_log = None
+    return is_new
@@ -0,0 +1,300 @@
+"""Packed storage for cold Error KB cases.
+
+``cases.kbpack`` holds many cases in one file. Each file of a case is a
+separately compressed member, and an offset index sits at the end, so a
+single case file is read with one seek and without unpacking the rest:
+
+    b"KBPACK1\\n"
+    member bytes ...                 zlib, or stored for already compressed logs
+    index                            zlib-compressed JSON:
+                                     {"cases": {sig: {name: [offset, length, size, method]}}}
+    footer (24 bytes)                b"KBPINDEX", index offset, index length (big-endian u64)
+
+``CaseFiles`` reads cases the same way whether they are loose directories
+under ``cases/`` or packed; a loose directory takes precedence over a
+packed copy of the same case.
+
+Usage:
+    python .ops/scripts/kb_pack.py list
+    python .ops/scripts/kb_pack.py cat <sig> [symptoms.md]
+    python .ops/scripts/kb_pack.py unpack <sig>   # make a packed case editable again
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO
+
+KB_DIR = Path(".ops/error_kb")
+PACK_NAME = "cases.kbpack"
+
+MAGIC = b"KBPACK1\n"
+FOOTER = struct.Struct(">8sQQ")
+FOOTER_MAGIC = b"KBPINDEX"
+STORED_SUFFIXES = (".gz", ".xz")
+
+
+class PackError(RuntimeError):
+    pass
+
+
+class _MemberReader(io.RawIOBase):
+    """Seekable read-only view of one stored member, via pread on the pack file."""
+
+    def __init__(self, fd: int, offset: int, length: int) -> None:
+        self._fd, self._offset, self._length, self._pos = fd, offset, length, 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:  # type: ignore[no-untyped-def]
+        n = min(len(buf), self._length - self._pos)
+        if n <= 0:
+            return 0
+        data = os.pread(self._fd, n, self._offset + self._pos)
+        buf[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._length}[whence]
+        self._pos = max(0, base + pos)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+class PackReader:
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self.index = self._read_index()
+        except Exception:
+            self._file.close()
+            raise
+        self.mtime_ns = os.fstat(self._file.fileno()).st_mtime_ns
+
+    def _read_index(self) -> dict[str, dict[str, list]]:
+        f = self._file
+        if f.read(len(MAGIC)) != MAGIC:
+            raise PackError(f"{self.path}: not a KB pack")
+        f.seek(-FOOTER.size, io.SEEK_END)
+        magic, offset, length = FOOTER.unpack(f.read(FOOTER.size))
+        if magic != FOOTER_MAGIC:
+            raise PackError(f"{self.path}: missing index footer (truncated pack?)")
+        f.seek(offset)
+        return json.loads(zlib.decompress(f.read(length)))["cases"]
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> PackReader:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def sigs(self) -> list[str]:
+        return sorted(self.index)
+
+    def names(self, sig: str) -> list[str]:
+        return sorted(self.index.get(sig, ()))
+
+    def size(self, sig: str, name: str) -> int:
+        return self.index[sig][name][2]
+
+    def open(self, sig: str, name: str) -> BinaryIO:
+        offset, length, _, method = self.index[sig][name]
+        if method == "stored":
+            raw = _MemberReader(self._file.fileno(), offset, length)
+            return io.BufferedReader(raw)  # type: ignore[return-value]
+        return io.BytesIO(zlib.decompress(os.pread(self._file.fileno(), length, offset)))
+
+    def read(self, sig: str, name: str) -> bytes:
+        with self.open(sig, name) as f:
+            return f.read()
+
+
+class PackWriter:
+    """Write a new pack to a temp file; ``close`` publishes it atomically."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".kbpack.tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(MAGIC)
+        self.index: dict[str, dict[str, list]] = {}
+
+    def add(self, sig: str, name: str, src: BinaryIO) -> None:
+        offset = self._file.tell()
+        if name.endswith(STORED_SUFFIXES):
+            shutil.copyfileobj(src, self._file)
+            size = self._file.tell() - offset
+            method = "stored"
+        else:
+            data = src.read()
+            size = len(data)
+            self._file.write(zlib.compress(data, 9))
+            method = "zlib"
+        self.index.setdefault(sig, {})[name] = [offset, self._file.tell() - offset, size, method]
+
+    def add_dir(self, sig: str, case_dir: Path) -> None:
+        for path in sorted(p for p in case_dir.iterdir() if p.is_file()):
+            with open(path, "rb") as f:
+                self.add(sig, path.name, f)
+
+    def close(self) -> None:
+        offset = self._file.tell()
+        index = zlib.compress(json.dumps({"cases": self.index}, sort_keys=True).encode(), 9)
+        self._file.write(index)
+        self._file.write(FOOTER.pack(FOOTER_MAGIC, offset, len(index)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.chmod(self._tmp, 0o644)
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        os.unlink(self._tmp)
+
+
+class CaseFiles:
+    """Read access to every case, loose or packed."""
+
+    def __init__(self, kb_dir: str | Path = KB_DIR) -> None:
+        self.kb_dir = Path(kb_dir)
+        self.cases_dir = self.kb_dir / "cases"
+        self.pack_path = self.kb_dir / PACK_NAME
+        self.pack = PackReader(self.pack_path) if self.pack_path.exists() else None
+        self._loose: set[str] | None = None
+
+    def close(self) -> None:
+        if self.pack is not None:
+            self.pack.close()
+
+    def __enter__(self) -> CaseFiles:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _loose_set(self) -> set[str]:
+        if self._loose is None:
+            try:
+                with os.scandir(self.cases_dir) as it:
+                    self._loose = {e.name for e in it if e.is_dir() and not e.name.startswith(".")}
+            except FileNotFoundError:
+                self._loose = set()
+        return self._loose
+
+    def loose(self) -> list[str]:
+        return sorted(self._loose_set())
+
+    def sigs(self) -> list[str]:
+        packed = self.pack.index.keys() if self.pack is not None else ()
+        return sorted(self._loose_set().union(packed))
+
+    def is_packed(self, sig: str) -> bool:
+        return (
+            self.pack is not None
+            and sig in self.pack.index
+            and sig not in self._loose_set()
+        )
+
+    def names(self, sig: str) -> list[str]:
+        if self.is_packed(sig):
+            return self.pack.names(sig)  # type: ignore[union-attr]
+        case_dir = self.cases_dir / sig
+        if not case_dir.is_dir():
+            return []
+        return sorted(p.name for p in case_dir.iterdir() if p.is_file())
+
+    def exists(self, sig: str, name: str) -> bool:
+        if self.is_packed(sig):
+            return name in self.pack.index[sig]  # type: ignore[union-attr]
+        return (self.cases_dir / sig / name).is_file()
+
+    def stat(self, sig: str, name: str) -> tuple[int, int]:
+        """``(mtime_ns, size)``; packed files report the pack's mtime.
+
+        Raises FileNotFoundError (loose) or KeyError (packed) for a missing file.
+        """
+        if self.is_packed(sig):
+            return self.pack.mtime_ns, self.pack.size(sig, name)  # type: ignore[union-attr]
+        st = os.stat(self.cases_dir / sig / name)
+        return st.st_mtime_ns, st.st_size
+
+    def open(self, sig: str, name: str) -> BinaryIO:
+        if self.is_packed(sig):
+            return self.pack.open(sig, name)  # type: ignore[union-attr]
+        return open(self.cases_dir / sig / name, "rb")
+
+    def read_text(self, sig: str, name: str) -> str:
+        with self.open(sig, name) as f:
+            return f.read().decode("utf-8", errors="ignore")
+
+    def unpack(self, sig: str) -> bool:
+        """Copy a packed case back to ``cases/<sig>/``; return False if it wasn't packed.
+
+        The stale packed copy is dropped by the next ``kb-compact``.
+        """
+        if not self.is_packed(sig):
+            return False
+        pack = self.pack
+        assert pack is not None
+        self.cases_dir.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=self.cases_dir, prefix=f".{sig}."))
+        for name in pack.names(sig):
+            with pack.open(sig, name) as src, open(tmp / name, "wb") as out:
+                shutil.copyfileobj(src, out)
+        tmp.chmod(0o755)
+        os.rename(tmp, self.cases_dir / sig)
+        self._loose = None
+        return True
+
+
+def main(argv: list[str]) -> int:
+    usage = "Usage: python .ops/scripts/kb_pack.py list | cat <sig> [file] | unpack <sig>"
+    if not argv or argv[0] not in ("list", "cat", "unpack") or (argv[0] != "list" and not argv[1:]):
+        print(usage)
+        return 2
+    with CaseFiles() as cases:
+        if argv[0] == "list":
+            if cases.pack is None:
+                print("No packed cases.")
+                return 0
+            for sig in cases.pack.sigs():
+                state = "packed" if cases.is_packed(sig) else "unpacked"
+                print(f"{sig}  {state}  {', '.join(cases.pack.names(sig))}")
+            return 0
+        sig = argv[1]
+        if not cases.names(sig):
+            print(f"Unknown case: {sig}")
+            return 1
+        if argv[0] == "unpack":
+            moved = cases.unpack(sig)
+            print(f"Unpacked {sig} -> {cases.cases_dir / sig}" if moved else f"{sig} is not packed")
+            return 0
+        name = argv[2] if len(argv) > 2 else "symptoms.md"
+        with cases.open(sig, name) as f:
+            shutil.copyfileobj(f, sys.stdout.buffer)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,204 @@
+"""Full-text search over Error KB cases (SQLite FTS5, BM25 ranking).
+
+Indexes ``symptoms.md``, ``root_cause.md`` and ``fix.md`` of every case,
+loose or packed, into ``kb_index.sqlite3``. Each search first refreshes the
+index incrementally: files are re-read only when their mtime or size
+changed, and re-indexed only when their content hash changed.
+
+Usage:
+    python .ops/scripts/kb_search.py "ModuleNotFoundError app"
+    python .ops/scripts/kb_search.py 'psycopg NEAR(timeout)' --raw --limit 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from kb_pack import CaseFiles  # noqa: E402
+
+KB_DIR = Path(".ops/error_kb")
+INDEXED_FILES = ("symptoms.md", "root_cause.md", "fix.md")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+    sig UNINDEXED, kind UNINDEXED, body, tokenize = 'porter unicode61'
+);
+"""
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    sig: str
+    kind: str
+    score: float
+    snippet: str
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching all words (each quoted, so no syntax)."""
+    return " ".join(f'"{word}"' for word in _WORD_RE.findall(text))
+
+
+class KBSearchIndex:
+    def __init__(self, kb_dir: str | Path = KB_DIR) -> None:
+        self.kb_dir = Path(kb_dir)
+        self.cases_dir = self.kb_dir / "cases"
+        self.kb_dir.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.kb_dir / "kb_index.sqlite3", timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> KBSearchIndex:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _scan(self, cases: CaseFiles) -> dict[str, tuple[int, int]]:
+        """``{"<sig>/<file>": (mtime_ns, size)}`` for every indexed file, loose or packed."""
+        found = {}
+        for sig in cases.sigs():
+            for name in INDEXED_FILES:
+                try:
+                    found[f"{sig}/{name}"] = cases.stat(sig, name)
+                except (FileNotFoundError, KeyError):
+                    continue
+        return found
+
+    def update(self) -> tuple[int, int]:
+        """Bring the index in line with the case files; return (reindexed, removed)."""
+        known = {
+            path: (file_id, mtime_ns, size, digest)
+            for file_id, path, mtime_ns, size, digest in self.conn.execute(
+                "SELECT id, path, mtime_ns, size, hash FROM search_files"
+            )
+        }
+        reindexed = removed = 0
+        with CaseFiles(self.kb_dir) as cases, self.conn:
+            on_disk = self._scan(cases)
+            for path in known.keys() - on_disk.keys():
+                file_id = known[path][0]
+                self.conn.execute("DELETE FROM search_fts WHERE rowid = ?", (file_id,))
+                self.conn.execute("DELETE FROM search_files WHERE id = ?", (file_id,))
+                removed += 1
+            for path, (mtime_ns, size) in on_disk.items():
+                entry = known.get(path)
+                if entry is not None and entry[1:3] == (mtime_ns, size):
+                    continue
+                sig, name = path.split("/", 1)
+                body = cases.read_text(sig, name)
+                digest = hashlib.sha1(body.encode("utf-8")).hexdigest()
+                if entry is not None and entry[3] == digest:
+                    self.conn.execute(
+                        "UPDATE search_files SET mtime_ns = ?, size = ? WHERE id = ?",
+                        (mtime_ns, size, entry[0]),
+                    )
+                    continue
+                if entry is not None:
+                    self.conn.execute("DELETE FROM search_fts WHERE rowid = ?", (entry[0],))
+                    self.conn.execute(
+                        "UPDATE search_files SET mtime_ns = ?, size = ?, hash = ? WHERE id = ?",
+                        (mtime_ns, size, digest, entry[0]),
+                    )
+                    file_id = entry[0]
+                else:
+                    file_id = self.conn.execute(
+                        "INSERT INTO search_files (path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)",
+                        (path, mtime_ns, size, digest),
+                    ).lastrowid
+                kind = name.removesuffix(".md")
+                self.conn.execute(
+                    "INSERT INTO search_fts (rowid, sig, kind, body) VALUES (?, ?, ?, ?)",
+                    (file_id, sig, kind, body),
+                )
+                reindexed += 1
+        return reindexed, removed
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        raw: bool = False,
+        highlight: tuple[str, str] = ("[", "]"),
+    ) -> list[SearchHit]:
+        """Return the best-matching file per case, BM25-ranked, at most ``limit`` cases."""
+        match = query if raw else fts_query(query)
+        if not match:
+            return []
+        rows = self.conn.execute(
+            """
+            SELECT sig, kind, bm25(search_fts) AS score,
+                   snippet(search_fts, 2, ?, ?, ' ... ', 16)
+            FROM search_fts WHERE search_fts MATCH ?
+            ORDER BY score LIMIT ?
+            """,
+            (*highlight, match, limit * len(INDEXED_FILES)),
+        )
+        hits: dict[str, SearchHit] = {}
+        for sig, kind, score, snippet in rows:
+            if sig not in hits:
+                # bm25() is lower-is-better; report higher-is-better scores.
+                hits[sig] = SearchHit(sig, kind, round(-score, 4), " ".join(snippet.split()))
+                if len(hits) == limit:
+                    break
+        return list(hits.values())
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Search Error KB cases")
+    ap.add_argument("query", help="Words to search for (all must match)")
+    ap.add_argument("--limit", type=int, default=10, help="Maximum cases to show (default 10)")
+    ap.add_argument("--raw", action="store_true", help="Pass the query through as FTS5 syntax")
+    ap.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = ap.parse_args()
+
+    start = time.perf_counter()
+    with KBSearchIndex() as index:
+        index.update()
+        indexed = time.perf_counter()
+        bold = sys.stdout.isatty() and not args.json
+        highlight = ("\033[1m", "\033[0m") if bold else ("[", "]")
+        try:
+            hits = index.search(args.query, limit=args.limit, raw=args.raw, highlight=highlight)
+        except sqlite3.OperationalError as exc:
+            print(f"Invalid search query: {exc}", file=sys.stderr)
+            return 2
+    done = time.perf_counter()
+
+    if args.json:
+        print(json.dumps([asdict(h) for h in hits], indent=2))
+        return 0
+    for hit in hits:
+        print(f"{hit.score:8.3f}  {hit.sig}  {hit.kind}.md")
+        print(f"          {hit.snippet}")
+    print(
+        f"{len(hits)} case(s) in {(done - indexed) * 1000:.1f} ms "
+        f"(index refresh {(indexed - start) * 1000:.1f} ms)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,278 @@
+"""Signature normalization and MinHash/LSH near-duplicate search for the Error KB.
+
+``normalize_text`` masks tokens that change between runs of the same failure
+(timestamps, PIDs, temp paths, memory addresses, line numbers), so the exact
+signature in ``record_failure.py`` is stable across reruns.
+
+``SimilarityIndex`` keeps a MinHash sketch per case in the KB's SQLite index
+(``kb_index.sqlite3``). Sketches are split into LSH bands; a query only reads
+the cases sharing at least one band bucket, so lookups stay fast with 100k+
+cases. With 32 bands of 4 rows, pairs above ~0.5 Jaccard similarity are
+almost always found.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import operator
+import random
+import re
+import sqlite3
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from kb_pack import CaseFiles  # noqa: E402
+
+DEFAULT_DB = Path(".ops/error_kb/kb_index.sqlite3")
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+_PRIME = (1 << 61) - 1
+_SEED = 20240501
+
+# Applied in order; earlier patterns win (e.g. temp paths before line numbers).
+_MASKS: tuple[tuple[re.Pattern[str], str], ...] = (
+    (
+        re.compile(
+            r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+        ),
+        "<TS>",
+    ),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}\b"), "<DATE>"),
+    (re.compile(r"\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<TIME>"),
+    (re.compile(r"\b\d{8}_\d{6}\b"), "<TS>"),
+    (
+        re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I),
+        "<UUID>",
+    ),
+    (re.compile(r"\b0x[0-9a-f]{4,}\b", re.I), "<ADDR>"),
+    (
+        re.compile(r"(?:/private)?(?:/tmp|/var/tmp|/var/folders|/dev/shm)(?:/[^\s'\":]*)?"),
+        "<TMP>",
+    ),
+    (re.compile(r"[A-Za-z]:\\[^\s'\"]*\\Temp\\[^\s'\":]*", re.I), "<TMP>"),
+    (re.compile(r"\b(?:tmp[a-z0-9_]{6,}|pytest-of-[\w.-]+)", re.I), "<TMP>"),
+    (re.compile(r"\b(pid|process|thread|tid)([ =:#]+)\d+", re.I), r"\1\2<PID>"),
+    (re.compile(r"\[\d{2,}\]"), "[<PID>]"),
+    (re.compile(r"\bline \d+", re.I), "line <N>"),
+    (re.compile(r"(\.\w+):\d+(?::\d+)?\b"), r"\1:<N>"),
+)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def normalize_line(line: str) -> str:
+    """Mask volatile tokens in one stripped line (no mask spans a line break)."""
+    for pattern, repl in _MASKS:
+        line = pattern.sub(repl, line)
+    return line
+
+
+def normalize_text(text: str) -> str:
+    """Strip blank lines and surrounding whitespace, then mask volatile tokens."""
+    norm = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    return normalize_line(norm)
+
+
+_rng = random.Random(_SEED)
+_HASH_A = _rng.randrange(1, _PRIME)
+_HASH_B = _rng.randrange(_PRIME)
+del _rng
+_VALUE_BITS = 54  # 61-bit hash = 7 bits of bin index (128 bins) + 54 bits of value
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+_EMPTY = 1 << 63
+
+
+class MinHasher:
+    """Incremental MinHash over token ``SHINGLE_SIZE``-grams of normalized text.
+
+    Feed text in order with ``update()`` (shingles span the pieces), then
+    call ``digest()``. Memory use is constant in the amount of text.
+
+    Uses one-permutation hashing: each shingle is hashed once and kept as the
+    minimum of one of ``NUM_PERM`` bins, so the cost is linear in the number
+    of shingles. Empty bins borrow the next non-empty bin's value, offset by
+    the distance, which keeps the estimate unbiased for short texts.
+    """
+
+    def __init__(self) -> None:
+        self._bins = [_EMPTY] * NUM_PERM
+        self._carry: list[str] = []
+        self._tokens = 0
+
+    def update(self, normalized: str) -> None:
+        new = _TOKEN_RE.findall(normalized)
+        if not new:
+            return
+        self._tokens += len(new)
+        tokens = self._carry + new
+        bins = self._bins
+        for i in range(len(tokens) - SHINGLE_SIZE + 1):
+            x = zlib.crc32(" ".join(tokens[i : i + SHINGLE_SIZE]).encode("utf-8"))
+            h = (_HASH_A * x + _HASH_B) % _PRIME
+            b = h >> _VALUE_BITS
+            v = h & _VALUE_MASK
+            if v < bins[b]:
+                bins[b] = v
+        self._carry = tokens[-(SHINGLE_SIZE - 1) :]
+
+    def digest(self) -> array:
+        bins = list(self._bins)
+        if 0 < self._tokens < SHINGLE_SIZE:
+            # Too short for a single shingle: hash all tokens as one.
+            x = zlib.crc32(" ".join(self._carry).encode("utf-8"))
+            h = (_HASH_A * x + _HASH_B) % _PRIME
+            bins[h >> _VALUE_BITS] = h & _VALUE_MASK
+        if _EMPTY in bins and any(v != _EMPTY for v in bins):
+            filled = list(bins)
+            for i, v in enumerate(bins):
+                if v == _EMPTY:
+                    j = 1
+                    while bins[(i + j) % NUM_PERM] == _EMPTY:
+                        j += 1
+                    filled[i] = bins[(i + j) % NUM_PERM] + (j << _VALUE_BITS)
+            bins = filled
+        return array("Q", bins)
+
+
+def minhash(normalized: str) -> array:
+    """Return the ``NUM_PERM``-value MinHash sketch of ``normalized`` text."""
+    hasher = MinHasher()
+    hasher.update(normalized)
+    return hasher.digest()
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity of two sketches."""
+    return sum(map(operator.eq, a, b)) / NUM_PERM
+
+
+def _band_keys(sketch: array) -> list[int]:
+    keys = []
+    for band in range(BANDS):
+        chunk = sketch[band * ROWS : (band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+class SimilarityIndex:
+    """MinHash sketches and LSH buckets for KB cases, stored in SQLite."""
+
+    def __init__(self, path: str | Path = DEFAULT_DB) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS minhash (
+                sig TEXT PRIMARY KEY,
+                sketch BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS lsh (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                sig TEXT NOT NULL,
+                PRIMARY KEY (band, bucket, sig)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS lsh_sig ON lsh (sig);
+            """
+        )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> SimilarityIndex:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM minhash").fetchone()[0]
+
+    def add(self, sig: str, sketch: array) -> None:
+        """Insert or replace the sketch for ``sig``."""
+        self.add_many([(sig, sketch)])
+
+    def add_many(self, items: list[tuple[str, array]]) -> None:
+        """Insert or replace several sketches in one transaction."""
+        with self.conn:
+            for sig, sketch in items:
+                self.conn.execute("DELETE FROM lsh WHERE sig = ?", (sig,))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO minhash (sig, sketch) VALUES (?, ?)",
+                    (sig, sketch.tobytes()),
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO lsh (band, bucket, sig) VALUES (?, ?, ?)",
+                    [(band, key, sig) for band, key in enumerate(_band_keys(sketch))],
+                )
+
+    def remove(self, sig: str) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM lsh WHERE sig = ?", (sig,))
+            self.conn.execute("DELETE FROM minhash WHERE sig = ?", (sig,))
+
+    def query(
+        self, sketch: array, k: int = 5, exclude: str | None = None, min_score: float = 0.0
+    ) -> list[tuple[str, float]]:
+        """Return up to ``k`` ``(sig, score)`` pairs most similar to ``sketch``, best first."""
+        pairs = list(enumerate(_band_keys(sketch)))
+        values = ",".join("(?, ?)" for _ in pairs)
+        rows = self.conn.execute(
+            f"""
+            SELECT m.sig, m.sketch FROM minhash AS m
+            JOIN (SELECT DISTINCT sig FROM lsh WHERE (band, bucket) IN (VALUES {values})) AS c
+            ON c.sig = m.sig
+            """,
+            [v for pair in pairs for v in pair],
+        )
+        scored = []
+        for sig, blob in rows:
+            if sig == exclude:
+                continue
+            score = similarity(sketch, array("Q", blob))
+            if score >= min_score:
+                scored.append((sig, score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:k]
+
+
+def symptoms_text(case_dir: Path) -> str:
+    """Return the captured output from a case's ``symptoms.md`` (the fenced block)."""
+    return fenced_text((case_dir / "symptoms.md").read_text(encoding="utf-8", errors="ignore"))
+
+
+def fenced_text(text: str) -> str:
+    start = text.find("```\n")
+    end = text.rfind("\n```")
+    return text[start + 4 : end] if start != -1 and end > start else text
+
+
+def rebuild(cases_dir: Path, path: str | Path = DEFAULT_DB) -> int:
+    """Re-sketch every case under ``cases_dir``, loose or packed; return the number indexed."""
+    items = []
+    with CaseFiles(cases_dir.parent) as cases:
+        for sig in cases.sigs():
+            if cases.exists(sig, "symptoms.md"):
+                text = fenced_text(cases.read_text(sig, "symptoms.md"))
+                items.append((sig, minhash(normalize_text(text))))
+    with SimilarityIndex(path) as index:
+        with index.conn:
+            index.conn.execute("DELETE FROM lsh")
+            index.conn.execute("DELETE FROM minhash")
+        index.add_many(items)
+    return len(items)
+
+
+if __name__ == "__main__":
+    n = rebuild(Path(".ops/error_kb/cases"))
+    print(f"Indexed {n} case(s) into {DEFAULT_DB}")
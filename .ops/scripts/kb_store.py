@@ -0,0 +1,448 @@
+"""Append-only Error KB index: a JSONL journal plus a derived SQLite index.
+
+``journal.jsonl`` is the source of truth and is committed with the cases.
+Every event is one line, appended under an exclusive ``flock`` so
+concurrent ``make diagnose`` runs never interleave or lose writes. The same
+lock (``journal_lock``) is held while case directories are written, so
+``kb_compact.py`` never merges or packs a case that is being recorded.
+
+``kb_index.sqlite3`` (WAL mode, gitignored) is derived from the journal. It
+records how far into the journal it has applied, and catches up on open,
+so a deleted or stale index is rebuilt transparently.
+
+Usage:
+    python .ops/scripts/kb_store.py migrate   # one-shot import of error_index.json
+    python .ops/scripts/kb_store.py rebuild   # re-derive the SQLite index from the journal
+    python .ops/scripts/kb_store.py show <sig>
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+KB_DIR = Path(".ops/error_kb")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cases (
+    sig TEXT PRIMARY KEY,
+    case_dir TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS occurrences (
+    id INTEGER PRIMARY KEY,
+    sig TEXT NOT NULL,
+    seen_at TEXT NOT NULL,
+    env_fingerprint TEXT,
+    log_path TEXT
+);
+CREATE INDEX IF NOT EXISTS occurrences_sig ON occurrences (sig, seen_at);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    sig TEXT PRIMARY KEY,
+    target TEXT NOT NULL
+);
+"""
+
+
+_lock_guard = threading.Lock()
+_journal_locks: dict[str, threading.RLock] = {}
+_lock_depth: dict[str, int] = {}
+
+
+@contextmanager
+def journal_lock(kb_dir: str | Path = KB_DIR) -> Iterator[None]:
+    """Hold the KB's exclusive journal lock; reentrant within a process."""
+    path = os.path.abspath(os.path.join(kb_dir, ".journal.lock"))
+    with _lock_guard:
+        rlock = _journal_locks.setdefault(path, threading.RLock())
+    with rlock:
+        depth = _lock_depth.get(path, 0)
+        if depth:
+            # flock would block on a second descriptor held by this very process.
+            _lock_depth[path] = depth + 1
+            try:
+                yield
+            finally:
+                _lock_depth[path] = depth
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            _lock_depth[path] = 1
+            try:
+                yield
+            finally:
+                _lock_depth[path] = 0
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@dataclass(frozen=True)
+class CaseStats:
+    sig: str
+    case_dir: str
+    first_seen: str
+    last_seen: str
+    count: int
+
+
+def utc_now() -> str:
+    return datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def fingerprint_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class KBStore:
+    """Error KB occurrences: append to the journal, query through SQLite."""
+
+    def __init__(self, kb_dir: str | Path = KB_DIR) -> None:
+        self.kb_dir = Path(kb_dir)
+        self.kb_dir.mkdir(parents=True, exist_ok=True)
+        self.journal = self.kb_dir / "journal.jsonl"
+        self.lock_path = self.kb_dir / ".journal.lock"
+        self.conn = sqlite3.connect(self.kb_dir / "kb_index.sqlite3", timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        with self._locked():
+            legacy = self.kb_dir / "error_index.json"
+            if legacy.exists():
+                self._migrate_json(legacy)
+            self._catch_up()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> KBStore:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _locked(self) -> AbstractContextManager[None]:
+        return journal_lock(self.kb_dir)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the journal lock with the index caught up.
+
+        Writers hold it from ``resolve()`` until the case directory is written.
+        """
+        with self._locked():
+            self._catch_up()
+            yield
+
+    def _offset(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'journal_offset'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _apply(self, event: dict) -> None:
+        if event["event"] == "fingerprint":
+            self.conn.execute(
+                "INSERT OR IGNORE INTO fingerprints (hash, text) VALUES (?, ?)",
+                (event["hash"], event["text"]),
+            )
+            return
+        if event["event"] == "merge":
+            self._apply_merge(event["sig"], event["into"])
+            return
+        sig, seen_at = self.resolve(event["sig"]), event["seen_at"]
+        self.conn.execute(
+            """
+            INSERT INTO cases (sig, case_dir, first_seen, last_seen, count)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT (sig) DO UPDATE SET
+                first_seen = min(first_seen, excluded.first_seen),
+                last_seen = max(last_seen, excluded.last_seen),
+                count = count + 1
+            """,
+            (sig, event["case_dir"], seen_at, seen_at),
+        )
+        self.conn.execute(
+            "INSERT INTO occurrences (sig, seen_at, env_fingerprint, log_path) VALUES (?, ?, ?, ?)",
+            (sig, seen_at, event.get("env_fingerprint"), event.get("log_path")),
+        )
+
+    def _apply_merge(self, sig: str, into: str) -> None:
+        into = self.resolve(into)
+        if sig == into:
+            return
+        row = self.conn.execute(
+            "SELECT case_dir, first_seen, last_seen, count FROM cases WHERE sig = ?", (sig,)
+        ).fetchone()
+        if row is not None:
+            case_dir, first_seen, last_seen, count = row
+            self.conn.execute(
+                """
+                INSERT INTO cases (sig, case_dir, first_seen, last_seen, count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (sig) DO UPDATE SET
+                    first_seen = min(first_seen, excluded.first_seen),
+                    last_seen = max(last_seen, excluded.last_seen),
+                    count = count + excluded.count
+                """,
+                (into, str(Path(case_dir).with_name(into)), first_seen, last_seen, count),
+            )
+            self.conn.execute("DELETE FROM cases WHERE sig = ?", (sig,))
+        self.conn.execute("UPDATE occurrences SET sig = ? WHERE sig = ?", (into, sig))
+        self.conn.execute("UPDATE aliases SET target = ? WHERE target = ?", (into, sig))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO aliases (sig, target) VALUES (?, ?)", (sig, into)
+        )
+
+    def _catch_up(self) -> None:
+        """Apply journal lines past the stored offset. Caller holds the lock."""
+        offset = self._offset()
+        try:
+            size = self.journal.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if size < offset:  # Journal replaced or truncated: start over.
+            self._reset()
+            offset = 0
+        if size == offset:
+            return
+        with open(self.journal, "rb") as f, self.conn:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Torn final line; leave it for a later catch-up.
+                offset += len(raw)
+                try:
+                    event = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue  # Line torn by a crash mid-write; the next append ended it.
+                self._apply(event)
+            self._set_offset(offset)
+
+    def _set_offset(self, offset: int) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('journal_offset', ?)",
+            (str(offset),),
+        )
+
+    def _reset(self) -> None:
+        with self.conn:
+            for table in ("cases", "occurrences", "fingerprints", "aliases", "meta"):
+                self.conn.execute(f"DELETE FROM {table}")
+
+    def _append(self, events: list[dict]) -> None:
+        """Append events to the journal and apply them. Caller holds the lock."""
+        data = "".join(json.dumps(e, sort_keys=True) + "\n" for e in events).encode("utf-8")
+        fd = os.open(self.journal, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                data = b"\n" + data
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._catch_up()
+
+    def record(
+        self,
+        sig: str,
+        case_dir: str | Path,
+        env_fingerprint: str | None = None,
+        log_path: str | Path | None = None,
+        seen_at: str | None = None,
+    ) -> CaseStats:
+        """Record one occurrence of ``sig`` and return the case's updated stats.
+
+        ``env_fingerprint`` text is journaled once per distinct fingerprint;
+        occurrences refer to it by hash.
+        """
+        entry = {
+            "sig": sig,
+            "case_dir": case_dir,
+            "env_fingerprint": env_fingerprint,
+            "log_path": log_path,
+            "seen_at": seen_at,
+        }
+        return self.record_many([entry])[0]
+
+    def record_many(self, entries: list[dict]) -> list[CaseStats]:
+        """Record several occurrences with one journal append and one SQLite transaction.
+
+        Each entry takes the keyword arguments of ``record``. Returns the
+        updated stats of each entry's case, in order.
+        """
+        events: list[dict] = []
+        fingerprints: dict[str, str] = {}
+        for entry in entries:
+            env_fingerprint = entry.get("env_fingerprint")
+            fp_hash = fingerprint_hash(env_fingerprint) if env_fingerprint else None
+            if fp_hash:
+                fingerprints[fp_hash] = env_fingerprint  # type: ignore[assignment]
+            log_path = entry.get("log_path")
+            events.append(
+                {
+                    "event": "occurrence",
+                    "sig": entry["sig"],
+                    "case_dir": str(entry["case_dir"]),
+                    "seen_at": entry.get("seen_at") or utc_now(),
+                    "env_fingerprint": fp_hash,
+                    "log_path": str(log_path) if log_path else None,
+                }
+            )
+        if not events:
+            return []
+        with self._locked():
+            self._catch_up()
+            new = [
+                {"event": "fingerprint", "hash": fp_hash, "text": text}
+                for fp_hash, text in fingerprints.items()
+                if not self.conn.execute(
+                    "SELECT 1 FROM fingerprints WHERE hash = ?", (fp_hash,)
+                ).fetchone()
+            ]
+            self._append(new + events)
+        stats = {sig: self.get(self.resolve(sig)) for sig in {e["sig"] for e in events}}
+        return [stats[e["sig"]] for e in events]  # type: ignore[misc]
+
+    def merge(self, sig: str, into: str) -> None:
+        """Fold case ``sig`` into ``into``: occurrences move over and ``sig`` becomes an alias.
+
+        Later occurrences recorded under ``sig`` are counted against ``into``.
+        """
+        with self._locked():
+            self._catch_up()
+            self._append([{"event": "merge", "sig": sig, "into": into, "at": utc_now()}])
+
+    def resolve(self, sig: str) -> str:
+        """The case ``sig`` is recorded under (itself unless it was merged away)."""
+        row = self.conn.execute("SELECT target FROM aliases WHERE sig = ?", (sig,)).fetchone()
+        return row[0] if row else sig
+
+    def get(self, sig: str) -> CaseStats | None:
+        row = self.conn.execute(
+            "SELECT sig, case_dir, first_seen, last_seen, count FROM cases WHERE sig = ?", (sig,)
+        ).fetchone()
+        return CaseStats(*row) if row else None
+
+    def occurrences(self, sig: str) -> list[dict]:
+        rows = self.conn.execute(
+            """
+            SELECT o.seen_at, o.log_path, o.env_fingerprint, f.text
+            FROM occurrences AS o LEFT JOIN fingerprints AS f ON f.hash = o.env_fingerprint
+            WHERE o.sig = ? ORDER BY o.seen_at, o.id
+            """,
+            (sig,),
+        )
+        return [
+            {"seen_at": r[0], "log_path": r[1], "env_fingerprint": r[2], "env": r[3]}
+            for r in rows
+        ]
+
+    def cases(self) -> list[CaseStats]:
+        rows = self.conn.execute(
+            "SELECT sig, case_dir, first_seen, last_seen, count FROM cases ORDER BY last_seen DESC"
+        )
+        return [CaseStats(*r) for r in rows]
+
+    def rebuild(self) -> int:
+        """Drop the SQLite index and re-derive it from the journal; return the case count."""
+        with self._locked():
+            self._reset()
+            self._catch_up()
+        return len(self.cases())
+
+    def _migrate_json(self, legacy: Path) -> int:
+        """Import ``error_index.json`` once, then rename it. Caller holds the lock."""
+        index = json.loads(legacy.read_text(encoding="utf-8") or "{}")
+        events = []
+        for sig, entry in sorted(index.items()):
+            for case_dir in entry.get("cases", []):
+                events.append(
+                    {
+                        "event": "occurrence",
+                        "sig": sig,
+                        "case_dir": case_dir,
+                        "seen_at": _captured_at(Path(case_dir)),
+                        "env_fingerprint": None,
+                        "log_path": None,
+                        "migrated": True,
+                    }
+                )
+        if events:
+            self._catch_up()
+            self._append(events)
+        legacy.rename(legacy.with_name(legacy.name + ".migrated"))
+        return len(events)
+
+
+_CAPTURED_RE = re.compile(r"^Captured: (\S+)", re.M)
+
+
+def _captured_at(case_dir: Path) -> str:
+    """Best-effort first-seen time for a legacy case: its ``Captured:`` line or mtime."""
+    symptoms = case_dir / "symptoms.md"
+    try:
+        match = _CAPTURED_RE.search(symptoms.read_text(encoding="utf-8", errors="ignore"))
+        if match:
+            return match.group(1)
+        mtime = symptoms.stat().st_mtime
+    except OSError:
+        return utc_now()
+    return datetime.fromtimestamp(mtime, UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def main(argv: list[str]) -> int:
+    if not argv or argv[0] not in ("migrate", "rebuild", "show"):
+        print("Usage: python .ops/scripts/kb_store.py migrate|rebuild|show <sig>")
+        return 2
+    # Opening the store performs the migration and catch-up.
+    with KBStore() as store:
+        if argv[0] == "rebuild":
+            print(f"Rebuilt index: {store.rebuild()} case(s)")
+        elif argv[0] == "migrate":
+            print(f"Index up to date: {len(store.cases())} case(s)")
+        else:
+            if len(argv) < 2:
+                print("Usage: python .ops/scripts/kb_store.py show <sig>")
+                return 2
+            stats = store.get(argv[1])
+            if stats is None:
+                print(f"Unknown signature: {argv[1]}")
+                return 1
+            print(
+                f"{stats.sig}: {stats.count} occurrence(s), first seen {stats.first_seen}, "
+                f"last seen {stats.last_seen} -> {stats.case_dir}"
+            )
+            for occ in store.occurrences(stats.sig):
+                env = occ["env_fingerprint"] or "-"
+                print(f"  {occ['seen_at']}  env={env}  {occ['log_path'] or ''}".rstrip())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
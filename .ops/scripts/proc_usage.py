@@ -0,0 +1,166 @@
+"""Resource usage of a command's whole process tree (Linux, with POSIX fallbacks).
+
+- CPU time, peak RSS, context switches, page faults and block I/O come
+  from ``wait4`` on the command's shell. The kernel folds in every
+  descendant that was waited for, so this covers the tree.
+- Byte and syscall I/O counts come from ``/proc/<pid>/io``, read while the
+  shell is an unreaped zombie (``waitid(WNOWAIT)``). It carries the same
+  per-tree totals.
+- Peak *combined* RSS and process count (``max_rss_kb`` is the largest single
+  process) are sampled from ``/proc`` while the command runs, by scanning
+  for members of its process group.
+
+Linux carries a process's RSS high-water mark across ``exec``. So
+``max_rss_kb`` is never below the size of the interpreter that forked the
+shell (about 20-30 MiB), while ``peak_tree_rss_kb`` is accurate to the
+sampling interval.
+
+Fields the platform cannot provide are ``None``.
+"""
+
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+# ru_maxrss is in kilobytes on Linux, bytes on macOS.
+MAXRSS_DIV = 1024 if sys.platform == "darwin" else 1
+
+
+@dataclass
+class ResourceUsage:
+    wall_s: float
+    user_s: float
+    sys_s: float
+    max_rss_kb: int
+    peak_tree_rss_kb: int | None
+    peak_procs: int | None
+    voluntary_ctx_switches: int
+    involuntary_ctx_switches: int
+    minor_faults: int
+    major_faults: int
+    block_in: int
+    block_out: int
+    read_bytes: int | None
+    write_bytes: int | None
+    read_chars: int | None
+    write_chars: int | None
+    read_syscalls: int | None
+    write_syscalls: int | None
+    term_signal: str | None  # e.g. "SIGKILL" (also what the OOM killer sends)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class TreeSampler:
+    """Track peak combined RSS and process count of one process group via ``/proc``."""
+
+    def __init__(self, pgid: int) -> None:
+        self.pgid = pgid
+        self.peak_rss_kb: int | None = None
+        self.peak_procs: int | None = None
+        self.enabled = os.path.isdir("/proc/self")
+
+    def sample(self) -> None:
+        if not self.enabled:
+            return
+        rss = procs = 0
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/stat", "rb") as f:
+                    stat = f.read()
+            except OSError:
+                continue  # exited, or not ours to read
+            # Fields after the parenthesized command name: state is [0], pgrp [2], rss [21].
+            fields = stat[stat.rfind(b")") + 2 :].split()
+            if int(fields[2]) != self.pgid:
+                continue
+            procs += 1
+            rss += int(fields[21]) * PAGE_KB
+        self.peak_rss_kb = max(self.peak_rss_kb or 0, rss)
+        self.peak_procs = max(self.peak_procs or 0, procs)
+
+
+def wait_exited(pid: int, timeout: float | None = None) -> bool:
+    """Wait for child ``pid`` to exit without reaping it; False on timeout."""
+    if timeout is None:
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+        return True
+    end = time.monotonic() + timeout
+    while os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+        if time.monotonic() >= end:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def read_proc_io(pid: int) -> dict[str, int]:
+    try:
+        with open(f"/proc/{pid}/io", encoding="ascii") as f:
+            return {k: int(v) for k, v in (line.split(":") for line in f)}
+    except OSError:
+        return {}
+
+
+def reap(
+    proc: subprocess.Popen, started: float, sampler: TreeSampler | None = None
+) -> ResourceUsage:
+    """Reap ``proc`` (blocking until it exits), set its returncode and return its usage."""
+    wait_exited(proc.pid)
+    io = read_proc_io(proc.pid)
+    _, status, ru = os.wait4(proc.pid, 0)
+    wall = time.monotonic() - started
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    code = proc.returncode
+    # Killed directly (negative), or a shell reporting a killed child as 128+N.
+    signum = -code if code < 0 else code - 128 if code > 128 else 0
+    try:
+        term = signal.Signals(signum).name if signum else None
+    except ValueError:
+        term = None
+    return ResourceUsage(
+        wall_s=round(wall, 6),
+        user_s=round(ru.ru_utime, 6),
+        sys_s=round(ru.ru_stime, 6),
+        max_rss_kb=ru.ru_maxrss // MAXRSS_DIV,
+        peak_tree_rss_kb=sampler.peak_rss_kb if sampler else None,
+        peak_procs=sampler.peak_procs if sampler else None,
+        voluntary_ctx_switches=ru.ru_nvcsw,
+        involuntary_ctx_switches=ru.ru_nivcsw,
+        minor_faults=ru.ru_minflt,
+        major_faults=ru.ru_majflt,
+        block_in=ru.ru_inblock,
+        block_out=ru.ru_oublock,
+        read_bytes=io.get("read_bytes"),
+        write_bytes=io.get("write_bytes"),
+        read_chars=io.get("rchar"),
+        write_chars=io.get("wchar"),
+        read_syscalls=io.get("syscr"),
+        write_syscalls=io.get("syscw"),
+        term_signal=term,
+    )
+
+
+def format_usage(u: ResourceUsage) -> str:
+    parts = [
+        f"wall {u.wall_s:.2f}s",
+        f"user {u.user_s:.2f}s",
+        f"sys {u.sys_s:.2f}s",
+        f"maxrss {u.max_rss_kb / 1024:.1f} MiB",
+    ]
+    if u.peak_tree_rss_kb is not None:
+        parts.append(f"tree rss {u.peak_tree_rss_kb / 1024:.1f} MiB ({u.peak_procs} procs)")
+    parts.append(f"ctx {u.voluntary_ctx_switches}/{u.involuntary_ctx_switches}")
+    if u.read_chars is not None:
+        parts.append(f"io r {u.read_chars:,} B w {u.write_chars:,} B")
+    if u.term_signal:
+        parts.append(f"killed by {u.term_signal}")
+    return ", ".join(parts)
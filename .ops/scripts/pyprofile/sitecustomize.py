@@ -0,0 +1,119 @@
+"""Sampling profiler injected into Python processes run by ``diagnose.py --profile``.
+
+diagnose puts this directory first on ``PYTHONPATH``. Every Python
+process in the command's tree then imports this module at startup. It
+starts a daemon thread that samples all threads' stacks every
+``DIAGNOSE_PROFILE_INTERVAL`` seconds. Samples are written as collapsed
+stacks (``frame;frame;frame count``, the input format of flamegraph.pl and
+speedscope) to ``$DIAGNOSE_PROFILE_DIR/<pid>.collapsed``. The file is
+rewritten every quarter second and at exit (including multiprocessing
+children, which leave through ``os._exit``), so a killed process loses at
+most the last quarter second of samples.
+
+Any other ``sitecustomize`` on the path is still imported afterwards.
+"""
+
+from __future__ import annotations
+
+import atexit
+import importlib
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+_OUT_DIR = os.environ.get("DIAGNOSE_PROFILE_DIR")
+_FLUSH_EVERY = 0.25
+
+
+def _frame_name(code) -> str:
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{'/'.join(parts[-2:])}:{code.co_qualname}"
+
+
+class _Sampler:
+    def __init__(self, out_dir: str, interval: float) -> None:
+        self.path = os.path.join(out_dir, f"{os.getpid()}.collapsed")
+        self.interval = interval
+        self.root = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+        self.counts: Counter[str] = Counter()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="diagnose-profiler", daemon=True)
+
+    def _sample(self, own: int) -> None:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(self.root)
+            with self.lock:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        next_flush = time.monotonic() + _FLUSH_EVERY
+        while True:
+            time.sleep(self.interval)
+            self._sample(own)
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + _FLUSH_EVERY
+
+    def flush(self) -> None:
+        with self.lock:
+            lines = [f"{stack} {n}\n" for stack, n in self.counts.items()]
+        if not lines:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp, self.path)
+
+
+_sampler: _Sampler | None = None
+
+
+def _start() -> None:
+    """Start sampling this process (again after a fork: the child gets its own file)."""
+    global _sampler
+    interval = float(os.environ.get("DIAGNOSE_PROFILE_INTERVAL", "0.01"))
+    _sampler = _Sampler(_OUT_DIR, interval)  # type: ignore[arg-type]
+    _sampler.thread.start()
+
+
+def _flush() -> None:
+    if _sampler is not None:
+        _sampler.flush()
+
+
+def _start_child() -> None:
+    _start()
+    mp_util = sys.modules.get("multiprocessing.util")
+    if mp_util is not None:
+        # Process._bootstrap runs these finalizers, then os._exit()s past atexit.
+        mp_util.Finalize(None, _flush, exitpriority=0)
+
+
+def _chain() -> None:
+    """Import the ``sitecustomize`` this module shadows, if there is one."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    module = sys.modules.pop(__name__)
+    saved = sys.path[:]
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or ".") != here]
+    try:
+        importlib.import_module("sitecustomize")
+    except ImportError:
+        sys.modules[__name__] = module
+    finally:
+        sys.path[:] = saved
+
+
+if _OUT_DIR:
+    _start()
+    atexit.register(_flush)
+    os.register_at_fork(after_in_child=_start_child)
+_chain()
@@ -1,47 +1,140 @@
+import argparse
 import hashlib
-import json
 import sys
-from datetime import datetime
+from dataclasses import dataclass, field
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fingerprint_env import diff_fingerprints, parse_fingerprint  # noqa: E402
+from kb_frames import FrameIndex  # noqa: E402
+from kb_ingest import COMPRESSORS, digest_file, write_case  # noqa: E402
+from kb_pack import CaseFiles  # noqa: E402
+from kb_similarity import SimilarityIndex, normalize_text  # noqa: E402
+from kb_store import CaseStats, KBStore  # noqa: E402
+
 KB_DIR = Path(".ops/error_kb")
 CASES_DIR = KB_DIR / "cases"
-INDEX = KB_DIR / "error_index.json"
+STAGING_DIR = KB_DIR / ".staging"
+SIMILARITY_DB = KB_DIR / "kb_index.sqlite3"
 
 
-def signature_from_text(text: str) -> str:
-    norm = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+def signature_from_normalized(norm: str) -> str:
     return hashlib.sha256(norm.encode("utf-8")).hexdigest()[:16]
 
 
-def main() -> int:
-    if len(sys.argv) < 2:
-        print("Usage: python .ops/scripts/record_failure.py <path_to_error_log.txt>")
-        return 2
+def signature_from_text(text: str) -> str:
+    return signature_from_normalized(normalize_text(text))
+
+
+@dataclass
+class Recorded:
+    sig: str
+    case_dir: Path
+    stats: CaseStats
+    similar: list[tuple[str, float]]
+    env_changes: list[str] = field(default_factory=list)  # since the previous occurrence
+
+
+def record(
+    log: str | Path,
+    env_fingerprint: str | None = None,
+    top_k: int = 5,
+    min_score: float = 0.3,
+    compress: str = "gzip",
+    occurrences: int = 1,
+) -> Recorded:
+    """Record the failure log at ``log`` (``env_fingerprint`` is the fingerprint text).
+
+    ``occurrences`` > 1 records that many sightings of the same failure at once.
+    """
+    # Single streaming pass: memory stays bounded however large the log is.
+    digest = digest_file(log, STAGING_DIR, compress)
+
+    with KBStore(KB_DIR) as store, store.locked():
+        sig = store.resolve(digest.sig)  # merged by kb-compact into another case
+        case_dir = CASES_DIR / sig
+        with CaseFiles(KB_DIR) as cases:
+            cases.unpack(sig)  # a packed case that recurs is no longer cold
+        write_case(case_dir, digest)
+        entry = {
+            "sig": sig,
+            "case_dir": case_dir,
+            "env_fingerprint": env_fingerprint,
+            "log_path": log,
+        }
+        stats = store.record_many([entry] * occurrences)[-1]
+        env_changes = _env_changes(store, sig, env_fingerprint, occurrences)
 
-    error_text = Path(sys.argv[1]).read_text(encoding="utf-8", errors="ignore")
-    sig = signature_from_text(error_text)
+    with SimilarityIndex(SIMILARITY_DB) as similar:
+        matches = similar.query(digest.sketch, k=top_k, exclude=sig, min_score=min_score)
+        if sig == digest.sig:
+            similar.add(sig, digest.sketch)
+    if sig == digest.sig:
+        with FrameIndex(KB_DIR) as frames:
+            frames.replace(sig, digest.traces)
+    return Recorded(sig, case_dir, stats, matches, env_changes)
 
-    case_dir = CASES_DIR / sig
-    case_dir.mkdir(parents=True, exist_ok=True)
 
-    (case_dir / "symptoms.md").write_text(
-        f"# Symptoms\n\nCaptured: {datetime.utcnow().isoformat()}Z\n\n```\n{error_text}\n```\n",
-        encoding="utf-8",
+def _env_changes(
+    store: KBStore, sig: str, env_fingerprint: str | None, recorded: int
+) -> list[str]:
+    """Diff ``env_fingerprint`` against the last earlier occurrence that had one."""
+    if not env_fingerprint:
+        return []
+    earlier = store.occurrences(sig)[:-recorded]
+    previous = next((occ["env"] for occ in reversed(earlier) if occ["env"]), None)
+    if previous is None:
+        return []
+    return diff_fingerprints(parse_fingerprint(previous), parse_fingerprint(env_fingerprint))
+
+
+def report(recorded: Recorded) -> None:
+    print(
+        f"Recorded failure signature: {recorded.sig} -> {recorded.case_dir} "
+        f"(occurrence {recorded.stats.count}, first seen {recorded.stats.first_seen})"
+    )
+    if recorded.similar:
+        print("Similar cases:")
+        for other, score in recorded.similar:
+            print(f"  {score:.2f}  {other} -> {CASES_DIR / other}")
+    if recorded.env_changes:
+        print("Environment changed since the previous occurrence:")
+        for line in recorded.env_changes:
+            print(f"  {line}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        usage="python .ops/scripts/record_failure.py <path_to_error_log.txt> [--top-k N]"
     )
-    (case_dir / "root_cause.md").write_text("# Root Cause\n\nTBD\n", encoding="utf-8")
-    (case_dir / "fix.md").write_text("# Fix\n\nTBD\n", encoding="utf-8")
-    (case_dir / "regression_test.md").write_text("# Regression Test\n\nTBD\n", encoding="utf-8")
-
-    index = {}
-    if INDEX.exists():
-        index = json.loads(INDEX.read_text(encoding="utf-8"))
-    index.setdefault(sig, {"cases": []})
-    if str(case_dir) not in index[sig]["cases"]:
-        index[sig]["cases"].append(str(case_dir))
-
-    INDEX.write_text(json.dumps(index, indent=2), encoding="utf-8")
-    print(f"Recorded failure signature: {sig} -> {case_dir}")
+    ap.add_argument("log", help="Path to the captured failure output")
+    ap.add_argument(
+        "--top-k", type=int, default=5, help="Number of similar cases to report (default 5)"
+    )
+    ap.add_argument(
+        "--min-score",
+        type=float,
+        default=0.3,
+        help="Minimum estimated similarity for a case to be reported (default 0.3)",
+    )
+    ap.add_argument(
+        "--env-fingerprint",
+        default=None,
+        help="Path to the env fingerprint captured with this failure (stored per occurrence)",
+    )
+    ap.add_argument(
+        "--compress",
+        choices=list(COMPRESSORS),
+        default="gzip",
+        help="Compression for the full log kept in the case (default gzip)",
+    )
+    args = ap.parse_args()
+
+    fingerprint = None
+    if args.env_fingerprint:
+        fingerprint = Path(args.env_fingerprint).read_text(encoding="utf-8", errors="ignore")
+    report(record(args.log, fingerprint, args.top_k, args.min_score, args.compress))
     return 0
 
 
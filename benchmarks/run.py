@@ -0,0 +1,284 @@
+"""Micro-benchmarks for logging, redaction, settings and ops scripts.
+
+Usage:
+    python benchmarks/run.py                     # run, compare with baseline
+    python benchmarks/run.py --update-baseline   # run and store a new baseline
+    python benchmarks/run.py --threshold 0.3     # fail if >30% slower than baseline
+
+Results are keyed by scenario name (including its parameters). Throughput is
+compared against ``benchmarks/baseline.json``; the run exits 1 when any
+scenario's ops/sec drops by more than ``--threshold``. Baselines are machine
+specific, so the first run on a machine just records one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from types import ModuleType
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = REPO_ROOT / ".ops" / "scripts"
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
+from app.logging_config import REDACT_KEYS, JsonFormatter, RedactingFilter  # noqa: E402
+from app.settings import Settings, get_settings, invalidate_settings  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.20
+
+MESSAGE_SIZES = (64, 1024)
+SECRET_COUNTS = (0, 4, len(REDACT_KEYS))
+
+
+def load_script(name: str) -> ModuleType:
+    """Import an ``.ops/scripts`` module by file name (they are not a package)."""
+    spec = importlib.util.spec_from_file_location(name, SCRIPTS_DIR / f"{name}.py")
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # dataclasses look the module up by name
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextmanager
+def secrets_in_env(count: int) -> Iterator[list[str]]:
+    """Set ``count`` of the REDACT_KEYS to distinct fake values."""
+    keys = sorted(REDACT_KEYS)[:count]
+    saved = {k: os.environ.get(k) for k in keys}
+    values = [f"bench-secret-{i:02d}-{'x' * 16}" for i in range(count)]
+    os.environ.update(zip(keys, values, strict=True))
+    try:
+        yield values
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def make_message(size: int, secrets: list[str]) -> str:
+    body = "lorem ipsum dolor sit amet " * (size // 27 + 1)
+    if secrets:
+        body = f"token={secrets[0]} " + body
+    return body[:size]
+
+
+def make_record(msg: str) -> logging.LogRecord:
+    return logging.LogRecord("bench", logging.INFO, "bench.py", 1, msg, (), None)
+
+
+def measure(op: Callable[[], object], n: int) -> dict[str, float]:
+    """Call ``op`` ``n`` times and summarise per-call latency."""
+    timings = [0] * n
+    clock = time.perf_counter_ns
+    start_total = clock()
+    for i in range(n):
+        t0 = clock()
+        op()
+        timings[i] = clock() - t0
+    total = clock() - start_total
+    timings.sort()
+    return {
+        "ops": n,
+        "ops_per_sec": n / (total / 1e9) if total else float("inf"),
+        "p50_us": timings[n // 2] / 1e3,
+        "p99_us": timings[min(n - 1, int(n * 0.99))] / 1e3,
+        "mean_us": statistics.fmean(timings) / 1e3,
+    }
+
+
+def bench_redaction(n: int) -> Iterator[tuple[str, dict[str, float]]]:
+    for secrets in SECRET_COUNTS:
+        for size in MESSAGE_SIZES:
+            with secrets_in_env(secrets) as values:
+                flt = RedactingFilter()
+                msg = make_message(size, values)
+                yield (
+                    f"redacting_filter[secrets={secrets},size={size}]",
+                    measure(lambda flt=flt, msg=msg: flt.filter(make_record(msg)), n),
+                )
+
+
+def bench_json_formatter(n: int) -> Iterator[tuple[str, dict[str, float]]]:
+    formatter = JsonFormatter()
+    for size in MESSAGE_SIZES:
+        record = make_record(make_message(size, []))
+        yield (
+            f"json_formatter[size={size}]",
+            measure(lambda record=record: formatter.format(record), n),
+        )
+
+
+def bench_settings_load(n: int) -> Iterator[tuple[str, dict[str, float]]]:
+    yield "settings_load", measure(Settings.load, n)
+
+    def cold_field() -> object:
+        invalidate_settings()
+        return get_settings().postgres_host
+
+    yield "settings_field[cold]", measure(cold_field, n)
+
+    _ = get_settings().postgres_host  # warm the memoized instance
+    yield "settings_field[warm]", measure(lambda: get_settings().postgres_host, n)
+
+
+def bench_signature(n: int) -> Iterator[tuple[str, dict[str, float]]]:
+    record_failure = load_script("record_failure")
+    for lines in (100, 5000):
+        text = "\n".join(
+            f"  File \"/app/mod_{i}.py\", line {i}, in fn_{i}" for i in range(lines)
+        )
+        yield (
+            f"signature_from_text[lines={lines}]",
+            measure(lambda text=text: record_failure.signature_from_text(text), max(1, n // 100)),
+        )
+
+
+def bench_similarity(n: int) -> Iterator[tuple[str, dict[str, float]]]:
+    kb_similarity = load_script("kb_similarity")
+    text = kb_similarity.normalize_text(
+        "\n".join(f"  File \"/app/mod_{i}.py\", line {i}, in fn_{i}" for i in range(100))
+    )
+    yield "minhash[lines=100]", measure(lambda: kb_similarity.minhash(text), max(1, n // 1000))
+    with tempfile.TemporaryDirectory() as tmp:
+        with kb_similarity.SimilarityIndex(Path(tmp) / "kb.sqlite3") as index:
+            for i in range(1000):
+                index.add(f"case{i}", kb_similarity.minhash(f"{text}\ncase {i} variant {i % 7}"))
+            sketch = kb_similarity.minhash(text)
+            yield (
+                "lsh_query[cases=1000]",
+                measure(lambda: index.query(sketch, k=5), max(1, n // 1000)),
+            )
+
+
+def bench_kb_search(n: int) -> Iterator[tuple[str, dict[str, float]]]:
+    kb_search = load_script("kb_search")
+    words = ["timeout", "import", "module", "socket", "permission", "denied", "refused", "cache"]
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(2000):
+            case = Path(tmp) / "cases" / f"case{i:05d}"
+            case.mkdir(parents=True)
+            symptoms = " ".join(words[(i + j) % len(words)] for j in range(40))
+            (case / "symptoms.md").write_text(f"# Symptoms\n\nError{i}: {symptoms}\n")
+            (case / "root_cause.md").write_text("# Root Cause\n\nTBD\n")
+            (case / "fix.md").write_text("# Fix\n\nTBD\n")
+        with kb_search.KBSearchIndex(tmp) as index:
+            index.update()
+            yield "kb_search_refresh[cases=2000]", measure(index.update, max(1, n // 1000))
+            yield (
+                "kb_search_query[cases=2000]",
+                measure(lambda: index.search("socket refused"), max(1, n // 100)),
+            )
+
+
+def bench_convo_append(n: int) -> Iterator[tuple[str, dict[str, float]]]:
+    convo_append = load_script("convo_append")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in MESSAGE_SIZES:
+            log = Path(tmp) / f"convo_{size}.txt"
+            log.write_text("TITLE: bench\n", encoding="utf-8")
+            content = make_message(size, [])
+            yield (
+                f"convo_append[size={size}]",
+                measure(
+                    lambda log=log, content=content: convo_append.append_text(log, content),
+                    max(1, n // 100),
+                ),
+            )
+
+
+SCENARIOS: dict[str, Callable[[int], Iterator[tuple[str, dict[str, float]]]]] = {
+    "redaction": bench_redaction,
+    "json": bench_json_formatter,
+    "settings": bench_settings_load,
+    "signature": bench_signature,
+    "similarity": bench_similarity,
+    "kb_search": bench_kb_search,
+    "convo": bench_convo_append,
+}
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+) -> list[str]:
+    """Return a description of each scenario that regressed past ``threshold``."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = result["ops_per_sec"] / base["ops_per_sec"]
+        if ratio < 1.0 - threshold:
+            regressions.append(
+                f"{name}: {result['ops_per_sec']:.0f} ops/s vs baseline "
+                f"{base['ops_per_sec']:.0f} ops/s ({(1 - ratio) * 100:.1f}% slower)"
+            )
+    return regressions
+
+
+def print_table(results: dict[str, dict[str, float]]) -> None:
+    width = max(len(name) for name in results)
+    print(f"{'scenario':<{width}}  {'ops/sec':>12}  {'p50 us':>10}  {'p99 us':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:<{width}}  {r['ops_per_sec']:>12.0f}  "
+            f"{r['p50_us']:>10.2f}  {r['p99_us']:>10.2f}"
+        )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__ and __doc__.splitlines()[0])
+    ap.add_argument("--records", type=int, default=20_000, help="Operations per scenario")
+    ap.add_argument(
+        "--only", choices=list(SCENARIOS), action="append", help="Run only these scenario groups"
+    )
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = ap.parse_args()
+
+    results: dict[str, dict[str, float]] = {}
+    for group in args.only or SCENARIOS:
+        for name, result in SCENARIOS[group](args.records):
+            results[name] = result
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.update_baseline or not args.baseline.exists():
+        payload = {"python": platform.python_version(), "results": results}
+        args.baseline.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+        print(f"\nBaseline written: {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%}:", file=sys.stderr)
+        for line in regressions:
+            print(f"  - {line}", file=sys.stderr)
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,433 @@
+"""Pooled Postgres connections built from ``Settings``.
+
+Named pools (``"postgres"`` for the local ``postgres_*`` config and
+``"do_pg"`` for DigitalOcean's ``do_pg_*``) hand out connections from a
+driver. The driver is pluggable: ``PsycopgDriver`` is used by default (it
+needs the optional ``psycopg`` or ``psycopg2`` package), and tests can pass
+an in-process fake.
+
+    with get_pool("postgres").connection() as conn:
+        ...
+
+    async with AsyncConnectionPool(get_pool("do_pg")).connection() as conn:
+        ...
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+from app.metrics import REGISTRY
+from app.settings import Settings, get_settings, subscribe
+
+CHECKOUT_SECONDS = REGISTRY.histogram(
+    "app_db_checkout_seconds", "Time to check a connection out of a pool", ["pool"]
+)
+CHECKOUT_TIMEOUTS = REGISTRY.counter(
+    "app_db_checkout_timeouts_total", "Checkouts that gave up waiting", ["pool"]
+)
+POOL_SIZE = REGISTRY.gauge("app_db_pool_connections", "Open connections per pool", ["pool"])
+POOL_IN_USE = REGISTRY.gauge("app_db_pool_in_use", "Checked-out connections per pool", ["pool"])
+
+
+class PoolTimeout(RuntimeError):
+    """No connection became available before the checkout timeout."""
+
+
+class PoolClosed(RuntimeError):
+    """The pool was closed."""
+
+
+class Driver(Protocol):
+    def connect(self, params: Mapping[str, Any]) -> Any: ...
+
+    def is_healthy(self, conn: Any) -> bool: ...
+
+    def close(self, conn: Any) -> None: ...
+
+
+class PsycopgDriver:
+    """Driver backed by psycopg 3, falling back to psycopg2 (optional dependencies)."""
+
+    def connect(self, params: Mapping[str, Any]) -> Any:
+        try:
+            import psycopg as module  # type: ignore[import-not-found]
+        except ImportError:
+            try:
+                import psycopg2 as module
+            except ImportError as exc:
+                raise RuntimeError(
+                    "psycopg or psycopg2 is required for Postgres pools. "
+                    "Install one (pip install -e '.[postgres]') or pass a driver explicitly."
+                ) from exc
+        return module.connect(**params)
+
+    def is_healthy(self, conn: Any) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except Exception:
+            return False
+        return True
+
+    def close(self, conn: Any) -> None:
+        conn.close()
+
+
+def pool_params(settings: Settings, name: str) -> dict[str, Any]:
+    """Return driver connection parameters for the named config in ``settings``."""
+    if name == "postgres":
+        params = {
+            "host": settings.postgres_host,
+            "port": settings.postgres_port,
+            "dbname": settings.postgres_db,
+            "user": settings.postgres_user,
+            "password": settings.postgres_password,
+        }
+    elif name == "do_pg":
+        params = {
+            "host": settings.do_pg_host,
+            "port": settings.do_pg_port,
+            "dbname": "defaultdb",
+            "user": settings.do_pg_user,
+            "password": settings.do_pg_password,
+            "sslmode": settings.do_pg_sslmode or "require",
+        }
+    else:
+        raise ValueError(f"Unknown pool config: {name}. Expected 'postgres' or 'do_pg'")
+    return {k: v for k, v in params.items() if v is not None}
+
+
+@dataclass(eq=False)
+class _Slot:
+    conn: Any
+    generation: int
+    created_at: float
+    last_used: float
+
+
+class ConnectionPool:
+    """Thread-safe pool of driver connections.
+
+    - Up to ``max_size`` connections; ``open()`` pre-creates ``min_size``.
+    - Checkout waits up to ``timeout`` seconds for a free connection, then
+      raises ``PoolTimeout``. Waiters are woken in FIFO order by the condition.
+    - Idle connections are health-checked on checkout; connections idle
+      longer than ``max_idle`` (beyond ``min_size``) or older than
+      ``max_lifetime`` are closed instead of reused.
+    - ``reconfigure()`` swaps the connection parameters; existing connections
+      are recycled as they come back.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        driver: Driver,
+        params: Mapping[str, Any],
+        min_size: int = 0,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_idle: float = 300.0,
+        max_lifetime: float = 3600.0,
+        health_check: bool = True,
+    ) -> None:
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.name = name
+        self.driver = driver
+        self.params = dict(params)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check = health_check
+
+        self._generation = 0
+        self._idle: deque[_Slot] = deque()
+        self._in_use: dict[int, _Slot] = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._checkout_seconds = CHECKOUT_SECONDS.labels(pool=name)
+        self._timeouts = CHECKOUT_TIMEOUTS.labels(pool=name)
+        self._size_gauge = POOL_SIZE.labels(pool=name)
+        self._in_use_gauge = POOL_IN_USE.labels(pool=name)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def _update_gauges(self) -> None:
+        self._size_gauge.set(self._size)
+        self._in_use_gauge.set(len(self._in_use))
+
+    def open(self) -> None:
+        """Create connections until ``min_size`` are open."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+                generation, params = self._generation, self.params
+            slot = self._connect(generation, params)
+            with self._cond:
+                self._idle.append(slot)
+                self._update_gauges()
+                self._cond.notify()
+
+    def _connect(self, generation: int, params: Mapping[str, Any]) -> _Slot:
+        try:
+            conn = self.driver.connect(params)
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._update_gauges()
+                self._cond.notify()
+            raise
+        now = time.monotonic()
+        return _Slot(conn, generation, now, now)
+
+    def _discard(self, slot: _Slot) -> None:
+        """Close a connection that is no longer counted as idle or in use."""
+        try:
+            self.driver.close(slot.conn)
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._update_gauges()
+            self._cond.notify()
+
+    def _expired(self, slot: _Slot, now: float) -> bool:
+        if slot.generation != self._generation:
+            return True
+        return bool(self.max_lifetime) and now - slot.created_at >= self.max_lifetime
+
+    def _evict_idle_locked(self, now: float) -> list[_Slot]:
+        evicted = []
+        keep: deque[_Slot] = deque()
+        while self._idle:
+            slot = self._idle.popleft()
+            idle_too_long = (
+                self.max_idle
+                and now - slot.last_used >= self.max_idle
+                and self._size - len(evicted) > self.min_size
+            )
+            if idle_too_long or self._expired(slot, now):
+                evicted.append(slot)
+            else:
+                keep.append(slot)
+        self._idle = keep
+        return evicted
+
+    def acquire(self, timeout: float | None = None) -> Any:
+        """Check out a connection, waiting up to ``timeout`` (default: pool timeout)."""
+        start = time.perf_counter()
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            slot: _Slot | None = None
+            create: tuple[int, Mapping[str, Any]] | None = None  # generation, params
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosed(f"Pool {self.name} is closed")
+                    now = time.monotonic()
+                    evicted = self._evict_idle_locked(now)
+                    if evicted:
+                        break
+                    if self._idle:
+                        slot = self._idle.pop()  # LIFO: reuse the warmest connection
+                        self._in_use[id(slot.conn)] = slot
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = (self._generation, self.params)
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._timeouts.inc()
+                        raise PoolTimeout(
+                            f"Timed out waiting for a connection from pool {self.name} "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                self._update_gauges()
+            if create is not None:
+                slot = self._connect(*create)
+                with self._cond:
+                    self._in_use[id(slot.conn)] = slot
+                    self._update_gauges()
+            elif slot is None:
+                for old in evicted:
+                    self._discard(old)
+                continue
+            elif self.health_check and not self.driver.is_healthy(slot.conn):
+                with self._cond:
+                    self._in_use.pop(id(slot.conn), None)
+                self._discard(slot)
+                continue
+
+            self._checkout_seconds.observe(time.perf_counter() - start)
+            return slot.conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        """Return a connection; ``discard=True`` closes it instead (e.g. after an error)."""
+        slot = self._check_in(conn, discard)
+        if slot is not None:
+            self._discard(slot)
+
+    def _check_in(self, conn: Any, discard: bool) -> _Slot | None:
+        """Return ``conn`` to the idle set; the slot to ``_discard()`` if it can't be reused."""
+        with self._cond:
+            slot = self._in_use.pop(id(conn), None)
+            if slot is None:
+                raise ValueError(f"Connection does not belong to pool {self.name}")
+            now = time.monotonic()
+            if not discard and not self._closed and not self._expired(slot, now):
+                slot.last_used = now
+                self._idle.append(slot)
+                self._update_gauges()
+                self._cond.notify()
+                return None
+        return slot
+
+    @contextmanager
+    def connection(self, timeout: float | None = None) -> Iterator[Any]:
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def reconfigure(self, params: Mapping[str, Any]) -> None:
+        """Use new connection parameters; older connections are recycled on return."""
+        with self._cond:
+            if dict(params) == self.params:
+                return
+            self.params = dict(params)
+            self._generation += 1
+            evicted = self._evict_idle_locked(time.monotonic())
+        for slot in evicted:
+            self._discard(slot)
+
+    def close(self) -> None:
+        """Close idle connections now and in-use ones as they are released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for slot in idle:
+            self._discard(slot)
+
+
+class AsyncConnectionPool:
+    """asyncio front-end for a ``ConnectionPool``.
+
+    Checkout (which may wait on the pool lock or connect) runs on the front
+    end's own executor, one thread per connection the pool can hold, so tasks
+    waiting for a connection never tie up the loop's default executor (which
+    ``getaddrinfo`` and other ``run_in_executor(None, ...)`` users need).
+    Returning a connection to the idle set runs on the loop: it only takes the
+    pool lock briefly, and a release queued behind checkouts would never run.
+    Closing a discarded connection runs in the default executor. A checkout
+    that completes after its task was cancelled returns the connection.
+    """
+
+    def __init__(self, pool: ConnectionPool) -> None:
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool.max_size, thread_name_prefix=f"db-pool-{pool.name}"
+        )
+
+    async def acquire(self, timeout: float | None = None) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self.pool.acquire, timeout)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(self._release_orphan)
+            raise
+
+    def _release_orphan(self, future: asyncio.Future[Any]) -> None:
+        if not future.cancelled() and future.exception() is None:
+            slot = self.pool._check_in(future.result(), discard=False)
+            if slot is not None:
+                future.get_loop().run_in_executor(None, self.pool._discard, slot)
+
+    async def release(self, conn: Any, discard: bool = False) -> None:
+        slot = self.pool._check_in(conn, discard)
+        if slot is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.pool._discard, slot)
+
+    @asynccontextmanager
+    async def connection(self, timeout: float | None = None) -> AsyncIterator[Any]:
+        conn = await self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException:
+            await self.release(conn, discard=True)
+            raise
+        await self.release(conn)
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(
+    name: str,
+    settings: Settings | None = None,
+    driver: Driver | None = None,
+    **options: Any,
+) -> ConnectionPool:
+    """Return the process-wide pool for ``name`` (``"postgres"`` or ``"do_pg"``).
+
+    The first call creates it from ``settings`` (default ``get_settings()``)
+    with ``options`` passed to ``ConnectionPool``; later calls return it as is.
+    """
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            params = pool_params(settings or get_settings(), name)
+            pool = ConnectionPool(name, driver or PsycopgDriver(), params, **options)
+            pool.open()
+            _pools[name] = pool
+    return pool
+
+
+def close_pools() -> None:
+    """Close and forget every pool created by ``get_pool()``."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _on_settings_reload(old: Settings | None, new: Settings) -> None:
+    for name, pool in list(_pools.items()):
+        pool.reconfigure(pool_params(new, name))
+
+
+subscribe(_on_settings_reload)
@@ -0,0 +1,209 @@
+"""Zero-dependency ``.env`` loader with layered files and an mtime-keyed cache.
+
+Layers, lowest to highest precedence::
+
+    .env  <  .env.<APP_ENV>  <  .env.local  <  real environment
+
+``APP_ENV`` is taken from the real environment, else from ``.env``, else
+``dev``. Parsed files are cached in memory keyed by path, mtime and size, so
+repeated loads only ``stat`` the files. Values are never written to disk.
+
+Syntax:
+- ``KEY=value`` with an optional ``export`` prefix; ``#`` starts a comment
+  line, or an inline comment after whitespace in unquoted values.
+- ``'single quoted'`` values are literal and may span lines.
+- ``"double quoted"`` values may span lines and support ``\\n``, ``\\r``,
+  ``\\t``, ``\\"``, ``\\\\`` and ``\\$`` escapes.
+- ``${VAR}`` and ``${VAR:-default}`` are interpolated in unquoted and
+  double-quoted values, from the real environment first and then from
+  values defined earlier (including lower layers).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import ChainMap
+from collections.abc import Mapping
+from pathlib import Path
+
+# A value is a tuple of literal strings and (name, default) interpolation refs.
+Part = str | tuple[str, str | None]
+Entries = tuple[tuple[str, tuple[Part, ...]], ...]
+
+_KEY_RE = re.compile(r"[ \t]*(?:export[ \t]+)?([A-Za-z_][A-Za-z0-9_.]*)[ \t]*=[ \t]*")
+_VAR_RE = re.compile(r"\$\{([A-Za-z_][A-Za-z0-9_]*)(?::-([^}]*))?\}")
+_ESCAPES = {"n": "\n", "r": "\r", "t": "\t", '"': '"', "\\": "\\", "$": "$"}
+
+_cache: dict[Path, tuple[int, int, Entries]] = {}
+_cache_lock = threading.Lock()
+
+
+def _interpolated(text: str) -> list[Part]:
+    parts: list[Part] = []
+    pos = 0
+    for m in _VAR_RE.finditer(text):
+        if m.start() > pos:
+            parts.append(text[pos : m.start()])
+        parts.append((m.group(1), m.group(2)))
+        pos = m.end()
+    if pos < len(text):
+        parts.append(text[pos:])
+    return parts
+
+
+def _parse_double_quoted(text: str, pos: int) -> tuple[list[Part], int]:
+    """Parse from just after an opening ``"``; return parts and the index after the close."""
+    parts: list[Part] = []
+    chunk: list[str] = []
+    n = len(text)
+    while pos < n:
+        ch = text[pos]
+        if ch == '"':
+            parts.extend(_interpolated("".join(chunk)))
+            return parts, pos + 1
+        if ch == "\\" and pos + 1 < n and text[pos + 1] in _ESCAPES:
+            escaped = _ESCAPES[text[pos + 1]]
+            if escaped == "$":
+                # Keep an escaped "$" out of interpolation.
+                parts.extend(_interpolated("".join(chunk)))
+                parts.append("$")
+                chunk = []
+            else:
+                chunk.append(escaped)
+            pos += 2
+            continue
+        chunk.append(ch)
+        pos += 1
+    raise ValueError("unterminated double-quoted value")
+
+
+def parse_env_text(text: str) -> Entries:
+    """Parse ``.env`` text into ``(key, parts)`` entries, in file order."""
+    entries: list[tuple[str, tuple[Part, ...]]] = []
+    pos, n = 0, len(text)
+    while pos < n:
+        eol = text.find("\n", pos)
+        if eol == -1:
+            eol = n
+        line = text[pos:eol].strip()
+        if not line or line.startswith("#"):
+            pos = eol + 1
+            continue
+        m = _KEY_RE.match(text, pos, eol)
+        if m is None:
+            pos = eol + 1  # Not an assignment; ignore the line.
+            continue
+        key, vpos = m.group(1), m.end()
+        quote = text[vpos] if vpos < n else ""
+        if quote == "'":
+            end = text.find("'", vpos + 1)
+            if end == -1:
+                raise ValueError(f"unterminated single-quoted value for {key}")
+            parts: list[Part] = [text[vpos + 1 : end]]
+            vpos = end + 1
+        elif quote == '"':
+            try:
+                parts, vpos = _parse_double_quoted(text, vpos + 1)
+            except ValueError as exc:
+                raise ValueError(f"{exc} for {key}") from None
+        else:
+            raw = text[vpos:eol]
+            comment = re.search(r"[ \t]#", raw)
+            if comment:
+                raw = raw[: comment.start()]
+            parts = _interpolated(raw.strip())
+            vpos = eol
+        entries.append((key, tuple(parts)))
+        eol = text.find("\n", vpos)
+        pos = n if eol == -1 else eol + 1
+    return tuple(entries)
+
+
+def _cached_entries(path: Path) -> Entries | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    try:
+        entries = parse_env_text(path.read_text(encoding="utf-8"))
+    except ValueError as exc:
+        raise ValueError(f"{path}: {exc}") from None
+    with _cache_lock:
+        _cache[path] = (st.st_mtime_ns, st.st_size, entries)
+    return entries
+
+
+def _resolve(
+    entries: Entries, into: dict[str, str], environ: Mapping[str, str]
+) -> None:
+    for key, parts in entries:
+        out: list[str] = []
+        for part in parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            name, default = part
+            value = environ.get(name)
+            if value is None:
+                value = into.get(name)
+            if not value and default is not None:
+                value = default
+            out.append(value or "")
+        into[key] = "".join(out)
+
+
+def parse_env_file(
+    path: str | os.PathLike[str], environ: Mapping[str, str] | None = None
+) -> dict[str, str]:
+    """Parse and interpolate one ``.env`` file (cached by mtime and size)."""
+    values: dict[str, str] = {}
+    entries = _cached_entries(Path(path))
+    if entries is not None:
+        _resolve(entries, values, os.environ if environ is None else environ)
+    return values
+
+
+def layer_paths(root: str | os.PathLike[str], app_env: str) -> list[Path]:
+    base = Path(root)
+    return [base / ".env", base / f".env.{app_env}", base / ".env.local"]
+
+
+def load_layered_env(
+    root: str | os.PathLike[str] | None = None,
+    environ: Mapping[str, str] | None = None,
+) -> Mapping[str, str]:
+    """Return the effective environment: ``environ`` over the layered ``.env`` files.
+
+    ``root`` defaults to the current directory and ``environ`` to
+    ``os.environ``. With no ``.env`` files present this returns ``environ``
+    itself; otherwise a ``ChainMap`` that consults ``environ`` first.
+    """
+    environ = os.environ if environ is None else environ
+    base = Path.cwd() if root is None else Path(root)
+
+    values: dict[str, str] = {}
+    found = False
+    base_entries = _cached_entries(base / ".env")
+    if base_entries is not None:
+        found = True
+        _resolve(base_entries, values, environ)
+    app_env = environ.get("APP_ENV") or values.get("APP_ENV") or "dev"
+    for path in layer_paths(base, app_env)[1:]:
+        entries = _cached_entries(path)
+        if entries is not None:
+            found = True
+            _resolve(entries, values, environ)
+    if not found:
+        return environ
+    return ChainMap(environ, values)  # type: ignore[arg-type]
+
+
+def clear_cache() -> None:
+    """Forget all parsed files."""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_BUFFER_BYTES = 256 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+def index_path_for(path: str | os.PathLike[str]) -> Path:
+    """Return the segment index written next to the active log file."""
+    return Path(f"{os.fspath(path)}.index.jsonl")
+
+
+def find_segments(
+    path: str | os.PathLike[str], start: float, end: float
+) -> list[Path]:
+    """Return rotated segments whose time range overlaps ``[start, end]``.
+
+    Only the index is read; segments are never decompressed. The active
+    (not yet rotated) log file is not included.
+    """
+    index = index_path_for(path)
+    if not index.exists():
+        return []
+    base = Path(path).parent
+    found: list[Path] = []
+    with index.open(encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry["start"] <= end and entry["end"] >= start:
+                found.append(base / entry["segment"])
+    return found
+
+
+class BufferedRotatingFileHandler(logging.Handler):
+    """File handler that batches writes, rotates and compresses in the background.
+
+    Formatted records are appended to an in-memory buffer and written in one
+    ``write`` call once ``buffer_bytes`` is reached, or every
+    ``flush_interval`` seconds by the background worker. The active file is
+    rotated when it exceeds ``max_bytes`` or is older than ``rotate_seconds``
+    (``0`` disables either trigger). Rotated segments are gzip-compressed on
+    the worker thread, which then appends ``{"segment", "start", "end",
+    "records", "bytes"}`` to ``<path>.index.jsonl``.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        rotate_seconds: float = 0.0,
+        buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        compress: bool = True,
+    ) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.buffer_bytes = buffer_bytes
+        self.flush_interval = flush_interval
+        self.compress = compress
+
+        self._file = self.path.open("ab", buffering=0)
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        st = self.path.stat()
+        self._segment_bytes = st.st_size
+        self._segment_start: float | None = None
+        self._segment_end = 0.0
+        if st.st_size:
+            # Reopened a file an earlier process wrote to: its records are no
+            # newer than its mtime, and creation time (where the OS keeps it)
+            # bounds the oldest one.
+            self._segment_start = min(st.st_mtime, getattr(st, "st_birthtime", st.st_mtime))
+            self._segment_end = st.st_mtime
+        self._segment_records = 0
+        self._rotations = 0
+
+        self._jobs: queue.Queue[tuple[Path, dict[str, object]] | None] = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._work, name=f"log-sink:{self.path.name}", daemon=True
+        )
+        self._worker.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = (self.format(record) + "\n").encode("utf-8")
+        except Exception:
+            self.handleError(record)
+            return
+        if self._segment_start is None:
+            self._segment_start = record.created
+        elif self.rotate_seconds and record.created - self._segment_start >= self.rotate_seconds:
+            self._rotate()
+            self._segment_start = record.created
+        self._segment_end = max(self._segment_end, record.created)
+        self._segment_records += 1
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self._segment_bytes += len(data)
+        if self._buffered >= self.buffer_bytes:
+            self._write_buffer()
+        if self.max_bytes and self._segment_bytes >= self.max_bytes:
+            self._rotate()
+
+    def _write_buffer(self) -> None:
+        if not self._buffer:
+            return
+        self._file.write(b"".join(self._buffer))
+        self._buffer.clear()
+        self._buffered = 0
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if not self._file.closed:
+                self._write_buffer()
+        finally:
+            self.release()
+
+    def _rotate(self) -> None:
+        self._write_buffer()
+        if self._segment_bytes == 0:
+            return
+        self._file.close()
+        self._rotations += 1
+        start = self._segment_start if self._segment_start is not None else time.time()
+        segment = self._segment_name(start)
+        os.replace(self.path, segment)
+        self._jobs.put(
+            (
+                segment,
+                {
+                    "start": start,
+                    "end": max(self._segment_end, start),
+                    "records": self._segment_records,
+                    "bytes": self._segment_bytes,
+                },
+            )
+        )
+        self._file = self.path.open("ab", buffering=0)
+        self._segment_bytes = 0
+        self._segment_start = None
+        self._segment_end = 0.0
+        self._segment_records = 0
+
+    def _segment_name(self, start: float) -> Path:
+        # The counter restarts with the process, so a restart that rotates within
+        # the same second must skip names an earlier process already used.
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(start))
+        while True:
+            segment = self.path.with_name(f"{self.path.name}.{stamp}.{self._rotations}")
+            taken = (segment, segment.with_name(segment.name + ".gz"))
+            if not any(p.exists() for p in taken):
+                return segment
+            self._rotations += 1
+
+    def _work(self) -> None:
+        while True:
+            try:
+                job = self._jobs.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush()
+                continue
+            if job is None:
+                return
+            segment, entry = job
+            try:
+                self._finish_segment(segment, entry)
+            except OSError:
+                logging.getLogger(__name__).exception("Failed to finalise log segment %s", segment)
+
+    def _finish_segment(self, segment: Path, entry: dict[str, object]) -> None:
+        if self.compress:
+            compressed = segment.with_name(segment.name + ".gz")
+            tmp = compressed.with_name(compressed.name + ".tmp")
+            with segment.open("rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp, compressed)
+            segment.unlink()
+            segment = compressed
+        entry = {"segment": segment.name, **entry}
+        with index_path_for(self.path).open("a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry) + "\n")
+
+    def rotate(self) -> None:
+        """Rotate the active file now, regardless of size or age."""
+        self.acquire()
+        try:
+            self._rotate()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            if not self._file.closed:
+                self._write_buffer()
+                self._file.close()
+        finally:
+            self.release()
+        if self._worker.is_alive():
+            self._jobs.put(None)
+            self._worker.join()
+        super().close()
@@ -1,8 +1,27 @@
 from __future__ import annotations
 
+import atexit
 import json
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import threading
+import time
+from collections.abc import Callable, Mapping
+from json.encoder import encode_basestring
+from typing import Any
+
+from app.envfiles import load_layered_env
+from app.file_sink import DEFAULT_BUFFER_BYTES, DEFAULT_MAX_BYTES, BufferedRotatingFileHandler
+from app.metrics import REGISTRY
+from app.settings import subscribe
+
+try:  # Optional faster JSON encoder.
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
 
 REDACT_KEYS = {
     "LUNAVERSE_SSH_PASSWORD",
@@ -19,16 +38,151 @@ REDACT_KEYS = {
     "DO_PG_PASSWORD",
 }
 
+REDACTED = "[REDACTED]"
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s:%(lineno)d - %(message)s"
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-debug-first")
+DEFAULT_QUEUE_SIZE = 10_000
+
+JSON_ENCODERS = ("stdlib", "orjson", "auto")
+
+_TRUTHY = {"1", "true", "yes"}
+
+LOG_RECORDS = REGISTRY.counter(
+    "app_log_records_total", "Log records written by the configured handler", ["level"]
+)
+LOG_REDACTIONS = REGISTRY.counter(
+    "app_log_redactions_total", "Secret values masked in log messages"
+)
+LOG_DROPPED = REGISTRY.counter(
+    "app_log_dropped_total", "Log records dropped by the async queue overflow policy"
+)
+LOG_SUPPRESSED = REGISTRY.counter(
+    "app_log_suppressed_total", "Log records suppressed by rate limiting or sampling"
+)
+LOG_FORMAT_SECONDS = REGISTRY.histogram(
+    "app_log_format_seconds", "Time spent formatting one log record"
+)
+
+# Attributes every LogRecord carries; anything else was passed via ``extra=``.
+_RECORD_ATTRS = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "taskName"}
+
+
+class SecretRedactor:
+    """Single-pass redaction of the secret values named in ``REDACT_KEYS``.
+
+    Secret values are read from the environment once, at construction or on
+    ``refresh()``, and compiled into one alternation regex ordered longest
+    first, so overlapping secrets are masked in full with a single scan.
+    """
+
+    def __init__(
+        self,
+        keys: frozenset[str] | set[str] = REDACT_KEYS,
+        env: Mapping[str, str] | None = None,
+    ) -> None:
+        self._keys = frozenset(keys)
+        self._pattern: re.Pattern[str] | None = None
+        self.refresh(env)
+
+    def refresh(self, env: Mapping[str, str] | None = None) -> None:
+        """Re-read secret values and recompile the matcher.
+
+        Values come from ``env``, defaulting to the real environment layered
+        over the ``.env`` files (``app.envfiles.load_layered_env``).
+        """
+        if env is None:
+            env = load_layered_env()
+        values = {v for k in self._keys if (v := env.get(k))}
+        if not values:
+            self._pattern = None
+            return
+        ordered = sorted(values, key=lambda v: (-len(v), v))
+        # Single attribute assignment, so concurrent redact() calls see either
+        # the old or the new matcher, never a partial one.
+        self._pattern = re.compile("|".join(re.escape(v) for v in ordered))
+
+    @property
+    def active(self) -> bool:
+        """True when there is at least one secret value to mask."""
+        return self._pattern is not None
+
+    def redact(self, text: str) -> str:
+        return self.subn(text)[0]
+
+    def subn(self, text: str) -> tuple[str, int]:
+        """Return ``(redacted_text, number_of_secrets_masked)``."""
+        pattern = self._pattern
+        if pattern is None:
+            return text, 0
+        return pattern.subn(REDACTED, text)
+
 
 class RedactingFilter(logging.Filter):
+    """Redact secrets from everything a formatter may write for a record.
+
+    The redacted text is stored on ``record.message`` (and ``record.msg`` with
+    ``args`` cleared) so formatters can reuse it without re-rendering.
+    String fields passed via ``extra=``, ``stack_info`` and the formatted
+    traceback (``exc_text``) are redacted in place; the redacted exception
+    message is kept on ``record._exc_message`` for ``FastJsonFormatter``.
+    Attach it to handlers, not loggers, so records propagated from child
+    loggers are covered too.
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def __init__(self, redactor: SecretRedactor | None = None) -> None:
+        super().__init__()
+        self.redactor = redactor if redactor is not None else SecretRedactor()
+
+    def refresh(self, env: Mapping[str, str] | None = None) -> None:
+        self.redactor.refresh(env)
+
     def filter(self, record: logging.LogRecord) -> bool:
         msg = record.getMessage()
-        for k in REDACT_KEYS:
-            v = os.getenv(k)
-            if v and v in msg:
-                record.msg = msg.replace(v, "[REDACTED]")
+        redacted, hits = self.redactor.subn(msg)
+        if hits or record.args:
+            record.msg = redacted
+            record.args = ()
+        record.message = redacted
+        if self.redactor.active:
+            hits += self._redact_attributes(record)
+        if hits:
+            LOG_REDACTIONS.inc(hits)
         return True
 
+    def _redact_attributes(self, record: logging.LogRecord) -> int:
+        hits = 0
+        attrs = record.__dict__
+        for key in attrs.keys() - _RECORD_ATTRS:
+            value = attrs[key]
+            if isinstance(value, str):
+                attrs[key], n = self.redactor.subn(value)
+                hits += n
+        if record.exc_info and record.exc_info[0] is not None:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record._exc_message, n = self.redactor.subn(str(record.exc_info[1]))
+            hits += n
+        if record.exc_text:
+            record.exc_text, n = self.redactor.subn(record.exc_text)
+            hits += n
+        if record.stack_info:
+            record.stack_info, n = self.redactor.subn(record.stack_info)
+            hits += n
+        return hits
+
+
+def _rendered_message(record: logging.LogRecord) -> str:
+    """Return the message already rendered by ``RedactingFilter``, if any."""
+    message = getattr(record, "message", None)
+    if message is None:
+        return record.getMessage()
+    return message
+
 
 class JsonFormatter(logging.Formatter):
     """Minimal JSON log formatter (timestamp, level, logger, lineno, message)."""
@@ -39,34 +193,512 @@ class JsonFormatter(logging.Formatter):
             "level": record.levelname,
             "logger": record.name,
             "lineno": record.lineno,
-            "message": record.getMessage(),
+            "message": _rendered_message(record),
         }
         return json.dumps(log, ensure_ascii=False)
 
 
+class FastJsonFormatter(JsonFormatter):
+    """High-throughput variant of ``JsonFormatter``.
+
+    - The strftime part of the timestamp is computed once per second and the
+      milliseconds are appended per record.
+    - With the stdlib encoder the fixed keys are written through a precomputed
+      template, producing exactly the bytes ``JsonFormatter`` produces.
+    - ``encoder="orjson"`` (or ``"auto"`` when orjson is installed) uses orjson
+      instead; keys and values are the same but the output is compact
+      (no space after ``:`` and ``,``).
+    - Fields passed via ``extra=`` are appended after the fixed keys, and
+      ``exc_info``/``stack_info`` become an ``exception`` object and a
+      ``stack_info`` string.
+    """
+
+    _FIXED_KEYS = frozenset({"timestamp", "level", "logger", "lineno", "message"})
+    _TEMPLATE = '{"timestamp": %s, "level": %s, "logger": %s, "lineno": %d, "message": %s'
+
+    def __init__(self, datefmt: str | None = None, encoder: str = "stdlib") -> None:
+        super().__init__(datefmt=datefmt)
+        if encoder not in JSON_ENCODERS:
+            raise ValueError(
+                f"Unknown JSON encoder: {encoder}. Expected one of: {', '.join(JSON_ENCODERS)}"
+            )
+        if encoder == "orjson" and orjson is None:
+            raise RuntimeError("LOG_JSON_ENCODER=orjson requires the 'orjson' package")
+        self.use_orjson = orjson is not None and encoder in {"orjson", "auto"}
+        self._second_cache: tuple[int, str] = (-1, "")
+        self._name_cache: dict[str, str] = {}
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        second = int(record.created)
+        cached_second, stamp = self._second_cache
+        if second != cached_second:
+            ct = self.converter(record.created)
+            stamp = time.strftime(datefmt or self.default_time_format, ct)
+            self._second_cache = (second, stamp)
+        if datefmt:
+            return stamp
+        return (self.default_msec_format or "%s,%03d") % (stamp, record.msecs)
+
+    def _encoded_name(self, name: str) -> str:
+        encoded = self._name_cache.get(name)
+        if encoded is None:
+            encoded = self._name_cache[name] = encode_basestring(name)
+        return encoded
+
+    def _structured_fields(self, record: logging.LogRecord) -> dict[str, Any]:
+        fields = {
+            k: v
+            for k, v in record.__dict__.items()
+            if k not in _RECORD_ATTRS and k not in self._FIXED_KEYS and not k.startswith("_")
+        }
+        if record.exc_info and record.exc_info[0] is not None:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            exc_type, exc_value = record.exc_info[0], record.exc_info[1]
+            fields["exception"] = {
+                "type": exc_type.__name__,
+                "message": getattr(record, "_exc_message", None) or str(exc_value),
+                "traceback": record.exc_text,
+            }
+        if record.stack_info:
+            fields["stack_info"] = self.formatStack(record.stack_info)
+        return fields
+
+    def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
+        timestamp = self.formatTime(record, self.datefmt)
+        message = _rendered_message(record)
+        fields = self._structured_fields(record)
+        if self.use_orjson and orjson is not None:
+            log = {
+                "timestamp": timestamp,
+                "level": record.levelname,
+                "logger": record.name,
+                "lineno": record.lineno,
+                "message": message,
+            }
+            log.update(fields)
+            return orjson.dumps(log, default=str).decode("utf-8")
+        head = self._TEMPLATE % (
+            encode_basestring(timestamp),
+            self._encoded_name(record.levelname),
+            self._encoded_name(record.name),
+            record.lineno,
+            encode_basestring(message),
+        )
+        if not fields:
+            return head + "}"
+        return head + ", " + json.dumps(fields, ensure_ascii=False, default=str)[1:]
+
+
+class _LevelCountingFilter(logging.Filter):
+    """Count records reaching the output handler, per level."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._by_level: dict[str, Any] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        counter = self._by_level.get(record.levelname)
+        if counter is None:
+            counter = self._by_level[record.levelname] = LOG_RECORDS.labels(
+                level=record.levelname
+            )
+        counter.inc()
+        return True
+
+
+class _MeasuredFormatter(logging.Formatter):
+    """Delegate to another formatter, observing its run time."""
+
+    def __init__(self, inner: logging.Formatter) -> None:
+        super().__init__()
+        self.inner = inner
+
+    def format(self, record: logging.LogRecord) -> str:
+        start = time.perf_counter()
+        try:
+            return self.inner.format(record)
+        finally:
+            LOG_FORMAT_SECONDS.observe(time.perf_counter() - start)
+
+
+class RateLimitingFilter(logging.Filter):
+    """Rate-limit and sample records per call site, summarising what was dropped.
+
+    Records are keyed by ``(logger, lineno, msg template)``. Each key has a
+    token bucket refilled at ``rate`` records/second up to ``burst``; DEBUG and
+    INFO records are additionally sampled 1-in-``sample_every`` per key.
+    Every ``summary_interval`` seconds a WARNING "Suppressed N similar records"
+    record is sent to ``sink`` for each key that dropped something.
+
+    Per-record work is a dict lookup and a few float operations. The hot path
+    takes no lock; under contention the counts are approximate.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0.0,
+        burst: float | None = None,
+        sample_every: int = 1,
+        summary_interval: float = 60.0,
+        sink: Callable[[logging.LogRecord], object] | None = None,
+        max_keys: int = 10_000,
+    ) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.sample_every = max(1, sample_every)
+        self.summary_interval = summary_interval
+        self.sink = sink
+        self.max_keys = max_keys
+        self.suppressed_total = 0
+        # key -> [tokens, last_refill, seen, suppressed_since_summary]
+        self._buckets: dict[tuple[str, int, object], list[Any]] = {}
+        self._next_summary = time.monotonic() + summary_interval
+        self._summary_lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "_rate_limit_summary", False):
+            return True
+        now = time.monotonic()
+        if now >= self._next_summary:
+            self.flush(now)
+
+        template = record.msg if isinstance(record.msg, str) else type(record.msg)
+        key = (record.name, record.lineno, template)
+        state = self._buckets.get(key)
+        if state is None:
+            if len(self._buckets) >= self.max_keys:
+                # Unbounded templates (e.g. f-strings) must not grow memory forever;
+                # summarise what the forgotten keys suppressed before dropping them.
+                with self._summary_lock:
+                    self._emit_summaries(now)
+                    self._buckets.clear()
+            state = self._buckets.setdefault(key, [self.burst, now, 0, 0])
+
+        state[2] += 1
+        if (
+            self.sample_every > 1
+            and record.levelno <= logging.INFO
+            and (state[2] - 1) % self.sample_every
+        ):
+            state[3] += 1
+            return False
+
+        if self.rate > 0:
+            tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if tokens < 1.0:
+                state[0] = tokens
+                state[3] += 1
+                return False
+            state[0] = tokens - 1.0
+        return True
+
+    def flush(self, now: float | None = None) -> None:
+        """Emit pending suppression summaries to ``sink`` now."""
+        if not self._summary_lock.acquire(blocking=False):
+            return
+        try:
+            self._emit_summaries(now)
+        finally:
+            self._summary_lock.release()
+
+    def _emit_summaries(self, now: float | None) -> None:
+        # Caller holds _summary_lock.
+        self._next_summary = (now or time.monotonic()) + self.summary_interval
+        for (name, lineno, template), state in list(self._buckets.items()):
+            suppressed = state[3]
+            if not suppressed:
+                continue
+            state[3] = 0
+            self.suppressed_total += suppressed
+            LOG_SUPPRESSED.inc(suppressed)
+            if self.sink is None:
+                continue
+            summary = logging.LogRecord(
+                name=name,
+                level=logging.WARNING,
+                pathname=__file__,
+                lineno=lineno,
+                msg="Suppressed %d similar records from %s:%d: %.200r",
+                args=(suppressed, name, lineno, template),
+                exc_info=None,
+            )
+            summary._rate_limit_summary = True
+            self.sink(summary)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler with a bounded queue and an explicit overflow policy.
+
+    Records are enqueued as-is: rendering, redaction and formatting happen on
+    the ``QueueListener`` thread, so the caller only pays for the enqueue.
+
+    Overflow policies:
+    - ``block``: wait for room in the queue (no loss).
+    - ``drop-oldest``: evict the oldest queued record to make room.
+    - ``drop-debug-first``: drop the incoming record if it is DEBUG or lower,
+      otherwise evict the oldest queued DEBUG record; block if there is none.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE, overflow: str = "block") -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy: {overflow}. "
+                f"Expected one of: {', '.join(OVERFLOW_POLICIES)}"
+            )
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.overflow = overflow
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def _count_drop(self) -> None:
+        with self._dropped_lock:
+            self.dropped += 1
+        LOG_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        q: queue.Queue = self.queue  # type: ignore[assignment]
+        if self.overflow == "block":
+            q.put(record)
+            return
+        while True:
+            try:
+                q.put_nowait(record)
+                return
+            except queue.Full:
+                pass
+            if self.overflow == "drop-oldest":
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                else:
+                    q.task_done()  # the evicted record will never be processed
+                    self._count_drop()
+                continue
+            # drop-debug-first
+            if record.levelno <= logging.DEBUG:
+                self._count_drop()
+                return
+            if not self._evict_oldest_debug(q):
+                q.put(record)
+                return
+
+    def _evict_oldest_debug(self, q: queue.Queue) -> bool:
+        with q.mutex:
+            for i, queued in enumerate(q.queue):
+                if queued is not None and queued.levelno <= logging.DEBUG:
+                    del q.queue[i]
+                    q.not_full.notify()
+                    break
+            else:
+                return False
+        q.task_done()  # takes q.mutex, so only once it is released
+        self._count_drop()
+        return True
+
+
+class _FlushingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop sentinel waits for room in a bounded queue."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # type: ignore[attr-defined]
+
+
+_listener: _FlushingQueueListener | None = None
+_queue_handler: BoundedQueueHandler | None = None
+_rate_filter: RateLimitingFilter | None = None
+_unsubscribe_redaction: Callable[[], None] | None = None
+_root_handlers: list[logging.Handler] = []  # what this module put on the root logger
+_borrowed: list[tuple[logging.Handler, logging.Filter]] = []  # filters on others' handlers
+
+
+def shutdown_logging() -> None:
+    """Flush pending rate-limit summaries, drain the async queue and stop its listener.
+
+    Safe to call more than once; registered with ``atexit``.
+    """
+    global _listener, _queue_handler, _root_handlers
+    if _rate_filter is not None:
+        _rate_filter.flush()
+    listener, handler = _listener, _queue_handler
+    _listener = _queue_handler = None
+    if listener is None:
+        return
+    # Detach first so no record can race the stop sentinel, then keep logging
+    # working synchronously through the listener's handlers.
+    root = logging.getLogger()
+    if handler is not None and handler in root.handlers:
+        root.removeHandler(handler)
+        for h in listener.handlers:
+            root.addHandler(h)
+        _root_handlers = list(listener.handlers)
+    listener.stop()
+    if handler is not None and handler.dropped:
+        drop_record = logging.LogRecord(
+            name=__name__,
+            level=logging.WARNING,
+            pathname=__file__,
+            lineno=0,
+            msg="Async logging dropped %d records (overflow policy: %s)",
+            args=(handler.dropped, handler.overflow),
+            exc_info=None,
+        )
+        for h in listener.handlers:
+            h.handle(drop_record)
+    for h in listener.handlers:
+        h.flush()
+
+
+atexit.register(shutdown_logging)
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name, "").strip()
+    try:
+        number = float(value) if value else default
+    except ValueError:
+        return default
+    return number if number >= 0 else default
+
+
 def configure_logging(level: str = "INFO") -> None:
     """Configure application logging with secret redaction.
 
     By default, logs are human-readable text. If the environment variable
     STRUCTURED_LOGGING is set to a truthy value (\"1\", \"true\", \"yes\", \"json\"),
     logs are emitted as JSON objects suitable for log aggregation systems.
+    STRUCTURED_LOGGING=fast selects FastJsonFormatter, which also emits extra=
+    fields and exceptions; LOG_JSON_ENCODER picks its encoder (\"stdlib\",
+    \"orjson\" or \"auto\").
+
+    If LOG_ASYNC is truthy, log calls only enqueue the record on a bounded
+    queue (LOG_QUEUE_SIZE, default 10000); redaction, formatting and the stream
+    write run on a background listener thread. LOG_QUEUE_OVERFLOW selects what
+    happens when the queue is full: \"block\" (default), \"drop-oldest\" or
+    \"drop-debug-first\". Call shutdown_logging() (also run at exit) to flush.
+
+    LOG_RATE_LIMIT (records/second per call site, with LOG_RATE_BURST) and
+    LOG_SAMPLE_EVERY (keep 1-in-N DEBUG/INFO records per call site) enable
+    RateLimitingFilter; suppressed records are summarised every
+    LOG_SUPPRESSION_SUMMARY_SECONDS (default 60).
+
+    LOG_FILE sends output to a buffered file sink instead of stderr, rotated by
+    LOG_FILE_MAX_BYTES and/or LOG_FILE_ROTATE_SECONDS with rotated segments
+    gzip-compressed and indexed by time range (see app.file_sink).
+
+    The pipeline feeds app.metrics.REGISTRY (records per level, redaction hits,
+    drops, suppressions, formatter time); METRICS_TEXTFILE writes it in the
+    Prometheus text format every METRICS_DUMP_INTERVAL seconds (default 15).
+
+    The redaction filter subscribes to app.settings, so secrets rotated in the
+    .env files are masked as soon as a SettingsReloader publishes them.
+
+    Calling it again replaces the handlers it installed, so a changed
+    environment takes effect. A root logger configured elsewhere keeps its
+    handlers; only the redaction filter is added to each of them.
     """
     structured_flag = os.getenv("STRUCTURED_LOGGING", "").strip().lower()
-    use_structured = structured_flag in {"1", "true", "yes", "json"}
+    use_structured = structured_flag in _TRUTHY | {"json", "fast"}
+    use_async = os.getenv("LOG_ASYNC", "").strip().lower() in _TRUTHY
 
-    if use_structured:
+    log_file = os.getenv("LOG_FILE", "").strip()
+    handler: logging.Handler
+    if log_file:
+        handler = BufferedRotatingFileHandler(
+            log_file,
+            max_bytes=int(_env_number("LOG_FILE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            rotate_seconds=_env_number("LOG_FILE_ROTATE_SECONDS", 0.0),
+            buffer_bytes=int(_env_number("LOG_FILE_BUFFER_BYTES", DEFAULT_BUFFER_BYTES)),
+        )
+    else:
         handler = logging.StreamHandler()
-        handler.setFormatter(JsonFormatter())
-        handlers = [handler]
-        fmt = None
+    formatter: logging.Formatter
+    if structured_flag == "fast":
+        encoder = os.getenv("LOG_JSON_ENCODER", "stdlib").strip().lower() or "stdlib"
+        formatter = FastJsonFormatter(encoder=encoder)
+    elif use_structured:
+        formatter = JsonFormatter()
     else:
-        handlers = None
-        fmt = "%(asctime)s %(levelname)s %(name)s:%(lineno)d - %(message)s"
+        formatter = logging.Formatter(TEXT_FORMAT)
+    handler.setFormatter(_MeasuredFormatter(formatter))
+
+    global _listener, _queue_handler, _rate_filter, _unsubscribe_redaction, _root_handlers
+    shutdown_logging()
+    _rate_filter = None
+    # Reconfiguring replaces our own pipeline; handlers installed by anyone
+    # else still make basicConfig below a no-op.
+    root = logging.getLogger()
+    for h in _root_handlers:
+        if h in root.handlers:
+            root.removeHandler(h)
+            h.close()
+    _root_handlers = []
+    for h, f in _borrowed:
+        h.removeFilter(f)
+    _borrowed.clear()
+
+    entry: logging.Handler = handler
+    queue_handler: BoundedQueueHandler | None = None
+    if use_async:
+        queue_handler = BoundedQueueHandler(
+            maxsize=int(_env_number("LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)) or DEFAULT_QUEUE_SIZE,
+            overflow=os.getenv("LOG_QUEUE_OVERFLOW", "block").strip().lower() or "block",
+        )
+        entry = queue_handler
+
+    rate = _env_number("LOG_RATE_LIMIT", 0.0)
+    sample_every = int(_env_number("LOG_SAMPLE_EVERY", 1))
+    rate_filter: RateLimitingFilter | None = None
+    if rate > 0 or sample_every > 1:
+        # On the entry handler, so dropped records never reach the queue,
+        # redaction or formatting.
+        burst = _env_number("LOG_RATE_BURST", 0.0) or None
+        rate_filter = RateLimitingFilter(
+            rate=rate,
+            burst=burst,
+            sample_every=sample_every,
+            summary_interval=_env_number("LOG_SUPPRESSION_SUMMARY_SECONDS", 60.0),
+            sink=entry.handle,
+        )
+        entry.addFilter(rate_filter)
+    # Handler-level, so records propagated from child loggers are redacted too.
+    # Added after the rate filter so suppressed records are never redacted.
+    redacting = RedactingFilter()
+    handler.addFilter(redacting)
+    handler.addFilter(_LevelCountingFilter())
+
+    # Pick up rotated secrets when app.settings publishes a reloaded snapshot.
+    if _unsubscribe_redaction is not None:
+        _unsubscribe_redaction()
+        _unsubscribe_redaction = None
 
     logging.basicConfig(
         level=getattr(logging, level.upper(), logging.INFO),
-        format=fmt,
-        handlers=handlers,
+        handlers=[entry],
     )
+    if entry not in root.handlers:
+        # basicConfig is a no-op when the root logger is already configured:
+        # keep its handlers, but still redact everything they write.
+        handler.close()
+        for h in root.handlers:
+            h.addFilter(redacting)
+            _borrowed.append((h, redacting))
+        _unsubscribe_redaction = subscribe(lambda old, new: redacting.refresh(new.environ))
+        return
+    _root_handlers = [entry]
+    _unsubscribe_redaction = subscribe(lambda old, new: redacting.refresh(new.environ))
 
-    logging.getLogger().addFilter(RedactingFilter())
+    metrics_file = os.getenv("METRICS_TEXTFILE", "").strip()
+    if metrics_file:
+        REGISTRY.start_textfile_dump(metrics_file, _env_number("METRICS_DUMP_INTERVAL", 15.0))
+    _rate_filter = rate_filter
+    if queue_handler is not None:
+        listener = _FlushingQueueListener(queue_handler.queue, handler, respect_handler_level=True)
+        listener.start()
+        _listener, _queue_handler = listener, queue_handler
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import abc
+import atexit
+import bisect
+import os
+import threading
+import weakref
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Self
+
+DEFAULT_BUCKETS = (
+    0.000_005,
+    0.000_01,
+    0.000_025,
+    0.000_05,
+    0.000_1,
+    0.000_25,
+    0.000_5,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _ShardedCells:
+    """Per-thread value cells: each thread writes only its own, readers sum them.
+
+    This keeps increments lock-free; a lock is taken only the first time a
+    thread touches the metric. When a thread object is collected its cell is
+    folded into a base cell, so short-lived threads don't accumulate cells.
+    """
+
+    def __init__(self, width: int) -> None:
+        self._width = width
+        self._local = threading.local()
+        self._base = [0.0] * width
+        self._cells: list[list[float]] = []
+        # Reentrant: a finalizer can run from garbage collection while held.
+        self._lock = threading.RLock()
+
+    def cell(self) -> list[float]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0.0] * self._width
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            weakref.finalize(threading.current_thread(), self._fold, cell)
+            return cell
+
+    def _fold(self, cell: list[float]) -> None:
+        with self._lock:
+            for i, v in enumerate(cell):
+                self._base[i] += v
+            # By identity: another thread's cell may hold equal values.
+            self._cells = [c for c in self._cells if c is not cell]
+
+    def totals(self) -> list[float]:
+        with self._lock:
+            cells = [list(self._base), *self._cells]
+        totals = [0.0] * self._width
+        for cell in cells:
+            for i, v in enumerate(cell):
+                totals[i] += v
+        return totals
+
+
+class _Metric(abc.ABC):
+    type_name = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], Self] = {}
+        self._children_lock = threading.Lock()
+
+    def labels(self, **labels: str) -> Self:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._children_lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self) -> Self:
+        return type(self)(self.name, self.help)
+
+    def _series(self) -> Iterator[tuple[tuple[str, ...], Self]]:
+        if self.labelnames:
+            yield from list(self._children.items())
+        else:
+            yield (), self
+
+    @abc.abstractmethod
+    def _render_samples(
+        self, labelnames: tuple[str, ...], labelvalues: tuple[str, ...]
+    ) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        for labelvalues, series in self._series():
+            lines.extend(series._render_samples(self.labelnames, labelvalues))
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic counter; ``inc()`` is lock-free (per-thread cells)."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._cells = _ShardedCells(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._cells.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._cells.totals()[0]
+
+    def _render_samples(
+        self, labelnames: tuple[str, ...], labelvalues: tuple[str, ...]
+    ) -> Iterator[str]:
+        labels = _format_labels(labelnames, labelvalues)
+        yield f"{self.name}{labels} {_format_value(self.value)}"
+
+
+class Gauge(_Metric):
+    """Point-in-time value. ``set()`` is a plain store; ``inc``/``dec`` lock per gauge."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def _render_samples(
+        self, labelnames: tuple[str, ...], labelvalues: tuple[str, ...]
+    ) -> Iterator[str]:
+        labels = _format_labels(labelnames, labelvalues)
+        yield f"{self.name}{labels} {_format_value(self.value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; ``observe()`` is lock-free (per-thread cells)."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Layout: one slot per bucket, then +Inf, then sum.
+        self._cells = _ShardedCells(len(self.buckets) + 2)
+
+    def _new_child(self) -> Self:
+        return type(self)(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        cell = self._cells.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    @property
+    def count(self) -> float:
+        return sum(self._cells.totals()[:-1])
+
+    @property
+    def sum(self) -> float:
+        return self._cells.totals()[-1]
+
+    def _render_samples(
+        self, labelnames: tuple[str, ...], labelvalues: tuple[str, ...]
+    ) -> Iterator[str]:
+        totals = self._cells.totals()
+        cumulative = 0.0
+        for bound, n in zip((*self.buckets, float("inf")), totals[:-1], strict=True):
+            cumulative += n
+            le = f'le="{_format_value(bound)}"'
+            labels = _format_labels(labelnames, labelvalues, le)
+            yield f"{self.name}_bucket{labels} {_format_value(cumulative)}"
+        labels = _format_labels(labelnames, labelvalues)
+        yield f"{self.name}_sum{labels} {_format_value(totals[-1])}"
+        yield f"{self.name}_count{labels} {_format_value(cumulative)}"
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms with Prometheus text exposition."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._dump_thread: threading.Thread | None = None
+        self._dump_stop = threading.Event()
+
+    def _get_or_create(self, cls: type[_Metric], name: str, *args, **kwargs) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = cls(name, *args, **kwargs)
+        if not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(  # type: ignore[return-value]
+            Histogram, name, help, labelnames, buckets=buckets
+        )
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(m.render() + "\n" for m in metrics)
+
+    def write_textfile(self, path: str | os.PathLike[str]) -> None:
+        """Atomically write ``render()`` to ``path`` (node_exporter textfile style)."""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, target)
+
+    def start_textfile_dump(self, path: str | os.PathLike[str], interval: float = 15.0) -> None:
+        """Write the textfile every ``interval`` seconds and once more at exit."""
+        self.stop_textfile_dump()
+        self._dump_stop.clear()
+
+        def run() -> None:
+            while not self._dump_stop.wait(interval):
+                self.write_textfile(path)
+
+        self._dump_thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+        self._dump_thread.start()
+        atexit.register(self.write_textfile, path)
+
+    def stop_textfile_dump(self) -> None:
+        if self._dump_thread is not None:
+            self._dump_stop.set()
+            self._dump_thread.join()
+            self._dump_thread = None
+            atexit.unregister(self.write_textfile)
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,32 @@
+"""TCP reachability probes.
+
+Shared by ``app.ssh_runner`` (target selection) and ``.ops/scripts/check_env.py``
+(``--probe``). Standard library only and no ``app`` imports, so scripts can
+use it without loading settings or the metrics registry.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+def parse_port(text: str) -> int:
+    """Return ``text`` as a TCP port number; raise ValueError unless it is 1-65535."""
+    port = int(text)
+    if not 1 <= port <= 65535:
+        raise ValueError(f"port out of range: {port}")
+    return port
+
+
+async def tcp_connect_latency(host: str, port: int) -> float:
+    """Time a plain TCP connect to ``host:port``."""
+    start = time.perf_counter()
+    _, writer = await asyncio.open_connection(host, port)
+    latency = time.perf_counter() - start
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return latency
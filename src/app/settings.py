@@ -1,7 +1,16 @@
 from __future__ import annotations
 
+import logging
 import os
-from dataclasses import dataclass
+import threading
+from collections.abc import Callable, Mapping
+from dataclasses import FrozenInstanceError, dataclass, fields
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from app.envfiles import layer_paths, load_layered_env
+
+logger = logging.getLogger(__name__)
 
 
 def _require_env(name: str) -> str:
@@ -14,119 +23,290 @@ def _require_env(name: str) -> str:
     return value
 
 
-@dataclass(frozen=True)
-class Settings:
+def _parse_int(value: str | None) -> int | None:
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+class _Group:
+    """Base for a settings group read from ``PREFIX + FIELD`` env vars."""
+
+    __slots__ = ()
+
+    PREFIX: ClassVar[str] = ""
+
+    @classmethod
+    def env_spec(cls) -> tuple[tuple[str, str, bool, Any], ...]:
+        """Return ``(field, env var, is_int, default)`` for each field, computed once."""
+        spec = _ENV_SPECS.get(cls)
+        if spec is None:
+            spec = _ENV_SPECS[cls] = tuple(
+                (f.name, f"{cls.PREFIX}{f.name}".upper(), str(f.type).startswith("int"), f.default)
+                for f in fields(cls)  # type: ignore[arg-type]
+            )
+        return spec
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str]) -> Any:
+        values: dict[str, Any] = {}
+        for name, key, is_int, default in cls.env_spec():
+            raw = env.get(key)
+            if is_int:
+                values[name] = _parse_int(raw)
+            else:
+                values[name] = default if raw is None else raw
+        return cls(**values)
+
+
+_ENV_SPECS: dict[type[_Group], tuple[tuple[str, str, bool, Any], ...]] = {}
+
+
+@dataclass(frozen=True, slots=True)
+class AppSettings(_Group):
     # App config
-    app_env: str
-    log_level: str
+    app_env: str = "dev"
+    log_level: str = "INFO"
 
     # Server config
-    server_admin_name: str | None
-    server_name: str | None
-
-    # Lunaverse SSH
-    lunaverse_host: str | None
-    lunaverse_ssh_user: str | None
-    lunaverse_ssh_port: int | None
-    lunaverse_ssh_password: str | None
-    lunaverse_ssh_tailscale_host: str | None
+    server_admin_name: str | None = None
+    server_name: str | None = None
 
     # Cockpit & pgAdmin
-    cockpit_url: str | None
-    pgadmin_url: str | None
-    pgadmin_master_password: str | None
-
-    # Local Postgres
-    postgres_host: str | None
-    postgres_port: int | None
-    postgres_db: str | None
-    postgres_user: str | None
-    postgres_password: str | None
-    postgres_superuser: str | None
-    postgres_superuser_password: str | None
-    postgres_alt_user: str | None
-    postgres_alt_password: str | None
+    cockpit_url: str | None = None
+    pgadmin_url: str | None = None
+    pgadmin_master_password: str | None = None
 
     # Default admin
-    default_admin_email: str | None
-    default_admin_password: str | None
-    default_admin_role: str | None
+    default_admin_email: str | None = None
+    default_admin_password: str | None = None
+    default_admin_role: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class LunaverseSettings(_Group):
+    PREFIX: ClassVar[str] = "lunaverse_"
+
+    # SSH
+    host: str | None = None
+    ssh_user: str | None = None
+    ssh_port: int | None = None
+    ssh_password: str | None = None
+    ssh_tailscale_host: str | None = None
 
     # App user
-    lunaverse_app_user: str | None
-    lunaverse_app_password: str | None
+    app_user: str | None = None
+    app_password: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class PostgresSettings(_Group):
+    PREFIX: ClassVar[str] = "postgres_"
+
+    host: str | None = None
+    port: int | None = None
+    db: str | None = None
+    user: str | None = None
+    password: str | None = None
+    superuser: str | None = None
+    superuser_password: str | None = None
+    alt_user: str | None = None
+    alt_password: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class DoPgSettings(_Group):
+    PREFIX: ClassVar[str] = "do_pg_"
+
+    host: str | None = None
+    port: int | None = None
+    user: str | None = None
+    password: str | None = None
+    sslmode: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class ApiTokenSettings(_Group):
+    github_token: str | None = None
+    hf_token: str | None = None
+    hf_ssh_key_fingerprint: str | None = None
+    taskade_token: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class NameSiloSettings(_Group):
+    PREFIX: ClassVar[str] = "namesilo_"
+
+    api_key: str | None = None
+    account_url: str | None = None
+    site_builder_url: str | None = None
+
+
+# Group attribute name -> group class. Each group reads its env vars on first access.
+_GROUPS: dict[str, type[_Group]] = {
+    "app": AppSettings,
+    "lunaverse": LunaverseSettings,
+    "postgres": PostgresSettings,
+    "do_pg": DoPgSettings,
+    "api_tokens": ApiTokenSettings,
+    "namesilo": NameSiloSettings,
+}
+
+# Flat field name (as on the original flat Settings) -> (group, attribute).
+_FIELDS: dict[str, tuple[str, str]] = {
+    f"{cls.PREFIX}{f.name}": (group, f.name)
+    for group, cls in _GROUPS.items()
+    for f in fields(cls)  # type: ignore[arg-type]
+}
+
+
+class Settings:
+    """Application settings, grouped and loaded lazily from the environment.
+
+    Each group (``app``, ``lunaverse``, ``postgres``, ``do_pg``,
+    ``api_tokens``, ``namesilo``) reads its env vars the first time one of its
+    fields is accessed, then stays fixed for the life of the instance. The
+    flat field names (``s.postgres_host``, ``s.do_pg_sslmode``, ...) remain
+    available and instances are immutable.
+
+    Use ``get_settings()`` for a process-wide memoized instance and
+    ``invalidate_settings()`` to drop it.
+    """
+
+    __slots__ = ("_env", *(f"_{group}" for group in _GROUPS))
+    _env: Mapping[str, str]
+
+    def __init__(self, env: Mapping[str, str] | None = None, **values: Any) -> None:
+        object.__setattr__(self, "_env", os.environ if env is None else env)
+        if not values:
+            return
+        unknown = set(values) - set(_FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown settings fields: {', '.join(sorted(unknown))}")
+        grouped: dict[str, dict[str, Any]] = {}
+        for name, value in values.items():
+            group, attr = _FIELDS[name]
+            grouped.setdefault(group, {})[attr] = value
+        for group, cls in _GROUPS.items():
+            object.__setattr__(self, f"_{group}", cls(**grouped.get(group, {})))
+
+    def _group(self, group: str) -> Any:
+        slot = f"_{group}"
+        try:
+            return object.__getattribute__(self, slot)
+        except AttributeError:
+            value = _GROUPS[group].from_env(self._env)
+            object.__setattr__(self, slot, value)
+            return value
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name: str) -> None:
+        raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+    @property
+    def environ(self) -> Mapping[str, str]:
+        """The environment mapping this instance reads from."""
+        return self._env
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return every field by its flat name (loads all groups)."""
+        return {name: getattr(self, name) for name in _FIELDS}
 
-    # API tokens
-    github_token: str | None
-    hf_token: str | None
-    hf_ssh_key_fingerprint: str | None
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Settings):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
 
-    # DigitalOcean Postgres
-    do_pg_host: str | None
-    do_pg_port: int | None
-    do_pg_user: str | None
-    do_pg_password: str | None
-    do_pg_sslmode: str | None
+    def __hash__(self) -> int:
+        return hash(tuple(self.as_dict().items()))
 
-    # Taskade
-    taskade_token: str | None
+    def __repr__(self) -> str:
+        body = ", ".join(f"{k}={v!r}" for k, v in self.as_dict().items())
+        return f"Settings({body})"
 
-    # NameSilo
-    namesilo_api_key: str | None
-    namesilo_account_url: str | None
-    namesilo_site_builder_url: str | None
+    @property
+    def app(self) -> AppSettings:
+        return self._group("app")
+
+    @property
+    def lunaverse(self) -> LunaverseSettings:
+        return self._group("lunaverse")
+
+    @property
+    def postgres(self) -> PostgresSettings:
+        return self._group("postgres")
+
+    @property
+    def do_pg(self) -> DoPgSettings:
+        return self._group("do_pg")
+
+    @property
+    def api_tokens(self) -> ApiTokenSettings:
+        return self._group("api_tokens")
+
+    @property
+    def namesilo(self) -> NameSiloSettings:
+        return self._group("namesilo")
+
+    # Flat field accessors (server_name, postgres_port, ...) are attached below.
+    if TYPE_CHECKING:
+        app_env: str
+        log_level: str
+        server_admin_name: str | None
+        server_name: str | None
+        lunaverse_host: str | None
+        lunaverse_ssh_user: str | None
+        lunaverse_ssh_port: int | None
+        lunaverse_ssh_password: str | None
+        lunaverse_ssh_tailscale_host: str | None
+        cockpit_url: str | None
+        pgadmin_url: str | None
+        pgadmin_master_password: str | None
+        postgres_host: str | None
+        postgres_port: int | None
+        postgres_db: str | None
+        postgres_user: str | None
+        postgres_password: str | None
+        postgres_superuser: str | None
+        postgres_superuser_password: str | None
+        postgres_alt_user: str | None
+        postgres_alt_password: str | None
+        default_admin_email: str | None
+        default_admin_password: str | None
+        default_admin_role: str | None
+        lunaverse_app_user: str | None
+        lunaverse_app_password: str | None
+        github_token: str | None
+        hf_token: str | None
+        hf_ssh_key_fingerprint: str | None
+        do_pg_host: str | None
+        do_pg_port: int | None
+        do_pg_user: str | None
+        do_pg_password: str | None
+        do_pg_sslmode: str | None
+        taskade_token: str | None
+        namesilo_api_key: str | None
+        namesilo_account_url: str | None
+        namesilo_site_builder_url: str | None
 
     @staticmethod
     def _parse_int(value: str | None) -> int | None:
-        if not value:
-            return None
-        try:
-            return int(value)
-        except ValueError:
-            return None
+        return _parse_int(value)
 
     @staticmethod
     def load() -> Settings:
-        return Settings(
-            app_env=os.getenv("APP_ENV", "dev"),
-            log_level=os.getenv("LOG_LEVEL", "INFO"),
-            server_admin_name=os.getenv("SERVER_ADMIN_NAME"),
-            server_name=os.getenv("SERVER_NAME"),
-            lunaverse_host=os.getenv("LUNAVERSE_HOST"),
-            lunaverse_ssh_user=os.getenv("LUNAVERSE_SSH_USER"),
-            lunaverse_ssh_port=Settings._parse_int(os.getenv("LUNAVERSE_SSH_PORT")),
-            lunaverse_ssh_password=os.getenv("LUNAVERSE_SSH_PASSWORD"),
-            lunaverse_ssh_tailscale_host=os.getenv("LUNAVERSE_SSH_TAILSCALE_HOST"),
-            cockpit_url=os.getenv("COCKPIT_URL"),
-            pgadmin_url=os.getenv("PGADMIN_URL"),
-            pgadmin_master_password=os.getenv("PGADMIN_MASTER_PASSWORD"),
-            postgres_host=os.getenv("POSTGRES_HOST"),
-            postgres_port=Settings._parse_int(os.getenv("POSTGRES_PORT")),
-            postgres_db=os.getenv("POSTGRES_DB"),
-            postgres_user=os.getenv("POSTGRES_USER"),
-            postgres_password=os.getenv("POSTGRES_PASSWORD"),
-            postgres_superuser=os.getenv("POSTGRES_SUPERUSER"),
-            postgres_superuser_password=os.getenv("POSTGRES_SUPERUSER_PASSWORD"),
-            postgres_alt_user=os.getenv("POSTGRES_ALT_USER"),
-            postgres_alt_password=os.getenv("POSTGRES_ALT_PASSWORD"),
-            default_admin_email=os.getenv("DEFAULT_ADMIN_EMAIL"),
-            default_admin_password=os.getenv("DEFAULT_ADMIN_PASSWORD"),
-            default_admin_role=os.getenv("DEFAULT_ADMIN_ROLE"),
-            lunaverse_app_user=os.getenv("LUNAVERSE_APP_USER"),
-            lunaverse_app_password=os.getenv("LUNAVERSE_APP_PASSWORD"),
-            github_token=os.getenv("GITHUB_TOKEN"),
-            hf_token=os.getenv("HF_TOKEN"),
-            hf_ssh_key_fingerprint=os.getenv("HF_SSH_KEY_FINGERPRINT"),
-            do_pg_host=os.getenv("DO_PG_HOST"),
-            do_pg_port=Settings._parse_int(os.getenv("DO_PG_PORT")),
-            do_pg_user=os.getenv("DO_PG_USER"),
-            do_pg_password=os.getenv("DO_PG_PASSWORD"),
-            do_pg_sslmode=os.getenv("DO_PG_SSLMODE"),
-            taskade_token=os.getenv("TASKADE_TOKEN"),
-            namesilo_api_key=os.getenv("NAMESILO_API_KEY"),
-            namesilo_account_url=os.getenv("NAMESILO_ACCOUNT_URL"),
-            namesilo_site_builder_url=os.getenv("NAMESILO_SITE_BUILDER_URL"),
-        )
+        """Return a new Settings bound to the current environment.
+
+        The environment is the real one layered over ``.env``,
+        ``.env.<APP_ENV>`` and ``.env.local`` in the current directory (see
+        ``app.envfiles``). Nothing is read until a field is accessed.
+        """
+        return Settings(env=load_layered_env())
 
     # Require methods for secrets
     def require_hf_token(self) -> str:
@@ -164,3 +344,148 @@ class Settings:
 
     def require_do_pg_password(self) -> str:
         return self.do_pg_password or _require_env("DO_PG_PASSWORD")
+
+
+def _flat_property(group: str, attr: str) -> property:
+    slot = f"_{group}"
+    cls = _GROUPS[group]
+
+    def get(self: Settings) -> Any:
+        try:
+            values = object.__getattribute__(self, slot)
+        except AttributeError:
+            values = self._group(group)
+        return getattr(values, attr)
+
+    get.__name__ = f"{cls.PREFIX}{attr}"
+    return property(get)
+
+
+def _install_flat_properties() -> None:
+    for name, (group, attr) in _FIELDS.items():
+        setattr(Settings, name, _flat_property(group, attr))
+
+
+_install_flat_properties()
+
+
+SettingsCallback = Callable[["Settings | None", Settings], None]
+
+_current: Settings | None = None
+_subscribers: list[SettingsCallback] = []
+_subscribers_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """Return the process-wide Settings, creating it on first use.
+
+    Lock-free: the published instance is swapped with a single assignment.
+    """
+    global _current
+    current = _current
+    if current is None:
+        current = _current = Settings.load()
+    return current
+
+
+def invalidate_settings() -> None:
+    """Drop the memoized Settings; the next ``get_settings()`` re-reads the environment."""
+    global _current
+    _current = None
+
+
+def subscribe(callback: SettingsCallback) -> Callable[[], None]:
+    """Call ``callback(old, new)`` whenever new Settings are published.
+
+    Returns a function that removes the subscription.
+    """
+    with _subscribers_lock:
+        _subscribers.append(callback)
+
+    def unsubscribe() -> None:
+        with _subscribers_lock:
+            if callback in _subscribers:
+                _subscribers.remove(callback)
+
+    return unsubscribe
+
+
+def publish_settings(new: Settings) -> None:
+    """Atomically make ``new`` the process-wide Settings and notify subscribers."""
+    global _current
+    old, _current = _current, new
+    with _subscribers_lock:
+        callbacks = list(_subscribers)
+    for callback in callbacks:
+        try:
+            callback(old, new)
+        except Exception:
+            logger.exception("Settings subscriber %r failed", callback)
+
+
+class SettingsReloader:
+    """Poll the ``.env`` layer files and republish Settings when they change.
+
+    Each poll is one ``stat`` per layer file (inode, mtime and size are
+    compared). On a change a new Settings is built and fully loaded on the
+    polling thread, then published with ``publish_settings()``, so readers
+    of ``get_settings()`` never block or see a half-built instance.
+    """
+
+    def __init__(self, root: str | os.PathLike[str] | None = None, interval: float = 2.0) -> None:
+        self.root = Path.cwd() if root is None else Path(root)
+        self.interval = interval
+        self._signature = self._stat_signature()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _stat_signature(self) -> tuple[tuple[int, int, int] | None, ...]:
+        app_env = get_settings().app_env
+        signature: list[tuple[int, int, int] | None] = []
+        for path in layer_paths(self.root, app_env):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                signature.append(None)
+            else:
+                signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def check(self) -> bool:
+        """Reload if any layer file changed since the last check; return whether it did."""
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return False
+        self.reload()
+        # Keep the signature taken before reading: a file written during the
+        # reload then differs on the next check instead of being missed. If
+        # APP_ENV changed which files are layered, that check reloads once more.
+        self._signature = signature
+        return True
+
+    def reload(self) -> Settings:
+        new = Settings(env=load_layered_env(self.root))
+        new.as_dict()  # Load every group here, not on a reader's first access.
+        publish_settings(new)
+        return new
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Settings reload failed; keeping the current snapshot")
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="settings-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
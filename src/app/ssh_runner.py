@@ -0,0 +1,404 @@
+"""Run commands on Lunaverse over persistent, multiplexed SSH sessions.
+
+One session is kept open per runner and every command reuses it, so only
+the first command pays for the SSH handshake. With ``OpenSSHTransport``
+this is an OpenSSH ControlMaster; each command is a new channel on it.
+
+    async with SSHRunner.from_settings() as runner:
+        results = await runner.run_batch(["uptime", "df -h"], on_output=print)
+
+Targets are ``lunaverse_host`` and ``lunaverse_ssh_tailscale_host``. Both
+are probed concurrently and the one with the lowest TCP connect latency is
+used; if it cannot be reached the runner fails over to the next one. A
+command whose session drops is only re-run on a fresh session when the
+caller says it is safe to (``retry=True``): the runner cannot tell whether
+the remote side already started it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import shutil
+import tempfile
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Protocol
+
+from app.metrics import REGISTRY
+from app.netprobe import tcp_connect_latency
+from app.settings import Settings, get_settings
+
+READ_CHUNK = 64 * 1024
+MAX_LINE_CHARS = 64 * 1024
+
+CONNECT_LATENCY = REGISTRY.gauge(
+    "app_ssh_connect_latency_seconds", "Last measured TCP connect latency per SSH host", ["host"]
+)
+COMMAND_SECONDS = REGISTRY.histogram(
+    "app_ssh_command_seconds", "Remote command duration per SSH host", ["host"]
+)
+
+
+@dataclass(frozen=True)
+class SSHTarget:
+    host: str
+    port: int = 22
+    user: str | None = None
+
+    @property
+    def destination(self) -> str:
+        return f"{self.user}@{self.host}" if self.user else self.host
+
+    def __str__(self) -> str:
+        return f"{self.destination}:{self.port}"
+
+
+@dataclass(frozen=True)
+class OutputLine:
+    command: str
+    target: SSHTarget
+    stream: str  # "stdout" or "stderr"
+    text: str
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    command: str
+    target: SSHTarget
+    exit_code: int
+    seconds: float
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+
+OutputCallback = Callable[[OutputLine], None]
+LineCallback = Callable[[str, str], None]
+
+
+class Session(Protocol):
+    target: SSHTarget
+
+    async def execute(self, command: str, on_line: LineCallback) -> int:
+        """Run ``command``, calling ``on_line(stream, text)`` per line; return the exit code.
+
+        Raise ``ConnectionError`` if the session itself failed.
+        """
+        ...
+
+    async def close(self) -> None: ...
+
+
+class Transport(Protocol):
+    async def probe(self, target: SSHTarget) -> float:
+        """Return the connect latency to ``target`` in seconds, or raise ``OSError``."""
+        ...
+
+    async def open(self, target: SSHTarget) -> Session: ...
+
+
+async def _pump(reader: asyncio.StreamReader | None, stream: str, on_line: LineCallback) -> None:
+    """Split ``reader`` into lines; lines over ``MAX_LINE_CHARS`` arrive in pieces."""
+    if reader is None:
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        chunk = await reader.read(READ_CHUNK)
+        *lines, pending = (pending + decoder.decode(chunk, final=not chunk)).split("\n")
+        if not chunk and pending:
+            lines.append(pending)
+        for line in lines:
+            line = line.rstrip("\r")
+            for i in range(0, len(line), MAX_LINE_CHARS):
+                on_line(stream, line[i : i + MAX_LINE_CHARS])
+            if not line:
+                on_line(stream, line)
+        if not chunk:
+            return
+        # Hold back at most one piece of an unterminated line.
+        while len(pending) > MAX_LINE_CHARS:
+            on_line(stream, pending[:MAX_LINE_CHARS])
+            pending = pending[MAX_LINE_CHARS:]
+
+
+class OpenSSHSession:
+    """A ControlMaster connection; commands run as extra channels over it."""
+
+    def __init__(self, target: SSHTarget, base_args: list[str]) -> None:
+        self.target = target
+        self._base_args = base_args
+
+    async def _ssh(self, *args: str) -> int:
+        proc = await asyncio.create_subprocess_exec(
+            "ssh",
+            *self._base_args,
+            *args,
+            self.target.destination,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        return await proc.wait()
+
+    async def execute(self, command: str, on_line: LineCallback) -> int:
+        proc = await asyncio.create_subprocess_exec(
+            "ssh",
+            *self._base_args,
+            "-o",
+            "ControlMaster=no",
+            self.target.destination,
+            command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            await asyncio.gather(
+                _pump(proc.stdout, "stdout", on_line), _pump(proc.stderr, "stderr", on_line)
+            )
+        except BaseException:
+            # Cancelled, or a callback raised: don't leave ssh running.
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            raise
+        finally:
+            code = await proc.wait()
+        # ssh reports its own failures as 255; tell them apart from a remote exit 255.
+        if code == 255 and await self._ssh("-O", "check") != 0:
+            raise ConnectionError(f"SSH session to {self.target} was lost")
+        return code
+
+    async def close(self) -> None:
+        await self._ssh("-O", "exit")
+
+
+class OpenSSHTransport:
+    """Transport using the system ``ssh`` client with connection multiplexing.
+
+    Key-based authentication is required (``BatchMode=yes``); see
+    docs/server-access.md. Control sockets live in a private temp directory
+    that is removed by ``cleanup()``.
+    """
+
+    def __init__(self, connect_timeout: float = 5.0, persist: int = 600) -> None:
+        self.connect_timeout = connect_timeout
+        self.persist = persist
+        self._control_dir = tempfile.mkdtemp(prefix="lunaverse-ssh-")
+
+    def _base_args(self, target: SSHTarget) -> list[str]:
+        return [
+            "-p",
+            str(target.port),
+            "-o",
+            "BatchMode=yes",
+            "-o",
+            f"ConnectTimeout={max(1, round(self.connect_timeout))}",
+            "-o",
+            f"ControlPath={self._control_dir}/%C",
+        ]
+
+    async def probe(self, target: SSHTarget) -> float:
+        return await tcp_connect_latency(target.host, target.port)
+
+    async def open(self, target: SSHTarget) -> OpenSSHSession:
+        base_args = self._base_args(target)
+        proc = await asyncio.create_subprocess_exec(
+            "ssh",
+            *base_args,
+            "-M",
+            "-N",
+            "-f",
+            "-o",
+            f"ControlPersist={self.persist}",
+            target.destination,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            message = stderr.decode("utf-8", errors="replace").strip()
+            raise ConnectionError(f"ssh to {target} failed: {message or proc.returncode}")
+        return OpenSSHSession(target, base_args)
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+
+
+def targets_from_settings(settings: Settings | None = None) -> list[SSHTarget]:
+    """Return the LAN and Tailscale targets configured in ``Settings``, in that order."""
+    s = settings or get_settings()
+    port = s.lunaverse_ssh_port or 22
+    hosts = [h for h in (s.lunaverse_host, s.lunaverse_ssh_tailscale_host) if h]
+    if not hosts:
+        raise RuntimeError(
+            "Missing required environment variable: LUNAVERSE_HOST "
+            "(or LUNAVERSE_SSH_TAILSCALE_HOST). "
+            "Set it in your local .env (gitignored) or your shell environment."
+        )
+    return [SSHTarget(h, port, s.lunaverse_ssh_user) for h in dict.fromkeys(hosts)]
+
+
+class SSHRunner:
+    """Runs commands over one shared session, at most ``max_parallel`` at a time.
+
+    ``max_parallel`` should stay below the server's ``MaxSessions`` (10 by
+    default in sshd), since every concurrent command is a channel on the
+    same connection.
+    """
+
+    def __init__(
+        self,
+        targets: Iterable[SSHTarget],
+        transport: Transport,
+        max_parallel: int = 8,
+        connect_timeout: float = 5.0,
+    ) -> None:
+        self.targets = list(targets)
+        if not self.targets:
+            raise ValueError("SSHRunner needs at least one target")
+        self.transport = transport
+        self.connect_timeout = connect_timeout
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        self._session_lock = asyncio.Lock()
+        self._session: Session | None = None
+        self._failed: set[SSHTarget] = set()
+        self.latencies: dict[SSHTarget, float] = {}
+
+    @classmethod
+    def from_settings(
+        cls,
+        settings: Settings | None = None,
+        transport: Transport | None = None,
+        max_parallel: int = 8,
+        connect_timeout: float = 5.0,
+    ) -> SSHRunner:
+        return cls(
+            targets_from_settings(settings),
+            transport or OpenSSHTransport(connect_timeout=connect_timeout),
+            max_parallel=max_parallel,
+            connect_timeout=connect_timeout,
+        )
+
+    async def __aenter__(self) -> SSHRunner:
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.close()
+
+    async def rank_targets(self) -> list[SSHTarget]:
+        """Probe every target concurrently; return reachable ones, fastest first.
+
+        Targets that failed earlier sort after the others.
+        """
+
+        async def measure(target: SSHTarget) -> float | None:
+            try:
+                latency = await asyncio.wait_for(
+                    self.transport.probe(target), self.connect_timeout
+                )
+            except (OSError, TimeoutError):
+                self.latencies.pop(target, None)
+                return None
+            self.latencies[target] = latency
+            CONNECT_LATENCY.labels(host=target.host).set(latency)
+            return latency
+
+        latencies = await asyncio.gather(*(measure(t) for t in self.targets))
+        reachable = [
+            (lat, t) for lat, t in zip(latencies, self.targets, strict=True) if lat is not None
+        ]
+        reachable.sort(key=lambda item: (item[1] in self._failed, item[0]))
+        return [t for _, t in reachable]
+
+    async def session(self) -> Session:
+        """Return the shared session, opening it on the best target if needed."""
+        async with self._session_lock:
+            if self._session is not None:
+                return self._session
+            errors = []
+            for target in await self.rank_targets():
+                try:
+                    self._session = await asyncio.wait_for(
+                        self.transport.open(target), self.connect_timeout
+                    )
+                except (OSError, TimeoutError) as exc:
+                    self._failed.add(target)
+                    errors.append(f"{target}: {exc or type(exc).__name__}")
+                    continue
+                self._failed.discard(target)
+                return self._session
+            detail = "; ".join(errors) or "no target accepted a TCP connection"
+            raise ConnectionError(f"No Lunaverse SSH target reachable ({detail})")
+
+    async def _drop(self, session: Session) -> None:
+        async with self._session_lock:
+            if self._session is not session:
+                return
+            self._session = None
+            self._failed.add(session.target)
+        try:
+            await session.close()
+        except OSError:
+            pass
+
+    async def run(
+        self, command: str, on_output: OutputCallback | None = None, retry: bool = False
+    ) -> CommandResult:
+        """Run one command, streaming lines to ``on_output`` as they arrive.
+
+        If the session fails, the session is dropped and the error raised.
+        With ``retry=True`` (only for idempotent commands) a failure before
+        the command produced output is retried once on a fresh session,
+        possibly on the other target.
+        """
+        async with self._semaphore:
+            for attempt in (1, 2):
+                session = await self.session()
+                produced = False
+
+                def on_line(stream: str, text: str, target: SSHTarget = session.target) -> None:
+                    nonlocal produced
+                    produced = True
+                    if on_output is not None:
+                        on_output(OutputLine(command, target, stream, text))
+
+                start = time.perf_counter()
+                try:
+                    code = await session.execute(command, on_line)
+                except OSError:
+                    await self._drop(session)
+                    if not retry or produced or attempt == 2:
+                        raise
+                    continue
+                seconds = time.perf_counter() - start
+                COMMAND_SECONDS.labels(host=session.target.host).observe(seconds)
+                return CommandResult(command, session.target, code, seconds)
+        raise AssertionError("unreachable")
+
+    async def run_batch(
+        self,
+        commands: Iterable[str],
+        on_output: OutputCallback | None = None,
+        retry: bool = False,
+    ) -> list[CommandResult]:
+        """Run ``commands`` concurrently (bounded by ``max_parallel``), results in input order."""
+        return list(await asyncio.gather(*(self.run(c, on_output, retry) for c in commands)))
+
+    async def close(self) -> None:
+        async with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            try:
+                await session.close()
+            except OSError:
+                pass
+        cleanup = getattr(self.transport, "cleanup", None)
+        if cleanup is not None:
+            cleanup()
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import atexit
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+logger = logging.getLogger("app.timing")
+
+# Log-linear buckets: 8 sub-buckets per power of two gives <= ~6% relative error.
+_SUB_BUCKETS = 8
+_N_BUCKETS = 64 * _SUB_BUCKETS
+
+_FALSY = {"0", "false", "no", "off"}
+
+
+def _bucket_index(value: int) -> int:
+    if value <= 0:
+        return 0
+    mantissa, exponent = math.frexp(value)
+    return min(_N_BUCKETS - 1, exponent * _SUB_BUCKETS + int((mantissa - 0.5) * 2 * _SUB_BUCKETS))
+
+
+def _bucket_upper(index: int) -> float:
+    exponent, sub = divmod(index, _SUB_BUCKETS)
+    return math.ldexp(0.5 + (sub + 1) / (2 * _SUB_BUCKETS), exponent)
+
+
+class Histogram:
+    """Fixed-bucket histogram of non-negative integers (e.g. nanoseconds).
+
+    Tracks count, sum, min and max exactly; percentiles are estimated from
+    log-linear buckets and clamped to the observed min/max.
+    """
+
+    __slots__ = ("count", "total", "min", "max", "_buckets", "_lock")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self._buckets = [0] * _N_BUCKETS
+
+    def observe(self, value: int) -> None:
+        index = _bucket_index(value)
+        with self._lock:
+            if not self.count or value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+            self.count += 1
+            self.total += value
+            self._buckets[index] += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self._buckets):
+            seen += n
+            if n and seen >= rank:
+                return float(min(max(_bucket_upper(index), self.min), self.max))
+        return float(self.max)
+
+    def snapshot(self, reset: bool = False) -> dict[str, float]:
+        """Return count/sum/min/max/p50/p95/p99, optionally resetting afterwards."""
+        with self._lock:
+            snap = {
+                "count": self.count,
+                "sum": self.total,
+                "min": self.min,
+                "max": self.max,
+                "p50": self.percentile(0.50),
+                "p95": self.percentile(0.95),
+                "p99": self.percentile(0.99),
+            }
+            if reset:
+                self._reset()
+        return snap
+
+
+class TimingRegistry:
+    """Per-region duration histograms, summarised to the logger periodically.
+
+    Nothing is logged per call: every ``interval`` seconds (checked when a
+    duration is recorded) and on ``flush()``, one INFO record per region is
+    sent to the ``app.timing`` logger with the stats in ``extra=`` fields.
+    """
+
+    def __init__(self, interval: float = 60.0) -> None:
+        self.interval = interval
+        self._regions: dict[str, Histogram] = {}
+        self._next_emit = time.monotonic() + interval
+        self._emit_lock = threading.Lock()
+
+    def record(self, region: str, duration_ns: int) -> None:
+        histogram = self._regions.get(region)
+        if histogram is None:
+            histogram = self._regions.setdefault(region, Histogram())
+        histogram.observe(duration_ns)
+        if time.monotonic() >= self._next_emit:
+            self.flush()
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        return {region: h.snapshot() for region, h in list(self._regions.items())}
+
+    def flush(self) -> None:
+        """Emit one summary record per region with data, then reset the regions."""
+        if not self._emit_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_emit = time.monotonic() + self.interval
+            for region, histogram in list(self._regions.items()):
+                snap = histogram.snapshot(reset=True)
+                if not snap["count"]:
+                    continue
+                fields = {
+                    "region": region,
+                    "count": snap["count"],
+                    **{
+                        f"{k}_ms": snap[k] / 1e6
+                        for k in ("sum", "min", "max", "p50", "p95", "p99")
+                    },
+                }
+                logger.info(
+                    "timing region=%s count=%d p50=%.3fms p95=%.3fms p99=%.3fms max=%.3fms",
+                    region,
+                    fields["count"],
+                    fields["p50_ms"],
+                    fields["p95_ms"],
+                    fields["p99_ms"],
+                    fields["max_ms"],
+                    extra=fields,
+                )
+        finally:
+            self._emit_lock.release()
+
+
+def _env_enabled() -> bool:
+    return os.getenv("LOG_TIMINGS", "1").strip().lower() not in _FALSY
+
+
+def _env_interval() -> float:
+    try:
+        return float(os.getenv("LOG_TIMINGS_INTERVAL", "") or 60.0)
+    except ValueError:
+        return 60.0
+
+
+registry = TimingRegistry(interval=_env_interval())
+_enabled = _env_enabled()
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn timing on or off at runtime (``LOG_TIMINGS`` sets the default).
+
+    Functions decorated while timing was disabled stay uninstrumented.
+    """
+    global _enabled
+    _enabled = enabled
+
+
+class _Timed:
+    __slots__ = ("region", "_start")
+
+    def __init__(self, region: str) -> None:
+        self.region = region
+        self._start = 0
+
+    def __enter__(self) -> _Timed:
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        registry.record(self.region, time.perf_counter_ns() - self._start)
+
+    def __call__(self, func: F) -> F:
+        region = self.region
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.record(region, time.perf_counter_ns() - start)
+
+        return wrapper  # type: ignore[return-value]
+
+
+class _NoopTimed:
+    __slots__ = ()
+
+    def __enter__(self) -> _NoopTimed:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+    def __call__(self, func: F) -> F:
+        return func
+
+
+_NOOP = _NoopTimed()
+
+
+def timed(region: str) -> _Timed | _NoopTimed:
+    """Time a code region, as a context manager or a decorator.
+
+        with timed("db.query"):
+            ...
+
+        @timed("settings.load")
+        def load(): ...
+
+    When disabled (``LOG_TIMINGS=0``) this returns a shared no-op, and
+    decorating returns the function unchanged.
+    """
+    if not _enabled:
+        return _NOOP
+    return _Timed(region)
+
+
+atexit.register(registry.flush)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import importlib.util
+from pathlib import Path
+
+RUN_PY = Path(__file__).resolve().parents[1] / "benchmarks" / "run.py"
+
+_spec = importlib.util.spec_from_file_location("bench_run", RUN_PY)
+assert _spec is not None and _spec.loader is not None
+bench_run = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench_run)
+
+
+def test_compare_flags_only_regressions_past_threshold():
+    """Scenarios slower than the threshold should be reported; others not."""
+    baseline = {"a": {"ops_per_sec": 1000.0}, "b": {"ops_per_sec": 1000.0}}
+    results = {
+        "a": {"ops_per_sec": 850.0},
+        "b": {"ops_per_sec": 700.0},
+        "new": {"ops_per_sec": 1.0},
+    }
+
+    regressions = bench_run.compare(results, baseline, threshold=0.2)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("b:")
+
+
+def test_measure_reports_latency_percentiles():
+    """measure() should report throughput and ordered percentiles."""
+    result = bench_run.measure(lambda: sum(range(100)), 200)
+
+    assert result["ops"] == 200
+    assert result["ops_per_sec"] > 0
+    assert result["p50_us"] <= result["p99_us"]
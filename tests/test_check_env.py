@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import json
 import os
+import socket
 import subprocess
 import sys
 from pathlib import Path
@@ -61,3 +63,97 @@ def test_check_env_invalid_mode():
     assert result.returncode == 2
     assert "Unknown mode" in result.stderr or "invalid" in result.stderr.lower()
 
+
+
+def test_check_env_all_mode_reports_every_mode():
+    """The all mode checks every mode in one pass and fails if any is incomplete."""
+    script = Path(".ops/scripts/check_env.py")
+    env = {**os.environ, "APP_ENV": "dev", "LOG_LEVEL": "INFO"}
+    for key in ["LUNAVERSE_HOST", "POSTGRES_HOST", "DO_PG_HOST"]:
+        env.pop(key, None)
+
+    result = subprocess.run(
+        [sys.executable, str(script), "all", "--json"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+
+    assert result.returncode == 2
+    report = json.loads(result.stdout)
+    assert set(report["missing"]) == {"local-dev", "server-ops", "db-local", "db-do"}
+    assert report["missing"]["local-dev"] == []
+    assert "POSTGRES_HOST" in report["missing"]["db-local"]
+
+
+def test_check_env_probe_measures_latency_concurrently():
+    """--probe connects to all endpoints at once, reporting latency or the error."""
+    script = Path(".ops/scripts/check_env.py")
+    listener = socket.create_server(("127.0.0.1", 0))
+    open_port = listener.getsockname()[1]
+    closed = socket.create_server(("127.0.0.1", 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    env = {
+        **os.environ,
+        "POSTGRES_HOST": "127.0.0.1",
+        "POSTGRES_PORT": str(open_port),
+        "DO_PG_HOST": "127.0.0.1",
+        "DO_PG_PORT": str(closed_port),
+        "LUNAVERSE_HOST": "127.0.0.1",
+        "LUNAVERSE_SSH_PORT": "not-a-port",
+    }
+
+    try:
+        result = subprocess.run(
+            [sys.executable, str(script), "all", "--probe", "--json", "--timeout", "2"],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+    finally:
+        listener.close()
+
+    probes = {p["mode"]: p for p in json.loads(result.stdout)["probes"]}
+    assert probes["db-local"]["ok"] and probes["db-local"]["latency_ms"] >= 0
+    assert not probes["db-do"]["ok"] and probes["db-do"]["error"]
+    assert probes["server-ops"]["error"] == "invalid port 'not-a-port'"
+    assert result.returncode in (1, 2)
+
+
+def test_check_env_probe_reports_out_of_range_ports():
+    """Ports outside 1-65535 are failed checks, without loading settings or metrics."""
+    script = Path(".ops/scripts/check_env.py")
+    env = {
+        **os.environ,
+        "POSTGRES_HOST": "127.0.0.1",
+        "POSTGRES_PORT": "70000",
+        "POSTGRES_DB": "app",
+        "POSTGRES_USER": "app",
+        "DO_PG_HOST": "127.0.0.1",
+        "DO_PG_PORT": "0",
+        "DO_PG_USER": "app",
+    }
+    probe = (
+        "import runpy, sys\n"
+        f"sys.argv = [{str(script)!r}, 'db-local', '--probe', '--json']\n"
+        "try:\n"
+        f"    runpy.run_path({str(script)!r}, run_name='__main__')\n"
+        "finally:\n"
+        "    print(sorted(m for m in sys.modules if m.startswith('app.')), file=sys.stderr)\n"
+    )
+
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, env=env)
+    db_do = subprocess.run(
+        [sys.executable, str(script), "db-do", "--probe", "--json"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+
+    assert result.returncode == 1, result.stderr
+    assert json.loads(result.stdout)["probes"][0]["error"] == "invalid port '70000'"
+    assert db_do.returncode == 1
+    assert json.loads(db_do.stdout)["probes"][0]["error"] == "invalid port '0'"
+    assert "app.settings" not in result.stderr and "app.metrics" not in result.stderr
+    assert "app.netprobe" in result.stderr
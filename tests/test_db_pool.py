@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.db_pool import (
+    CHECKOUT_SECONDS,
+    AsyncConnectionPool,
+    ConnectionPool,
+    PoolClosed,
+    PoolTimeout,
+    pool_params,
+)
+from app.settings import Settings
+
+
+class FakeConnection:
+    def __init__(self, params):
+        self.params = dict(params)
+        self.closed = False
+        self.healthy = True
+
+
+class FakeDriver:
+    """In-process driver that records every connection it opens."""
+
+    def __init__(self):
+        self.connections: list[FakeConnection] = []
+
+    def connect(self, params):
+        conn = FakeConnection(params)
+        self.connections.append(conn)
+        return conn
+
+    def is_healthy(self, conn):
+        return conn.healthy and not conn.closed
+
+    def close(self, conn):
+        conn.closed = True
+
+
+def make_pool(**options) -> tuple[ConnectionPool, FakeDriver]:
+    driver = FakeDriver()
+    return ConnectionPool("test", driver, {"host": "db"}, **options), driver
+
+
+def test_pool_reuses_connections_and_prefills_min_size():
+    """Released connections are reused; open() creates min_size connections up front."""
+    pool, driver = make_pool(min_size=2, max_size=4)
+    pool.open()
+    assert pool.size == 2 and pool.idle == 2
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert len(driver.connections) == 2
+
+
+def test_pool_waits_then_times_out_when_exhausted():
+    """Checkout blocks while the pool is full and raises PoolTimeout after the timeout."""
+    pool, _ = make_pool(max_size=1, timeout=0.05)
+    conn = pool.acquire()
+    start = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert time.monotonic() - start >= 0.05
+
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=2)))
+    waiter.start()
+    time.sleep(0.02)
+    pool.release(conn)
+    waiter.join(timeout=2)
+    assert got == [conn]
+
+
+def test_pool_discards_unhealthy_and_errored_connections():
+    """Failed health checks and exceptions inside connection() close the connection."""
+    pool, driver = make_pool(max_size=2)
+    with pool.connection() as conn:
+        pass
+    conn.healthy = False
+    with pool.connection() as replacement:
+        assert replacement is not conn
+    assert conn.closed
+
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("boom")
+    assert driver.connections[-1].closed
+    assert pool.size == 0 and len(driver.connections) == 2
+
+
+def test_pool_recycles_by_lifetime_and_idle_time(monkeypatch):
+    """Connections past max_lifetime, or idle past max_idle beyond min_size, are closed."""
+    now = [1000.0]
+    monkeypatch.setattr("app.db_pool.time.monotonic", lambda: now[0])
+    pool, _ = make_pool(min_size=1, max_size=3, max_idle=10, max_lifetime=100)
+
+    a = pool.acquire()
+    b = pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    now[0] += 11
+    c = pool.acquire()  # one idle connection evicted, min_size keeps the other
+    assert pool.size == 1
+    pool.release(c)
+
+    now[0] += 100
+    d = pool.acquire()
+    assert d is not c and c.closed
+
+
+def test_reconfigure_recycles_old_connections():
+    """New parameters apply to new connections; old ones are closed when returned."""
+    pool, _ = make_pool(max_size=2)
+    busy = pool.acquire()
+    with pool.connection() as idle:
+        pass
+    pool.reconfigure({"host": "db2"})
+    assert idle.closed
+    pool.release(busy)
+    assert busy.closed
+    with pool.connection() as conn:
+        assert conn.params == {"host": "db2"}
+
+
+def test_checkout_latency_is_recorded_and_close_rejects_checkouts():
+    """Each checkout is observed in the histogram; a closed pool raises PoolClosed."""
+    pool, _ = make_pool()
+    before = CHECKOUT_SECONDS.labels(pool="test").count
+    with pool.connection():
+        pass
+    assert CHECKOUT_SECONDS.labels(pool="test").count == before + 1
+
+    pool.close()
+    with pytest.raises(PoolClosed):
+        pool.acquire()
+
+
+def test_async_front_end_shares_the_pool():
+    """AsyncConnectionPool checks out from the same pool without blocking the loop."""
+    pool, driver = make_pool(max_size=2)
+    apool = AsyncConnectionPool(pool)
+
+    async def worker():
+        async with apool.connection() as conn:
+            await asyncio.sleep(0.01)
+            return conn
+
+    async def main():
+        return await asyncio.gather(*(worker() for _ in range(6)))
+
+    conns = asyncio.run(main())
+    assert len(conns) == 6
+    assert len(driver.connections) <= 2
+    assert pool.idle == pool.size
+
+
+def test_async_pool_with_more_tasks_than_executor_threads():
+    """Checkouts blocked in every executor thread do not stop releases from running."""
+    pool, _ = make_pool(max_size=2, timeout=5)
+    apool = AsyncConnectionPool(pool)
+
+    async def worker():
+        async with apool.connection():
+            await asyncio.sleep(0.05)
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=4))
+        await asyncio.gather(*(worker() for _ in range(10)))
+
+    start = time.monotonic()
+    asyncio.run(main())
+    assert time.monotonic() - start < 2
+    assert pool.idle == pool.size == 2
+
+
+def test_async_checkout_cancelled_while_waiting_returns_the_connection():
+    """A connection handed to a cancelled waiter goes back to the pool."""
+    pool, _ = make_pool(max_size=1, timeout=5)
+    apool = AsyncConnectionPool(pool)
+
+    async def main():
+        held = await apool.acquire()
+        waiter = asyncio.create_task(apool.acquire())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await apool.release(held)
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        async with apool.connection(timeout=1) as conn:
+            return conn is held
+
+    assert asyncio.run(main())
+    assert pool.idle == pool.size == 1
+
+
+def test_async_waiters_leave_the_default_executor_free():
+    """Tasks waiting for a connection don't starve other run_in_executor(None) work."""
+    pool, driver = make_pool(max_size=2, timeout=5)
+    apool = AsyncConnectionPool(pool)
+    closed_on: list[str] = []
+    close = driver.close
+
+    def close_and_note(conn):
+        closed_on.append(threading.current_thread().name)
+        close(conn)
+
+    driver.close = close_and_note
+
+    async def holder():
+        async with apool.connection():
+            # A holder that needs the default executor (e.g. DNS) before releasing.
+            await asyncio.get_running_loop().run_in_executor(None, time.sleep, 0.05)
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        await asyncio.wait_for(asyncio.gather(*(holder() for _ in range(10))), 3)
+        conn = await apool.acquire()
+        await apool.release(conn, discard=True)
+
+    asyncio.run(main())
+    assert closed_on and threading.main_thread().name not in closed_on
+    assert pool.size == 1 and pool.idle == 1
+
+
+def test_pool_params_from_settings():
+    """Each named config maps its Settings fields onto driver parameters."""
+    s = Settings(
+        postgres_host="localhost",
+        postgres_port=5432,
+        postgres_db="app",
+        postgres_user="me",
+        do_pg_host="do.example",
+        do_pg_port=25060,
+        do_pg_user="doadmin",
+    )
+    assert pool_params(s, "postgres") == {
+        "host": "localhost",
+        "port": 5432,
+        "dbname": "app",
+        "user": "me",
+    }
+    assert pool_params(s, "do_pg") == {
+        "host": "do.example",
+        "port": 25060,
+        "dbname": "defaultdb",
+        "user": "doadmin",
+        "sslmode": "require",
+    }
+    with pytest.raises(ValueError):
+        pool_params(s, "mysql")
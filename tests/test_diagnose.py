@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+sys.path.insert(0, str(SCRIPTS))
+
+import diagnose  # noqa: E402
+
+
+def _save_resources_many(case_dir: str, worker: int, n: int) -> None:
+    for i in range(n):
+        diagnose.save_resources(Path(case_dir), [{"worker": worker, "i": i}])
+
+
+def _alive(pid: int) -> bool:
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        return False
+    return state != "Z"
+
+
+def test_stream_command_copies_output_and_exit_code():
+    """Interleaved stdout/stderr reach the file and the tee; the exit code is preserved."""
+    out, tee = io.BytesIO(), io.BytesIO()
+    run = diagnose.stream_command("echo one; echo two >&2; exit 3", out, tee=tee)
+
+    assert (run.exit_code, run.timed_out) == (3, False)
+    assert out.getvalue() == tee.getvalue() == b"one\ntwo\n"
+    assert run.bytes == 8
+
+
+def test_stream_command_memory_is_bounded():
+    """Copying 32 MB of output never holds more than a chunk or two in memory."""
+    tracemalloc.start()
+    try:
+        with open("/dev/null", "wb") as sink:
+            run = diagnose.stream_command("head -c 33554432 /dev/zero", sink)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert run.bytes == 32 * 1024 * 1024
+    assert peak < 1024 * 1024
+
+
+def test_timeout_kills_the_whole_process_tree(tmp_path):
+    """A timeout terminates the shell and the background children it started."""
+    pidfile = tmp_path / "pid"
+    start = time.monotonic()
+    out = io.BytesIO()
+    run = diagnose.stream_command(
+        f"sleep 60 & echo $! > {pidfile}; echo started; wait", out, timeout=0.5
+    )
+
+    assert run.timed_out and run.exit_code == diagnose.TIMEOUT_EXIT
+    assert time.monotonic() - start < 5
+    assert out.getvalue() == b"started\n"
+    pid = int(pidfile.read_text())
+    deadline = time.monotonic() + 2
+    while _alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _alive(pid)
+
+
+def test_diagnose_records_failure_and_appends_convo_log(tmp_path):
+    """One run writes the failure and fingerprint files, a KB case and the convo append."""
+    convo = tmp_path / "convo.txt"
+    convo.write_text("# convo\n", encoding="utf-8")
+    out = subprocess.run(
+        [
+            sys.executable,
+            str(SCRIPTS / "diagnose.py"),
+            "--cmd",
+            "echo 'ValueError: boom'; exit 2",
+            "--convo-log",
+            str(convo),
+        ],
+        capture_output=True,
+        text=True,
+        cwd=tmp_path,
+    )
+
+    assert out.returncode == 0, out.stderr
+    assert "[diagnose] exit:    2" in out.stdout
+    assert "Recorded failure signature:" in out.stdout
+    (failure,) = (tmp_path / ".ops/logs").glob("*__failure_output.txt")
+    (fingerprint,) = (tmp_path / ".ops/logs").glob("*__env_fingerprint.json")
+    assert failure.read_text() == "ValueError: boom\n"
+    assert list(json.loads(fingerprint.read_text()))[:2] == ["python_version", "platform"]
+    assert "ValueError: boom" in convo.read_text()
+    assert len(list((tmp_path / ".ops/error_kb/cases").iterdir())) == 1
+
+
+def test_repeat_groups_flaky_failures_by_signature(tmp_path):
+    """Repeated isolated runs report rates and record one case per failure mode."""
+    cmd = (
+        'echo "scratch: $TMPDIR"; '
+        'if [ $((DIAGNOSE_RUN % 2)) -eq 1 ]; then echo "TimeoutError: lock held"; exit 1; fi'
+    )
+    out = subprocess.run(
+        [sys.executable, str(SCRIPTS / "diagnose.py"), "--cmd", cmd, "--repeat", "6"]
+        + ["--jobs", "3"],
+        capture_output=True,
+        text=True,
+        cwd=tmp_path,
+    )
+
+    assert out.returncode == 0, out.stderr
+    assert "6, 3 passed, 3 failed (50.0% failure rate)" in out.stdout
+    assert "[diagnose] exits:   0 x3, 1 x3" in out.stdout
+    assert "failure modes: 1" in out.stdout
+    assert "(occurrence 3)" in out.stdout
+    (failure,) = (tmp_path / ".ops/logs").glob("*__failure_output_*.txt")
+    scratch = failure.read_text().splitlines()[0]
+    assert "/diagnose-" in scratch and scratch.endswith("/tmp")
+    assert len(list((tmp_path / ".ops/error_kb/cases").iterdir())) == 1
+    assert diagnose.percentile([3.0, 1.0, 2.0, 4.0], 50) == 2.0
+    assert diagnose.percentile([3.0, 1.0, 2.0, 4.0], 99) == 4.0
+
+
+def test_resource_usage_covers_the_process_tree():
+    """CPU, peak RSS and I/O of a grandchild process are attributed to the command."""
+    child = "x = bytearray(96 * 2**20); x[::4096] = b'1' * len(x[::4096]); print(len(x))"
+    run = diagnose.stream_command(f'{sys.executable} -c "{child}" && true', io.BytesIO())
+
+    usage = run.usage
+    assert run.exit_code == 0 and usage.term_signal is None
+    assert usage.max_rss_kb > 96 * 1024
+    assert usage.user_s + usage.sys_s > 0
+    assert usage.write_chars is None or usage.write_chars >= len("100663296\n")
+
+    killed = diagnose.stream_command("kill -9 $$", io.BytesIO())
+    assert killed.exit_code == -9 and killed.usage.term_signal == "SIGKILL"
+
+
+def test_profile_and_resources_are_stored_in_the_case(tmp_path):
+    """--profile samples the Python target; usage and stacks land next to the failure."""
+    (tmp_path / "slow.py").write_text(
+        "import time\n"
+        "def spin_for_profile():\n"
+        "    end = time.monotonic() + 0.4\n"
+        "    while time.monotonic() < end:\n"
+        "        pass\n"
+        "spin_for_profile()\n"
+        "raise SystemExit('RuntimeError: slow path')\n",
+        encoding="utf-8",
+    )
+    out = subprocess.run(
+        [sys.executable, str(SCRIPTS / "diagnose.py"), "--profile", "--cmd"]
+        + [f"{sys.executable} slow.py"],
+        capture_output=True,
+        text=True,
+        cwd=tmp_path,
+    )
+
+    assert out.returncode == 0, out.stderr
+    assert "[diagnose] usage:   wall" in out.stdout
+    (case,) = (tmp_path / ".ops/error_kb/cases").iterdir()
+    (record,) = json.loads((case / "resources.json").read_text())
+    assert record["exit_code"] == 1 and record["profile"] == "profile.collapsed"
+    assert record["usage"]["wall_s"] >= 0.4 and record["usage"]["user_s"] > 0
+    stacks = (case / "profile.collapsed").read_text().splitlines()
+    spinning = [line for line in stacks if "slow.py:spin_for_profile" in line]
+    assert spinning and all(line.startswith("slow.py;") for line in stacks)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in spinning) >= 10
+    (logged,) = (tmp_path / ".ops/logs").glob("*__resources.json")
+    assert json.loads(logged.read_text()) == record
+
+
+def test_concurrent_resource_saves_lose_nothing(tmp_path):
+    """Parallel diagnose runs appending to one case keep every resource record."""
+    case_dir = tmp_path / "kb" / "cases" / "abc"
+    case_dir.mkdir(parents=True)
+    procs = [
+        multiprocessing.get_context("spawn").Process(
+            target=_save_resources_many, args=(str(case_dir), w, 10)
+        )
+        for w in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+
+    records = json.loads((case_dir / "resources.json").read_text())
+    assert sorted((r["worker"], r["i"]) for r in records) == [
+        (w, i) for w in range(4) for i in range(10)
+    ]
+    assert (tmp_path / "kb" / ".journal.lock").exists()
+
+
+def test_bisect_finds_first_bad_commit_and_caches_verdicts(tmp_path):
+    """Parallel bisection records the culprit in the KB; a rerun tests nothing."""
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "t",
+        "GIT_AUTHOR_EMAIL": "t@example.com",
+        "GIT_COMMITTER_NAME": "t",
+        "GIT_COMMITTER_EMAIL": "t@example.com",
+    }
+
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=tmp_path, env=env, check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    git("init", "-q")
+    for i in range(1, 31):
+        (tmp_path / "value").write_text("broken\n" if i >= 19 else "ok\n")
+        (tmp_path / "n").write_text(f"{i}\n")
+        git("add", "value", "n")
+        git("commit", "-qm", f"change {i}")
+    culprit = git("rev-parse", "HEAD~11")
+
+    cmd = 'test "$(cat value)" = ok || { echo "AssertionError: value is $(cat value)"; exit 1; }'
+
+    def bisect() -> subprocess.CompletedProcess[str]:
+        return subprocess.run(
+            [sys.executable, str(SCRIPTS / "diagnose.py"), "--cmd", cmd]
+            + ["--bisect", "HEAD~29..HEAD", "--jobs", "3"],
+            capture_output=True,
+            text=True,
+            cwd=tmp_path,
+            env=env,
+        )
+
+    out = bisect()
+    assert out.returncode == 0, out.stdout + out.stderr
+    assert f"first bad commit: {culprit[:7]} change 19" in out.stdout
+    (case,) = (tmp_path / ".ops/error_kb/cases").iterdir()
+    info = json.loads((case / "bisect.json").read_text())
+    assert info["first_bad"] == culprit and info["cached"] == 0
+    assert "AssertionError: value is broken" in next(
+        (tmp_path / ".ops/logs").glob("*__failure_output.txt")
+    ).read_text()
+    assert git("worktree", "list").count("\n") == 0  # checkouts were removed
+
+    out = bisect()
+    assert out.returncode == 0, out.stdout + out.stderr
+    assert ", 0 commit(s) tested, " in out.stdout
+    assert json.loads((case / "bisect.json").read_text())["tested"] == 0
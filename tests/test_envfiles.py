@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import os
+
+from app import envfiles
+from app.envfiles import load_layered_env, parse_env_file, parse_env_text
+from app.settings import Settings
+
+
+def test_parse_quoting_escapes_and_export(tmp_path):
+    """Quoting, escapes, export prefixes and comments should parse like a shell."""
+    env_file = tmp_path / ".env"
+    env_file.write_text(
+        "# comment\n"
+        "export PLAIN=value # trailing comment\n"
+        "HASH=a#b\n"
+        "SINGLE='literal ${PLAIN} \\n'\n"
+        'DOUBLE="line1\\nline2 \\"q\\" \\${PLAIN}"\n'
+        'MULTI="first\nsecond"\n'
+        "EMPTY=\n"
+        "not an assignment\n",
+        encoding="utf-8",
+    )
+
+    values = parse_env_file(env_file, environ={})
+
+    assert values == {
+        "PLAIN": "value",
+        "HASH": "a#b",
+        "SINGLE": "literal ${PLAIN} \\n",
+        "DOUBLE": 'line1\nline2 "q" ${PLAIN}',
+        "MULTI": "first\nsecond",
+        "EMPTY": "",
+    }
+
+
+def test_interpolation_prefers_real_env_then_earlier_values():
+    """${VAR} should resolve from the real env first, then earlier definitions."""
+    entries = parse_env_text(
+        "HOST=db.local\nURL=postgres://${HOST}:${PORT:-5432}/${DB}\nOVERRIDE=${USER_NAME}\n"
+    )
+    values: dict[str, str] = {}
+    envfiles._resolve(entries, values, {"USER_NAME": "from-env"})
+
+    assert values["URL"] == "postgres://db.local:5432/"
+    assert values["OVERRIDE"] == "from-env"
+
+
+def test_layer_precedence(tmp_path):
+    """.env < .env.<APP_ENV> < .env.local < real environment."""
+    (tmp_path / ".env").write_text("APP_ENV=staging\nA=base\nB=base\nC=base\nD=base\n")
+    (tmp_path / ".env.staging").write_text("B=staging\nC=staging\nD=staging\n")
+    (tmp_path / ".env.local").write_text("C=local\nD=local\n")
+
+    env = load_layered_env(tmp_path, environ={"D": "real"})
+
+    assert [env["A"], env["B"], env["C"], env["D"]] == ["base", "staging", "local", "real"]
+
+
+def test_parsed_files_cached_by_mtime(tmp_path, monkeypatch):
+    """Unchanged files should not be re-parsed; modified files should."""
+    env_file = tmp_path / ".env"
+    env_file.write_text("A=1\n")
+    calls = []
+    real_parse = envfiles.parse_env_text
+    monkeypatch.setattr(envfiles, "parse_env_text", lambda t: calls.append(t) or real_parse(t))
+
+    assert load_layered_env(tmp_path, environ={})["A"] == "1"
+    assert load_layered_env(tmp_path, environ={})["A"] == "1"
+    assert len(calls) == 1
+
+    env_file.write_text("A=22\n")
+    os.utime(env_file, ns=(0, 10**9))
+    assert load_layered_env(tmp_path, environ={})["A"] == "22"
+    assert len(calls) == 2
+
+
+def test_settings_load_reads_dotenv(tmp_path, monkeypatch):
+    """Settings.load() should see .env values, with the real env taking precedence."""
+    (tmp_path / ".env").write_text("POSTGRES_HOST=from-file\nPOSTGRES_PORT=6543\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("POSTGRES_PORT", "5432")
+
+    s = Settings.load()
+
+    assert s.postgres_host == "from-file"
+    assert s.postgres_port == 5432
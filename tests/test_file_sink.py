@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+
+from app.file_sink import BufferedRotatingFileHandler, find_segments, index_path_for
+
+
+def _record(msg: str, created: float) -> logging.LogRecord:
+    record = logging.LogRecord(
+        name="app.file",
+        level=logging.INFO,
+        pathname="test.py",
+        lineno=1,
+        msg=msg,
+        args=(),
+        exc_info=None,
+    )
+    record.created = created
+    return record
+
+
+def test_writes_are_buffered_until_threshold(tmp_path):
+    """Records should stay in memory until the buffer threshold or a flush."""
+    path = tmp_path / "app.log"
+    handler = BufferedRotatingFileHandler(path, buffer_bytes=1024, flush_interval=3600)
+    try:
+        handler.handle(_record("first", 1000.0))
+        assert path.read_bytes() == b""
+
+        handler.flush()
+        assert path.read_text() == "first\n"
+    finally:
+        handler.close()
+
+
+def test_size_rotation_compresses_and_indexes(tmp_path):
+    """Rotated segments should be gzip-compressed and listed in the index."""
+    path = tmp_path / "app.log"
+    handler = BufferedRotatingFileHandler(path, max_bytes=100, buffer_bytes=10)
+    for i in range(30):
+        handler.handle(_record(f"record number {i:03d}", 1000.0 + i))
+    handler.close()
+
+    entries = [json.loads(line) for line in index_path_for(path).read_text().splitlines()]
+    assert entries and all(e["segment"].endswith(".gz") for e in entries)
+    assert not list(tmp_path.glob("app.log.*[0-9]"))  # no uncompressed leftovers
+
+    rotated = b"".join(gzip.decompress((tmp_path / e["segment"]).read_bytes()) for e in entries)
+    all_lines = rotated.decode().splitlines() + path.read_text().splitlines()
+    assert all_lines == [f"record number {i:03d}" for i in range(30)]
+    assert sum(e["records"] for e in entries) == 30 - len(path.read_text().splitlines())
+
+
+def test_time_rotation_and_segment_lookup(tmp_path):
+    """Time-based rotation should let find_segments pick segments by window."""
+    path = tmp_path / "app.log"
+    handler = BufferedRotatingFileHandler(path, max_bytes=0, rotate_seconds=60)
+    for t in (0, 10, 70, 80, 130):
+        handler.handle(_record(f"t={t}", 1000.0 + t))
+    handler.close()
+
+    segments = find_segments(path, 1065.0, 1085.0)
+    assert len(segments) == 1
+    assert gzip.decompress(segments[0].read_bytes()).decode() == "t=70\nt=80\n"
+    assert len(find_segments(path, 0.0, 2000.0)) == 2
+
+
+def test_restarted_handler_never_overwrites_segments(tmp_path):
+    """Restarts rotating within one second get fresh names; reopened data keeps its start."""
+    path = tmp_path / "app.log"
+    for msg in ("first", "second"):
+        handler = BufferedRotatingFileHandler(path, max_bytes=0)
+        handler.handle(_record(msg, 1000.0))
+        handler.rotate()
+        handler.close()
+
+    handler = BufferedRotatingFileHandler(path, max_bytes=0)
+    handler.handle(_record("old", 1400.0))
+    handler.close()
+    os.utime(path, (1500.0, 1500.0))
+    handler = BufferedRotatingFileHandler(path, max_bytes=0)
+    handler.handle(_record("new", 2000.0))
+    handler.rotate()
+    handler.close()
+
+    entries = [json.loads(line) for line in index_path_for(path).read_text().splitlines()]
+    assert len({e["segment"] for e in entries}) == 3
+    contents = [gzip.decompress((tmp_path / e["segment"]).read_bytes()) for e in entries]
+    assert contents == [b"first\n", b"second\n", b"old\nnew\n"]
+    assert (entries[2]["start"], entries[2]["end"]) == (1500.0, 2000.0)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+sys.path.insert(0, str(SCRIPTS))
+
+import fingerprint_env  # noqa: E402
+
+
+def _tool(bin_dir: Path, name: str, version: str, delay: float = 0.0) -> Path:
+    """A fake CLI tool that logs each invocation and prints ``version``."""
+    path = bin_dir / name
+    path.write_text(
+        f"#!/bin/sh\necho run >> {bin_dir / (name + '.calls')}\nsleep {delay}\necho {version}\n"
+    )
+    path.chmod(0o755)
+    return path
+
+
+def _calls(bin_dir: Path, name: str) -> int:
+    calls = bin_dir / f"{name}.calls"
+    return len(calls.read_text().splitlines()) if calls.exists() else 0
+
+
+def test_probes_run_concurrently_and_are_cached(tmp_path, monkeypatch):
+    """Slow probes overlap; unchanged tools are not re-run; a rebuilt one is."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    alpha = _tool(bin_dir, "alpha", "alpha 1.0", delay=0.5)
+    _tool(bin_dir, "beta", "beta 2.0", delay=0.5)
+    probes = (
+        fingerprint_env.Probe("alpha", ("alpha", "--version")),
+        fingerprint_env.Probe("beta", ("beta", "--version")),
+        fingerprint_env.Probe("gamma", ("no-such-tool-here", "--version")),
+    )
+    cache = tmp_path / "cache.json"
+
+    start = time.monotonic()
+    first = fingerprint_env.probe_tools(probes, cache_path=cache)
+    assert time.monotonic() - start < 0.9
+    assert first == {"alpha": "alpha 1.0", "beta": "beta 2.0", "gamma": "n/a"}
+
+    assert fingerprint_env.probe_tools(probes, cache_path=cache) == first
+    assert (_calls(bin_dir, "alpha"), _calls(bin_dir, "beta")) == (1, 1)
+
+    _tool(bin_dir, "alpha", "alpha 1.1")
+    os.utime(alpha, ns=(alpha.stat().st_atime_ns, alpha.stat().st_mtime_ns + 10**9))
+    assert fingerprint_env.probe_tools(probes, cache_path=cache)["alpha"] == "alpha 1.1"
+    assert (_calls(bin_dir, "alpha"), _calls(bin_dir, "beta")) == (2, 1)
+
+    monkeypatch.setenv("PATH", f"{os.environ['PATH']}{os.pathsep}{tmp_path}")
+    fingerprint_env.probe_tools(probes, cache_path=cache)
+    assert (_calls(bin_dir, "alpha"), _calls(bin_dir, "beta")) == (3, 2)
+
+
+def test_probe_timeout_is_reported_and_not_cached(tmp_path, monkeypatch):
+    """A hung tool costs at most the timeout and is retried next time."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    _tool(bin_dir, "hang", "hang 1.0", delay=5)
+    probes = (fingerprint_env.Probe("hang", ("hang",)),)
+    cache = tmp_path / "cache.json"
+
+    start = time.monotonic()
+    out = fingerprint_env.probe_tools(probes, timeout=0.3, cache_path=cache)
+    assert time.monotonic() - start < 3
+    assert out == {"hang": "n/a (timed out after 0.3s)"}
+    assert not cache.exists() or json.loads(cache.read_text()) == {}
+
+
+def test_json_output_and_diff(tmp_path):
+    """--json keeps the text field order; --diff compares text and JSON fingerprints."""
+    script = str(SCRIPTS / "fingerprint_env.py")
+    out = subprocess.run(
+        [sys.executable, script, "--json"], capture_output=True, text=True, cwd=tmp_path
+    )
+    assert out.returncode == 0, out.stderr
+    data = json.loads(out.stdout)
+    assert list(data) == ["python_version", "platform"] + [p.name for p in fingerprint_env.PROBES]
+    assert (tmp_path / ".ops/logs/fingerprint_cache.json").exists()
+
+    old = tmp_path / "old.txt"
+    old.write_text(fingerprint_env.to_text({**data, "git": "git version 2.30.0"}))
+    new = tmp_path / "new.json"
+    new.write_text(out.stdout)
+    diff = subprocess.run(
+        [sys.executable, script, "--diff", str(old), str(new)], capture_output=True, text=True
+    )
+    assert diff.returncode == 1
+    assert diff.stdout == f"git: git version 2.30.0 -> {data['git']}\n"
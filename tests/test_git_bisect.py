@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+sys.path.insert(0, str(SCRIPTS))
+
+import git_bisect  # noqa: E402
+
+COMMITS = [f"c{i:02d}" for i in range(1, 41)]
+
+
+def _tester(first_bad: int, skip: frozenset[int] = frozenset(), batches: list | None = None):
+    def test(shas: list[str]) -> dict[str, str]:
+        if batches is not None:
+            batches.append(list(shas))
+        out = {}
+        for sha in shas:
+            i = 0 if sha == "c00" else int(sha[1:])
+            out[sha] = "skip" if i in skip else "bad" if i >= first_bad else "good"
+        return out
+
+    return test
+
+
+@pytest.mark.parametrize("k", [1, 2, 4, 8])
+def test_kary_bisect_finds_every_culprit_in_log_k_rounds(k):
+    """Each round shrinks the range by about k + 1, and never runs more than k at once."""
+    for first_bad in range(1, len(COMMITS) + 1):
+        batches: list[list[str]] = []
+        test = _tester(first_bad, batches=batches)
+        found, rounds, _ = git_bisect.kary_bisect("c00", COMMITS, test, k)
+        assert found == f"c{first_bad:02d}"
+        assert rounds <= math.ceil(math.log(len(COMMITS), k + 1)) + 2
+        assert all(len(batch) <= max(k, 3) for batch in batches)
+
+
+def test_kary_bisect_steps_over_skipped_commits():
+    """Untestable commits are dropped; ones right before the culprit are reported."""
+    skip = frozenset({18, 19, 25})
+    found, _, skipped = git_bisect.kary_bisect("c00", COMMITS, _tester(20, skip), 3)
+    assert found == "c20"
+    assert git_bisect.ambiguous_before(found, COMMITS, skipped) == ["c18", "c19"]
+
+
+def test_kary_bisect_checks_the_endpoints():
+    """A GOOD commit that fails (or a BAD one that passes) aborts the search."""
+    with pytest.raises(git_bisect.BisectError, match="BAD commit"):
+        git_bisect.kary_bisect("c00", COMMITS, _tester(99), 4)
+    with pytest.raises(git_bisect.BisectError, match="GOOD commit"):
+        git_bisect.kary_bisect("c00", COMMITS, _tester(0), 4)
+
+
+def test_cache_persists_only_what_it_is_told_to(tmp_path):
+    """Persisted verdicts survive a reload; persist=False entries only last for the run."""
+    cache = git_bisect.BisectCache(tmp_path, "pytest -q")
+    for sha in ("aaa", "bbb"):
+        cache.output(sha).parent.mkdir(parents=True, exist_ok=True)
+        cache.output(sha).write_text("output\n")
+    cache.put("aaa", {"verdict": git_bisect.BAD, "exit_code": 1})
+    cache.put("bbb", {"verdict": git_bisect.BAD, "exit_code": 124}, persist=False)
+    assert cache.get("bbb") is not None
+
+    reloaded = git_bisect.BisectCache(tmp_path, "pytest -q")
+    assert reloaded.get("aaa") is not None and reloaded.get("bbb") is None
+    assert git_bisect.BisectCache(tmp_path, "pytest -x").get("aaa") is None
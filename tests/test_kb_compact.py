@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import sys
+from pathlib import Path
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+sys.path.insert(0, str(SCRIPTS))
+
+import kb_compact  # noqa: E402
+import kb_ingest  # noqa: E402
+import kb_pack  # noqa: E402
+import kb_search  # noqa: E402
+import kb_store  # noqa: E402
+
+BASE = "".join(f"step {i}: loading module part_{i} from cache\n" for i in range(60))
+BASE += "ConnectionError: reset by peer\n"
+OTHER = "".join(f"compiling crate dep_{i} v0.{i}.0\n" for i in range(40)) + "error: linker failed\n"
+
+
+def _record(kb: Path, text: str, seen_at: str, times: int = 1, name: str | None = None) -> str:
+    """Record ``text`` like record_failure does; ``name`` fakes a legacy (loose, log-less) case."""
+    digest = kb_ingest.digest_stream(io.BytesIO(text.encode()), kb / ".staging")
+    sig = name or digest.sig
+    if name:
+        digest.staged_log = None
+    kb_ingest.write_case(kb / "cases" / sig, digest)
+    with kb_store.KBStore(kb) as store:
+        for _ in range(times):
+            store.record(sig, kb / "cases" / sig, seen_at=seen_at)
+    return sig
+
+
+def test_pack_reads_members_without_unpacking(tmp_path):
+    """Packed files read back byte-for-byte; a loose copy wins; unpack restores the dir."""
+    case = tmp_path / "cases" / "abc"
+    case.mkdir(parents=True)
+    (case / "symptoms.md").write_text("# Symptoms\n\nboom\n", encoding="utf-8")
+    log = gzip.compress(b"line\n" * 1000)
+    (case / "failure.log.gz").write_bytes(log)
+
+    writer = kb_pack.PackWriter(tmp_path / kb_pack.PACK_NAME)
+    writer.add_dir("abc", case)
+    writer.close()
+    for path in case.iterdir():
+        path.unlink()
+    case.rmdir()
+
+    with kb_pack.CaseFiles(tmp_path) as cases:
+        assert cases.sigs() == ["abc"] and cases.is_packed("abc")
+        assert cases.read_text("abc", "symptoms.md") == "# Symptoms\n\nboom\n"
+        with cases.open("abc", "failure.log.gz") as f:
+            f.seek(10)
+            assert f.read(5) == log[10:15]
+        with gzip.open(cases.open("abc", "failure.log.gz")) as f:
+            assert f.read() == b"line\n" * 1000
+        assert cases.unpack("abc")
+        assert not cases.is_packed("abc")
+        assert (case / "failure.log.gz").read_bytes() == log
+
+
+def test_compact_merges_duplicates_packs_cold_cases_and_rebuilds(tmp_path):
+    """Duplicates fold into the busiest case with their notes; cold cases stay searchable."""
+    kb = tmp_path / "kb"
+    main = _record(kb, BASE, "2026-01-02T00:00:00.000000Z", times=3)
+    legacy = _record(kb, BASE, "2026-01-01T00:00:00.000000Z", name="legacy0000000000")
+    (kb / "cases" / legacy / "fix.md").write_text("# Fix\n\nClear the cache.\n")
+    near = _record(kb, BASE.replace("step 7:", "step 7 (retry):"), "2026-01-03T00:00:00.000000Z")
+    cold = _record(kb, OTHER, "2020-01-01T00:00:00.000000Z")
+    (kb / "cases" / near / "resources.json").write_text('[{"captured_at": "x"}]\n')
+
+    plan = kb_compact.compact(kb, threshold=0.8, cold_days=90, dry_run=True, jobs=2)
+    assert sorted((s, d) for s, d, _ in plan.merges) == sorted([(legacy, main), (near, main)])
+    assert plan.pack == [cold] and (kb / "cases" / legacy).is_dir()
+
+    kb_compact.compact(kb, threshold=0.8, cold_days=90, jobs=2)
+
+    assert sorted(p.name for p in (kb / "cases").iterdir()) == [main]
+    assert "Clear the cache." in (kb / "cases" / main / "fix.md").read_text()
+    assert json.loads((kb / "cases" / main / "resources.json").read_text()) == [
+        {"captured_at": "x"}
+    ]
+    with kb_store.KBStore(kb) as store:
+        stats = store.get(main)
+        assert stats is not None and stats.count == 5
+        assert stats.first_seen == "2026-01-01T00:00:00.000000Z"
+        assert store.resolve(legacy) == main and store.get(legacy) is None
+    with kb_pack.CaseFiles(kb) as cases:
+        assert cases.is_packed(cold)
+        assert "linker failed" in cases.read_text(cold, "symptoms.md")
+    with kb_search.KBSearchIndex(kb) as search:
+        search.update()
+        assert [hit.sig for hit in search.search("linker failed")] == [cold]
+
+    # A later occurrence under a merged signature counts against the target.
+    with kb_store.KBStore(kb) as store:
+        assert store.record(legacy, kb / "cases" / legacy).count == 6
+
+
+def test_compact_keeps_cases_that_recur_while_it_plans(tmp_path, monkeypatch):
+    """A cold case recorded between planning and packing stays a loose, unpacked case."""
+    kb = tmp_path / "kb"
+    _record(kb, BASE, "2026-01-02T00:00:00.000000Z")
+    cold = _record(kb, OTHER, "2020-01-01T00:00:00.000000Z")
+    plan_merges = kb_compact.plan_merges
+
+    def plan_then_record(*args, **kwargs):
+        # A ``make diagnose`` landing after the cold scan, before the write phase.
+        _record(kb, OTHER, "2099-01-01T00:00:00.000000Z")
+        return plan_merges(*args, **kwargs)
+
+    monkeypatch.setattr(kb_compact, "plan_merges", plan_then_record)
+    kb_compact.compact(kb, threshold=0.8, cold_days=90, jobs=1)
+
+    assert (kb / "cases" / cold / "symptoms.md").is_file()
+    with kb_pack.CaseFiles(kb) as cases:
+        assert not cases.is_packed(cold)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+sys.path.insert(0, str(SCRIPTS))
+
+import kb_frames  # noqa: E402
+
+SETTINGS_FAILURE = """\
+12:00:01 [ci] Traceback (most recent call last):
+12:00:01 [ci]   File "/home/ci/repo/src/app/main.py", line 8, in <module>
+12:00:01 [ci]     settings = Settings.load()
+12:00:01 [ci]   File "/home/ci/repo/src/app/settings.py", line 40, in _require_env
+12:00:01 [ci]     raise KeyError(name)
+12:00:01 [ci] KeyError: 'DATABASE_URL'
+12:00:02 [ci] exit 1
+"""
+
+NODE_FAILURE = """\
+TypeError: Cannot read properties of undefined (reading 'id')
+    at renderUser (/app/web/src/user.js:14:22)
+    at /app/web/src/index.js:3:1
+npm ERR! code 1
+"""
+
+
+def test_parsers_extract_python_and_node_frames():
+    """Both built-in parsers produce frames with file, function, line and exception type."""
+    traces = kb_frames.extract_traces((SETTINGS_FAILURE + NODE_FAILURE).splitlines())
+    by_parser = {t.parser: t for t in traces}
+
+    py = by_parser["python"]
+    assert py.exception == "KeyError" and py.message == "'DATABASE_URL'"
+    assert py.frames[-1] == kb_frames.Frame(
+        "/home/ci/repo/src/app/settings.py", "_require_env", 40
+    )
+    node = by_parser["node"]
+    assert node.exception == "TypeError"
+    assert [f.function for f in node.frames] == ["renderUser", "<anonymous>"]
+    assert node.frames[1] == kb_frames.Frame("/app/web/src/index.js", "<anonymous>", 3)
+
+
+def test_pytest_reports_are_parsed_in_every_traceback_style(tmp_path):
+    """Real pytest output in auto, long and short styles yields the same frames."""
+    (tmp_path / "test_env.py").write_text(
+        "import os\n"
+        "def _require_env(name):\n"
+        "    return os.environ[name]\n"
+        "class Loader:\n"
+        "    def load(self):\n"
+        "        return _require_env('KB_FRAMES_UNSET')\n"
+        "def test_settings():\n"
+        "    Loader().load()\n"
+        "def test_assert():\n"
+        "    x = 1\n"
+        "    assert x == 2\n",
+        encoding="utf-8",
+    )
+    for style in ("auto", "long", "short"):
+        out = subprocess.run(
+            [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", f"--tb={style}"]
+            + ["test_env.py"],
+            capture_output=True,
+            text=True,
+            cwd=tmp_path,
+        )
+        settings, assertion = kb_frames.extract_traces(out.stdout.splitlines())
+
+        assert (settings.parser, settings.exception) == ("pytest", "KeyError")
+        assert settings.message == "'KB_FRAMES_UNSET'"
+        assert [(f.file, f.function, f.line) for f in settings.frames[:3]] == [
+            ("test_env.py", "test_settings", 8),
+            ("test_env.py", "load", 6),
+            ("test_env.py", "_require_env", 3),
+        ], style
+        assert assertion.exception == "AssertionError"
+        assert assertion.frames == (kb_frames.Frame("test_env.py", "test_assert", 11),)
+
+
+def test_parsers_are_pluggable():
+    """A registered parser runs alongside the built-ins."""
+
+    @kb_frames.register_parser
+    class GoPanicParser:
+        name = "go-test"
+
+        def feed(self, line):
+            if line.startswith("panic: "):
+                frame = kb_frames.Frame("main.go", "main.main", None)
+                return kb_frames.Trace(self.name, "panic", line[7:], (frame,))
+            return None
+
+        def close(self):
+            return None
+
+    try:
+        traces = kb_frames.extract_traces(["panic: runtime error"])
+    finally:
+        del kb_frames.PARSERS["go-test"]
+    assert [t.exception for t in traces] == ["panic"]
+
+
+def test_frame_index_queries_by_file_suffix_function_and_exception(tmp_path):
+    """Queries match path suffixes on directory boundaries, functions and exception names."""
+    traces = kb_frames.extract_traces(SETTINGS_FAILURE.splitlines())
+    other = kb_frames.extract_traces(NODE_FAILURE.splitlines())
+    with kb_frames.FrameIndex(tmp_path) as index:
+        index.replace_many([("settings", traces), ("web", other)])
+        index.replace("settings", traces)  # re-recording replaces, never duplicates
+
+        hits = index.query(file="app/settings.py", function="_require_env")
+        assert [(h.sig, h.exception, h.line) for h in hits] == [("settings", "KeyError", 40)]
+        assert index.query(file="settings.py") and not index.query(file="p/settings.py")
+        assert {h.sig for h in index.query(exception="TypeError")} == {"web"}
+        assert index.query(exception="builtins.KeyError") == []
+
+
+def test_rebuild_reindexes_cases_in_parallel(tmp_path):
+    """The rebuild command re-parses every case's stored log into the index."""
+    for sig, text in [("aaa", SETTINGS_FAILURE), ("bbb", NODE_FAILURE)]:
+        case = tmp_path / ".ops/error_kb/cases" / sig
+        case.mkdir(parents=True)
+        (case / "symptoms.md").write_text(f"# Symptoms\n\n```\n{text}```\n", encoding="utf-8")
+
+    def run(*args: str) -> subprocess.CompletedProcess[str]:
+        return subprocess.run(
+            [sys.executable, str(SCRIPTS / "kb_frames.py"), *args],
+            capture_output=True,
+            text=True,
+            cwd=tmp_path,
+        )
+
+    out = run("rebuild", "--jobs", "2")
+    assert out.returncode == 0, out.stderr
+    assert "from 2 case(s)" in out.stdout
+
+    out = run("query", "--module", "app.settings", "--exception", "KeyError")
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.startswith("aaa  KeyError")
+    assert "settings.py:40 in _require_env" in out.stdout
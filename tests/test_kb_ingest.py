@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import subprocess
+import sys
+import tarfile
+import zipfile
+from pathlib import Path
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+sys.path.insert(0, str(SCRIPTS))
+
+import kb_import  # noqa: E402
+import kb_ingest  # noqa: E402
+import kb_similarity  # noqa: E402
+import kb_store  # noqa: E402
+
+TRACEBACK = """\
+2024-05-01T12:00:01Z [step 3] Traceback (most recent call last):
+2024-05-01T12:00:01Z [step 3]   File "src/app/job.py", line 12, in run
+2024-05-01T12:00:01Z [step 3]     fetch()
+2024-05-01T12:00:01Z [step 3] TimeoutError: upstream did not answer
+"""
+
+
+def _signature(text: str) -> str:
+    norm = kb_similarity.normalize_text(text)
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest()[:16]
+
+
+def _big_log(lines: int) -> str:
+    body = "".join(f"2024-05-01T12:00:{i % 60:02d}Z progress {i}\n" for i in range(lines))
+    return body + TRACEBACK + "".join(f"teardown {i}\n" for i in range(lines))
+
+
+def test_streaming_digest_matches_whole_text_signature():
+    """Signature and sketch from the streaming pass equal those of the whole text."""
+    text = "first\r\n\n  second line  \r\nthird\x0cfourth\n" + TRACEBACK
+    digest = kb_ingest.digest_stream(io.BytesIO(text.encode("utf-8")))
+
+    assert digest.sig == _signature(text)
+    expected = kb_similarity.minhash(kb_similarity.normalize_text(text))
+    assert kb_similarity.similarity(digest.sketch, expected) == 1.0
+    assert not digest.truncated
+
+
+def test_long_lines_are_split_without_losing_characters(monkeypatch):
+    """Lines hash whole up to MAX_LINE_BYTES; longer ones split without losing characters."""
+    long_line = "é" * 100_000  # 200 KB, well past the old 64 KiB read size
+    text = f"{long_line}\n{TRACEBACK}"
+    assert kb_ingest.digest_stream(io.BytesIO(text.encode("utf-8"))).sig == _signature(text)
+
+    monkeypatch.setattr(kb_ingest, "MAX_LINE_BYTES", 1001)  # odd: every cut splits an "é"
+    digest = kb_ingest.digest_stream(io.BytesIO(text.encode("utf-8")))
+    pieces = digest.head[: digest.lines - TRACEBACK.count("\n")]
+    assert "".join(pieces) == long_line
+    assert digest.sig != _signature(text)
+
+
+def test_large_log_keeps_head_tail_tracebacks_and_compressed_copy(tmp_path):
+    """Long logs get head, tail and tracebacks in symptoms.md plus the full log compressed."""
+    text = _big_log(1000)
+    log = tmp_path / "ci.log"
+    log.write_text(text, encoding="utf-8")
+
+    digest = kb_ingest.digest_file(log, tmp_path / "staging")
+    assert digest.truncated and digest.lines == text.count("\n")
+    assert digest.tracebacks[0].startswith("Traceback (most recent call last):")
+    assert digest.tracebacks[0].endswith("TimeoutError: upstream did not answer")
+    assert [t.exception for t in digest.traces] == ["TimeoutError"]
+
+    case_dir = tmp_path / "cases" / digest.sig
+    assert kb_ingest.write_case(case_dir, digest)
+    symptoms = (case_dir / "symptoms.md").read_text(encoding="utf-8")
+    assert "progress 0\n" in symptoms and "teardown 999\n" in symptoms
+    assert "progress 500\n" not in symptoms
+    assert '  File "src/app/job.py", line 12, in run' in symptoms
+    with gzip.open(case_dir / "failure.log.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == text
+    assert not any((tmp_path / "staging").iterdir())
+
+
+def test_record_failure_memory_is_bounded_by_log_size(tmp_path):
+    """Peak RSS barely grows when the log grows sixfold."""
+    chunk = ("2024-05-01T12:00:01Z step ok " + "x" * 2000 + "\n") * 2000  # ~4 MB
+
+    def peak_rss_kb(copies: int) -> int:
+        log = tmp_path / f"log_{copies}.txt"
+        with open(log, "w", encoding="utf-8") as f:
+            for _ in range(copies):
+                f.write(chunk)
+            f.write(TRACEBACK)
+        probe = (
+            "import resource, subprocess, sys\n"
+            "subprocess.run([sys.executable, *sys.argv[1:]], check=True,"
+            " stdout=subprocess.DEVNULL)\n"
+            "print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)\n"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", probe, str(SCRIPTS / "record_failure.py"), str(log)],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=tmp_path,
+        )
+        return int(out.stdout.strip())
+
+    small, large = peak_rss_kb(1), peak_rss_kb(6)  # ~4 MB vs ~24 MB log
+    assert large - small < 8 * 1024
+
+
+def test_bulk_import_dedupes_across_dirs_and_archives(tmp_path):
+    """Dirs, zips and tars are imported; identical failures share one case."""
+    logs = tmp_path / "logs"
+    (logs / "nightly").mkdir(parents=True)
+    (logs / "a.log").write_text(TRACEBACK, encoding="utf-8")
+    (logs / "nightly" / "b.log").write_text(TRACEBACK.replace("01Z", "59Z"), encoding="utf-8")
+    (logs / "c.log").write_text("ImportError: no module named app\n", encoding="utf-8")
+
+    with zipfile.ZipFile(tmp_path / "more.zip", "w") as zf:
+        zf.writestr("d.log", "PermissionError: /var/run/app.sock\n")
+    with tarfile.open(tmp_path / "more.tar.gz", "w:gz") as tar:
+        tar.add(logs / "c.log", arcname="e.log")
+
+    summary = kb_import.import_logs(
+        [str(logs), str(tmp_path / "*.zip"), str(tmp_path / "more.tar.gz")],
+        kb_dir=tmp_path / "kb",
+        jobs=2,
+    )
+
+    assert (summary.files, summary.cases, summary.new_cases) == (5, 3, 3)
+    with kb_store.KBStore(tmp_path / "kb") as store:
+        counts = {c.sig: c.count for c in store.cases()}
+    assert counts[_signature(TRACEBACK)] == 2
+    assert counts[_signature("ImportError: no module named app\n")] == 2
+    with kb_similarity.SimilarityIndex(tmp_path / "kb" / "kb_index.sqlite3") as index:
+        assert len(index) == 3
+    for sig in counts:
+        assert (tmp_path / "kb" / "cases" / sig / "failure.log.gz").exists()
+    assert list((tmp_path / "kb" / ".staging").iterdir()) == []
+
+
+def test_bulk_import_skips_unreadable_logs(tmp_path):
+    """A zip member with a bad CRC is reported and skipped; nothing is left staged."""
+    with zipfile.ZipFile(tmp_path / "logs.zip", "w") as zf:
+        zf.writestr("good.log", TRACEBACK)
+        zf.writestr("bad.log", "RuntimeError: corrupted in transit\n")
+    data = (tmp_path / "logs.zip").read_bytes()
+    pos = data.index(b"corrupted")
+    (tmp_path / "logs.zip").write_bytes(data[:pos] + b"C" + data[pos + 1 :])
+
+    summary = kb_import.import_logs([str(tmp_path / "logs.zip")], kb_dir=tmp_path / "kb", jobs=2)
+
+    assert (summary.files, summary.cases) == (1, 1)
+    (failure,) = summary.failed
+    assert failure.startswith(f"{tmp_path / 'logs.zip'}:bad.log: BadZipFile")
+    assert list((tmp_path / "kb" / ".staging").iterdir()) == []
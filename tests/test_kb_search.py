@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+sys.path.insert(0, str(SCRIPTS))
+
+import kb_search  # noqa: E402
+
+
+def _case(kb_dir: Path, sig: str, symptoms: str, root_cause: str = "TBD") -> Path:
+    case = kb_dir / "cases" / sig
+    case.mkdir(parents=True, exist_ok=True)
+    (case / "symptoms.md").write_text(f"# Symptoms\n\n```\n{symptoms}\n```\n")
+    (case / "root_cause.md").write_text(f"# Root Cause\n\n{root_cause}\n")
+    (case / "fix.md").write_text("# Fix\n\nTBD\n")
+    return case
+
+
+def test_search_ranks_cases_and_highlights_snippets(tmp_path):
+    """Matches are ranked by BM25, one hit per case, with the terms highlighted."""
+    _case(tmp_path, "aaa", "ModuleNotFoundError: No module named 'app'", "src not on sys.path")
+    _case(tmp_path, "bbb", "psycopg.OperationalError: connection timeout expired")
+    _case(tmp_path, "ccc", "ModuleNotFoundError: No module named 'requests'")
+
+    with kb_search.KBSearchIndex(tmp_path) as index:
+        assert index.update() == (9, 0)
+        hits = index.search("ModuleNotFoundError app")
+        timeouts = index.search("timeouts")  # porter stemming
+        none = index.search("segfault")
+
+    assert [h.sig for h in hits] == ["aaa"]
+    assert "[ModuleNotFoundError]" in hits[0].snippet and "[app]" in hits[0].snippet
+    assert [h.sig for h in timeouts] == ["bbb"]
+    assert none == []
+
+
+def test_update_reindexes_only_changed_files(tmp_path):
+    """Unchanged files are skipped; edits and deletions are picked up."""
+    case = _case(tmp_path, "aaa", "KeyError: 'user_id'")
+    _case(tmp_path, "bbb", "TypeError: unsupported operand")
+
+    with kb_search.KBSearchIndex(tmp_path) as index:
+        index.update()
+        assert index.update() == (0, 0)
+
+        root_cause = case / "root_cause.md"
+        root_cause.write_text("# Root Cause\n\nStale session cache dropped user_id\n")
+        os.utime(root_cause, ns=(1, 1))
+        # Touched but identical content: stat refreshed, not reindexed.
+        os.utime(case / "fix.md", ns=(2, 2))
+        assert index.update() == (1, 0)
+        assert [h.kind for h in index.search("stale session")] == ["root_cause"]
+
+        for f in (tmp_path / "cases" / "bbb").iterdir():
+            f.unlink()
+        assert index.update() == (0, 3)
+        assert index.search("TypeError") == []
+
+
+def test_kb_search_cli(tmp_path):
+    """The CLI refreshes the index and prints ranked hits with timings."""
+    _case(tmp_path / ".ops/error_kb", "aaa", "ModuleNotFoundError: No module named 'app'")
+    result = subprocess.run(
+        [sys.executable, str(SCRIPTS / "kb_search.py"), "module app"],
+        capture_output=True,
+        text=True,
+        cwd=tmp_path,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "aaa  symptoms.md" in result.stdout
+    assert "1 case(s) in" in result.stdout
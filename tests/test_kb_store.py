@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+import sqlite3
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+sys.path.insert(0, str(SCRIPTS))
+
+import kb_store  # noqa: E402
+
+
+def _record_many(kb_dir: str, worker: int, n: int) -> None:
+    with kb_store.KBStore(kb_dir) as store:
+        for _ in range(n):
+            store.record("shared", "cases/shared", env_fingerprint=f"worker {worker}")
+
+
+def test_record_tracks_occurrences_and_fingerprints(tmp_path):
+    """Each record adds an occurrence; first/last seen and count are kept per case."""
+    with kb_store.KBStore(tmp_path) as store:
+        store.record(
+            "abc", "cases/abc", env_fingerprint="python 3.11", seen_at="2024-01-01T00:00:00Z"
+        )
+        store.record(
+            "abc", "cases/abc", env_fingerprint="python 3.12", seen_at="2024-02-01T00:00:00Z"
+        )
+        stats = store.record(
+            "abc", "cases/abc", env_fingerprint="python 3.12", seen_at="2024-03-01T00:00:00Z"
+        )
+        occurrences = store.occurrences("abc")
+
+    assert (stats.count, stats.first_seen, stats.last_seen) == (
+        3,
+        "2024-01-01T00:00:00Z",
+        "2024-03-01T00:00:00Z",
+    )
+    assert [o["env"] for o in occurrences] == ["python 3.11", "python 3.12", "python 3.12"]
+    events = [json.loads(line) for line in (tmp_path / "journal.jsonl").read_text().splitlines()]
+    assert [e["event"] for e in events].count("fingerprint") == 2
+
+
+def test_index_is_rebuilt_from_journal(tmp_path):
+    """Deleting the SQLite index loses nothing; a torn journal line is skipped."""
+    with kb_store.KBStore(tmp_path) as store:
+        store.record("abc", "cases/abc")
+        store.record("def", "cases/def")
+    for path in tmp_path.glob("kb_index.sqlite3*"):
+        path.unlink()
+    with (tmp_path / "journal.jsonl").open("a") as f:
+        f.write('{"event": "occurr')
+
+    with kb_store.KBStore(tmp_path) as store:
+        assert {c.sig for c in store.cases()} == {"abc", "def"}
+        assert store.record("abc", "cases/abc").count == 2
+        assert store.rebuild() == 2
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    """Records from several processes all land in the journal and the index."""
+    procs = [
+        multiprocessing.get_context("spawn").Process(
+            target=_record_many, args=(str(tmp_path), w, 20)
+        )
+        for w in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+
+    lines = (tmp_path / "journal.jsonl").read_text().splitlines()
+    assert sum(json.loads(line)["event"] == "occurrence" for line in lines) == 80
+    with kb_store.KBStore(tmp_path) as store:
+        shared = store.get("shared")
+    assert shared is not None and shared.count == 80
+    conn = sqlite3.connect(tmp_path / "kb_index.sqlite3")
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def test_legacy_json_index_is_migrated_once(tmp_path):
+    """error_index.json is imported into the journal on first open, then renamed."""
+    case_dir = tmp_path / "cases" / "abc"
+    case_dir.mkdir(parents=True)
+    (case_dir / "symptoms.md").write_text("# Symptoms\n\nCaptured: 2023-05-06T07:08:09Z\n")
+    legacy = tmp_path / "error_index.json"
+    legacy.write_text(json.dumps({"abc": {"cases": [str(case_dir)]}}))
+
+    with kb_store.KBStore(tmp_path) as store:
+        stats = store.get("abc")
+    with kb_store.KBStore(tmp_path) as store:
+        again = store.get("abc")
+
+    assert stats is not None and again is not None and again.count == 1
+    assert stats.first_seen == "2023-05-06T07:08:09Z"
+    assert not legacy.exists()
+    assert (tmp_path / "error_index.json.migrated").exists()
+
+
+def test_journal_lock_is_reentrant_and_excludes_other_threads_and_processes(tmp_path):
+    """Nested holds don't deadlock; other threads wait and other processes can't flock it."""
+    probe = (
+        "import fcntl, sys\n"
+        "with open(sys.argv[1], 'a') as f:\n"
+        "    try:\n"
+        "        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)\n"
+        "    except BlockingIOError:\n"
+        "        sys.exit(1)\n"
+    )
+    lock_file = str(tmp_path / ".journal.lock")
+    acquired = threading.Event()
+
+    def other_thread() -> None:
+        with kb_store.journal_lock(tmp_path):
+            acquired.set()
+
+    with kb_store.journal_lock(tmp_path), kb_store.KBStore(tmp_path) as store, store.locked():
+        store.record("abc", "cases/abc")
+        worker = threading.Thread(target=other_thread)
+        worker.start()
+        assert not acquired.wait(0.2)
+        if sys.platform != "win32":
+            assert subprocess.run([sys.executable, "-c", probe, lock_file]).returncode == 1
+    worker.join(5)
+    assert acquired.is_set()
+    if sys.platform != "win32":
+        assert subprocess.run([sys.executable, "-c", probe, lock_file]).returncode == 0
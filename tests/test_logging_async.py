@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+
+import pytest
+
+from app import logging_config
+from app.logging_config import BoundedQueueHandler, configure_logging, shutdown_logging
+
+
+def _record(level: int, msg: str) -> logging.LogRecord:
+    return logging.LogRecord(
+        name="test",
+        level=level,
+        pathname="test.py",
+        lineno=1,
+        msg=msg,
+        args=(),
+        exc_info=None,
+    )
+
+
+def _queued_messages(handler: BoundedQueueHandler) -> list[str]:
+    return [r.msg for r in handler.queue.queue]  # type: ignore[attr-defined]
+
+
+def test_drop_oldest_evicts_and_counts():
+    """drop-oldest should keep the newest records and count evictions."""
+    handler = BoundedQueueHandler(maxsize=2, overflow="drop-oldest")
+    for i in range(4):
+        handler.handle(_record(logging.INFO, f"m{i}"))
+
+    assert _queued_messages(handler) == ["m2", "m3"]
+    assert handler.dropped == 2
+    assert handler.queue.unfinished_tasks == 2  # type: ignore[attr-defined]
+
+
+def test_drop_debug_first_prefers_debug_records():
+    """drop-debug-first should sacrifice DEBUG records before anything else."""
+    handler = BoundedQueueHandler(maxsize=2, overflow="drop-debug-first")
+    handler.handle(_record(logging.DEBUG, "d0"))
+    handler.handle(_record(logging.INFO, "i0"))
+    handler.handle(_record(logging.DEBUG, "d1"))  # incoming DEBUG is dropped
+    handler.handle(_record(logging.WARNING, "w0"))  # evicts queued DEBUG
+
+    assert _queued_messages(handler) == ["i0", "w0"]
+    assert handler.dropped == 2
+    assert handler.queue.unfinished_tasks == 2  # type: ignore[attr-defined]
+
+
+def test_unknown_overflow_policy_rejected():
+    """An unknown overflow policy should fail loudly."""
+    with pytest.raises(ValueError, match="Unknown overflow policy"):
+        BoundedQueueHandler(overflow="explode")
+
+
+def test_async_logging_redacts_and_flushes_on_shutdown():
+    """Async mode should deliver every record, redacted, once shut down."""
+    os.environ["LOG_ASYNC"] = "1"
+    os.environ["HF_TOKEN"] = "async_secret_value"
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+    try:
+        configure_logging("INFO")
+        queue_handler = root.handlers[0]
+        assert isinstance(queue_handler, BoundedQueueHandler)
+        stream = io.StringIO()
+        assert logging_config._listener is not None
+        logging_config._listener.handlers[0].setStream(stream)  # type: ignore[attr-defined]
+
+        for i in range(100):
+            logging.getLogger("app.async").info("n=%d token=%s", i, "async_secret_value")
+        shutdown_logging()
+
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 100
+        assert "async_secret_value" not in stream.getvalue()
+        assert queue_handler not in root.handlers
+    finally:
+        shutdown_logging()
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        del os.environ["LOG_ASYNC"]
+        del os.environ["HF_TOKEN"]
+
+
+def test_configuring_twice_keeps_async_logging_on():
+    """A second configure_logging replaces its own pipeline instead of silently going sync."""
+    os.environ["LOG_ASYNC"] = "1"
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+    try:
+        configure_logging("INFO")
+        first = root.handlers[0]
+        configure_logging("INFO")
+
+        assert len(root.handlers) == 1
+        assert isinstance(root.handlers[0], BoundedQueueHandler)
+        assert root.handlers[0] is not first
+        assert logging_config._listener is not None
+
+        del os.environ["LOG_ASYNC"]
+        configure_logging("INFO")
+        assert len(root.handlers) == 1
+        assert not isinstance(root.handlers[0], BoundedQueueHandler)
+        assert logging_config._listener is None
+    finally:
+        shutdown_logging()
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        os.environ.pop("LOG_ASYNC", None)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import sys
+
+import pytest
+
+from app.logging_config import (
+    FastJsonFormatter,
+    JsonFormatter,
+    RedactingFilter,
+    SecretRedactor,
+    orjson,
+)
+
+
+def _record(msg: str, created: float, **extra: object) -> logging.LogRecord:
+    record = logging.LogRecord(
+        name="app.json",
+        level=logging.INFO,
+        pathname="test.py",
+        lineno=42,
+        msg=msg,
+        args=(),
+        exc_info=None,
+    )
+    record.created = created
+    record.msecs = int((created - int(created)) * 1000) + 0.0
+    record.__dict__.update(extra)
+    return record
+
+
+def test_fast_formatter_matches_json_formatter_bytes():
+    """Without extras, FastJsonFormatter output should be byte-identical."""
+    slow, fast = JsonFormatter(), FastJsonFormatter()
+    for i, msg in enumerate(['plain', 'quote " and \\ slash', "unicode é ✓", "new\nline"]):
+        created = 1_700_000_000 + i * 0.37
+        assert fast.format(_record(msg, created)) == slow.format(_record(msg, created))
+
+
+def test_fast_formatter_emits_extra_fields():
+    """extra= fields should be appended without clobbering the fixed keys."""
+    out = FastJsonFormatter().format(_record("hi", 1_700_000_000.5, user_id=7, level="spoof"))
+    data = json.loads(out)
+
+    assert data["user_id"] == 7
+    assert data["level"] == "INFO"
+    assert list(data)[:5] == ["timestamp", "level", "logger", "lineno", "message"]
+
+
+def test_fast_formatter_structures_exceptions():
+    """exc_info should be emitted as a structured exception object."""
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.getLogger("app.json").makeRecord(
+            "app.json", logging.ERROR, "test.py", 1, "failed", (), exc_info=sys.exc_info()
+        )
+
+    data = json.loads(FastJsonFormatter().format(record))
+
+    assert data["exception"]["type"] == "ValueError"
+    assert data["exception"]["message"] == "boom"
+    assert "Traceback" in data["exception"]["traceback"]
+
+
+def test_fast_formatter_output_is_redacted_beyond_the_message():
+    """Secrets in extra= fields, exceptions and stack_info are masked too."""
+    dsn = "postgresql://app:s3cret-pw@db:5432/app"
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(RedactingFilter(SecretRedactor(env={"POSTGRES_PASSWORD": "s3cret-pw"})))
+    handler.setFormatter(FastJsonFormatter())
+    logger = logging.getLogger("app.json.redact")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("connecting", extra={"dsn": dsn}, stack_info=True)
+        try:
+            raise ConnectionError(f"could not connect to {dsn}")
+        except ConnectionError:
+            logger.exception("failed")
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+
+    assert "s3cret-pw" not in stream.getvalue()
+    first, second = (json.loads(line) for line in stream.getvalue().splitlines())
+    assert first["dsn"] == "postgresql://app:[REDACTED]@db:5432/app"
+    assert "stack_info" in first
+    redacted_dsn = "postgresql://app:[REDACTED]@db:5432/app"
+    assert second["exception"]["message"] == f"could not connect to {redacted_dsn}"
+    assert "ConnectionError: could not connect" in second["exception"]["traceback"]
+
+
+@pytest.mark.skipif(orjson is None, reason="orjson not installed")
+def test_fast_formatter_orjson_same_fields():
+    """The orjson encoder should produce the same keys and values."""
+    record = _record("hi", 1_700_000_000.25, request_id="abc")
+    stdlib = json.loads(FastJsonFormatter().format(record))
+    fast = json.loads(FastJsonFormatter(encoder="orjson").format(record))
+
+    assert fast == stdlib
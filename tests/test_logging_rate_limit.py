@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import logging
+
+from app import logging_config
+from app.logging_config import RateLimitingFilter
+
+
+def _record(level: int = logging.INFO, lineno: int = 10) -> logging.LogRecord:
+    return logging.LogRecord(
+        name="app.loop",
+        level=level,
+        pathname="loop.py",
+        lineno=lineno,
+        msg="tick %d",
+        args=(1,),
+        exc_info=None,
+    )
+
+
+def test_sampling_keeps_one_in_n_debug_info():
+    """DEBUG/INFO records should be sampled 1-in-N per call site; WARNING is not."""
+    f = RateLimitingFilter(sample_every=5)
+
+    passed = sum(f.filter(_record()) for _ in range(100))
+    warnings = sum(f.filter(_record(logging.WARNING, lineno=11)) for _ in range(10))
+
+    assert passed == 20
+    assert warnings == 10
+
+
+def test_token_bucket_limits_per_call_site(monkeypatch):
+    """Each call site gets `burst` records, then `rate` per second."""
+    now = [1000.0]
+    monkeypatch.setattr(logging_config.time, "monotonic", lambda: now[0])
+    f = RateLimitingFilter(rate=2.0, burst=3.0, summary_interval=3600)
+
+    assert sum(f.filter(_record()) for _ in range(10)) == 3
+    assert f.filter(_record(lineno=99))  # other call site has its own bucket
+
+    now[0] += 1.0
+    assert sum(f.filter(_record()) for _ in range(10)) == 2
+
+
+def test_summary_reports_suppressed_counts(monkeypatch):
+    """A periodic summary record should report how many records were dropped."""
+    now = [1000.0]
+    monkeypatch.setattr(logging_config.time, "monotonic", lambda: now[0])
+    summaries: list[logging.LogRecord] = []
+    f = RateLimitingFilter(rate=1.0, burst=1.0, summary_interval=60, sink=summaries.append)
+
+    for _ in range(50):
+        f.filter(_record())
+    assert summaries == []
+
+    now[0] += 61
+    f.filter(_record())
+
+    assert len(summaries) == 1
+    assert summaries[0].getMessage().startswith("Suppressed 49 similar records from app.loop:10")
+    assert f.filter(summaries[0])
+    assert f.suppressed_total == 49
+
+
+def test_key_eviction_reports_what_was_suppressed(monkeypatch):
+    """Hitting max_keys summarises the forgotten keys' suppressed counts first."""
+    now = [1000.0]
+    monkeypatch.setattr(logging_config.time, "monotonic", lambda: now[0])
+    summaries: list[logging.LogRecord] = []
+    f = RateLimitingFilter(
+        rate=1.0, burst=1.0, summary_interval=3600, sink=summaries.append, max_keys=2
+    )
+
+    for _ in range(5):
+        f.filter(_record(lineno=1))
+    f.filter(_record(lineno=2))
+    assert summaries == []
+    f.filter(_record(lineno=3))  # third key: the table is cleared
+
+    assert len(summaries) == 1
+    assert summaries[0].getMessage().startswith("Suppressed 4 similar records from app.loop:1:")
+    assert f.suppressed_total == 4
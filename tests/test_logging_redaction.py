@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import io
 import logging
 import os
 
-from app.logging_config import RedactingFilter
+from app.logging_config import RedactingFilter, SecretRedactor, configure_logging
 
 
 def test_redaction_filter_redacts_secrets():
@@ -114,3 +115,87 @@ def test_redaction_no_false_positives():
     
     del os.environ["HF_TOKEN"]
 
+
+
+def test_redaction_longest_match_first():
+    """Overlapping secrets should be masked in full, not leave a suffix behind."""
+    os.environ["HF_TOKEN"] = "abc"
+    os.environ["GITHUB_TOKEN"] = "abc123"
+
+    record = logging.LogRecord(
+        name="test",
+        level=logging.INFO,
+        pathname="test.py",
+        lineno=1,
+        msg="token=%s",
+        args=("abc123",),
+        exc_info=None,
+    )
+
+    RedactingFilter().filter(record)
+
+    assert record.getMessage() == "token=[REDACTED]"
+    assert record.message == "token=[REDACTED]"
+
+    del os.environ["HF_TOKEN"]
+    del os.environ["GITHUB_TOKEN"]
+
+
+def test_redactor_snapshots_until_refresh():
+    """Secret values are read once and only re-read on refresh()."""
+    os.environ["HF_TOKEN"] = "first_secret"
+    redactor = SecretRedactor()
+    os.environ["HF_TOKEN"] = "second_secret"
+
+    assert redactor.redact("first_secret second_secret") == "[REDACTED] second_secret"
+
+    redactor.refresh()
+    assert redactor.redact("first_secret second_secret") == "first_secret [REDACTED]"
+
+    del os.environ["HF_TOKEN"]
+
+
+def test_configure_logging_redacts_child_loggers():
+    """Records from child loggers should be redacted at the handler."""
+    os.environ["HF_TOKEN"] = "child_secret_value"
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+    try:
+        configure_logging("INFO")
+        handler = root.handlers[0]
+        stream = io.StringIO()
+        handler.setStream(stream)  # type: ignore[attr-defined]
+
+        logging.getLogger("app.child").info("using %s", "child_secret_value")
+
+        assert "child_secret_value" not in stream.getvalue()
+        assert "[REDACTED]" in stream.getvalue()
+    finally:
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        del os.environ["HF_TOKEN"]
+
+
+def test_configure_logging_redacts_a_preconfigured_root_logger():
+    """An already configured root logger keeps its handlers, which still redact."""
+    os.environ["HF_TOKEN"] = "supersecret_value_123"
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+    stream = io.StringIO()
+    try:
+        logging.basicConfig(stream=stream)
+        configure_logging("INFO")
+        configure_logging("INFO")  # reconfiguring doesn't stack filters
+
+        assert len(root.handlers) == 1
+        assert len(root.handlers[0].filters) == 1
+        logging.getLogger("x").warning("token=%s", "supersecret_value_123")
+
+        assert "supersecret_value_123" not in stream.getvalue()
+        assert "token=[REDACTED]" in stream.getvalue()
+    finally:
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        del os.environ["HF_TOKEN"]
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import gc
+import io
+import logging
+import os
+import threading
+
+import pytest
+
+from app.logging_config import LOG_RECORDS, LOG_REDACTIONS, configure_logging
+from app.metrics import MetricsRegistry, _Metric
+
+
+def test_counter_increments_are_thread_safe():
+    """Concurrent increments from many threads should not be lost."""
+    counter = MetricsRegistry().counter("hits_total", "hits")
+
+    def work() -> None:
+        for _ in range(10_000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert counter.value == 80_000
+
+
+def test_exited_threads_fold_into_one_cell():
+    """Cells of collected threads are folded away without losing their counts."""
+    histogram = MetricsRegistry().histogram("latency_seconds", "latency", buckets=(1.0,))
+
+    for _ in range(50):
+        t = threading.Thread(target=histogram.observe, args=(0.5,))
+        t.start()
+        t.join()
+        del t
+    gc.collect()
+
+    assert len(histogram._cells._cells) == 0
+    assert (histogram.count, histogram.sum) == (50, 25.0)
+    histogram.observe(2.0)
+    assert (histogram.count, histogram.sum) == (51, 27.0)
+
+
+def test_metric_base_requires_sample_rendering():
+    """A metric type that can't render its samples can't be instantiated."""
+
+    class Incomplete(_Metric):
+        type_name = "untyped"
+
+    with pytest.raises(TypeError, match="_render_samples"):
+        Incomplete("x", "x")  # type: ignore[abstract]
+
+
+def test_render_prometheus_text(tmp_path):
+    """render() should produce Prometheus text exposition for every metric type."""
+    reg = MetricsRegistry()
+    reg.counter("requests_total", "Requests", ["method"]).labels(method="GET").inc(3)
+    reg.gauge("queue_depth", "Depth").set(7)
+    hist = reg.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    hist.observe(0.05)
+    hist.observe(2.0)
+
+    text = reg.render()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{method="GET"} 3' in text
+    assert "queue_depth 7" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "latency_seconds_count 2" in text
+
+    out = tmp_path / "metrics.prom"
+    reg.write_textfile(out)
+    assert out.read_text() == text
+
+
+def test_configure_logging_feeds_metrics():
+    """The configured pipeline should count records per level and redaction hits."""
+    os.environ["HF_TOKEN"] = "metrics_secret_value"
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+    warnings_before = LOG_RECORDS.labels(level="WARNING").value
+    redactions_before = LOG_REDACTIONS.value
+    try:
+        configure_logging("INFO")
+        root.handlers[0].setStream(io.StringIO())  # type: ignore[attr-defined]
+
+        log = logging.getLogger("app.metrics_test")
+        log.warning("token %s", "metrics_secret_value")
+        log.warning("no secret here")
+
+        assert LOG_RECORDS.labels(level="WARNING").value - warnings_before == 2
+        assert LOG_REDACTIONS.value - redactions_before == 1
+    finally:
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        del os.environ["HF_TOKEN"]
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPTS = Path(".ops/scripts").resolve()
+
+
+def _load(name: str):
+    spec = importlib.util.spec_from_file_location(name, SCRIPTS / f"{name}.py")
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+record_failure = _load("record_failure")
+kb_similarity = _load("kb_similarity")
+
+FAILURE = """\
+2024-05-01T12:00:01.123Z worker[4242] starting job
+Traceback (most recent call last):
+  File "/tmp/pytest-of-dev/pytest-7/test_x0/app.py", line 42, in run
+    handler(obj)
+  File "src/app/handler.py", line 17, in handler
+    raise ValueError(f"bad object {obj!r}")
+ValueError: bad object <Thing object at 0x7f3a2b1c4d90> (pid=4242)
+"""
+
+RERUN = """\
+2024-06-11T08:30:59.999Z worker[9981] starting job
+Traceback (most recent call last):
+  File "/tmp/pytest-of-dev/pytest-12/test_x0/app.py", line 44, in run
+    handler(obj)
+  File "src/app/handler.py", line 19, in handler
+    raise ValueError(f"bad object {obj!r}")
+ValueError: bad object <Thing object at 0x7f99aa00bb10> (pid=9981)
+"""
+
+
+def test_signature_ignores_volatile_tokens():
+    """Timestamps, PIDs, temp paths, addresses and line numbers don't change the signature."""
+    assert record_failure.signature_from_text(FAILURE) == record_failure.signature_from_text(RERUN)
+    other = FAILURE.replace("ValueError", "KeyError")
+    assert record_failure.signature_from_text(FAILURE) != record_failure.signature_from_text(other)
+
+    norm = kb_similarity.normalize_text(FAILURE)
+    for volatile in ("2024-05-01", "4242", "/tmp/", "0x7f3a", "line 42", "line 17"):
+        assert volatile not in norm
+
+
+def test_similarity_index_returns_top_k_near_duplicates(tmp_path):
+    """LSH query finds near-duplicates ranked by estimated similarity, not unrelated cases."""
+    base = "\n".join(f"step {i}: loading module part_{i} from cache" for i in range(60))
+    near = base.replace("step 5:", "step 5 (retry):") + "\nConnectionError: reset by peer"
+    unrelated = "\n".join(f"compiling crate dep_{i} v0.{i}.0" for i in range(60))
+
+    with kb_similarity.SimilarityIndex(tmp_path / "kb.sqlite3") as index:
+        for sig, text in [("base", base), ("near", near), ("unrelated", unrelated)]:
+            index.add(sig, kb_similarity.minhash(kb_similarity.normalize_text(text)))
+        assert len(index) == 3
+
+        query = kb_similarity.minhash(kb_similarity.normalize_text(base + "\nexit 1"))
+        results = index.query(query, k=2)
+
+    assert [sig for sig, _ in results] == ["base", "near"]
+    assert results[0][1] >= results[1][1] > 0.5
+
+
+def test_record_failure_reports_similar_cases(tmp_path):
+    """Recording a near-duplicate prints the earlier case with its score."""
+    first = tmp_path / "first.txt"
+    second = tmp_path / "second.txt"
+    first.write_text(FAILURE, encoding="utf-8")
+    second.write_text(FAILURE + "During handling, another exception occurred\n", encoding="utf-8")
+
+    def record(path: Path) -> subprocess.CompletedProcess[str]:
+        return subprocess.run(
+            [sys.executable, str(SCRIPTS / "record_failure.py"), str(path)],
+            capture_output=True,
+            text=True,
+            cwd=tmp_path,
+        )
+
+    out1 = record(first)
+    assert out1.returncode == 0, out1.stderr
+    assert "Similar cases" not in out1.stdout
+
+    out2 = record(second)
+    assert out2.returncode == 0, out2.stderr
+    first_sig = record_failure.signature_from_text(FAILURE)
+    assert "Similar cases:" in out2.stdout
+    assert first_sig in out2.stdout.split("Similar cases:")[1]
+    assert (tmp_path / ".ops/error_kb/kb_index.sqlite3").exists()
+
+
+def test_record_failure_keeps_notes_and_counts_occurrences(tmp_path):
+    """A repeat failure bumps the count, keeps filled-in notes and reports env changes."""
+    log = tmp_path / "failure.txt"
+    log.write_text(FAILURE, encoding="utf-8")
+    fingerprint = tmp_path / "env.txt"
+    fingerprint.write_text("python_version: 3.11\n", encoding="utf-8")
+    cmd = [
+        sys.executable,
+        str(SCRIPTS / "record_failure.py"),
+        str(log),
+        "--env-fingerprint",
+        str(fingerprint),
+    ]
+
+    subprocess.run(cmd, check=True, capture_output=True, cwd=tmp_path)
+    sig = record_failure.signature_from_text(FAILURE)
+    root_cause = tmp_path / ".ops/error_kb/cases" / sig / "root_cause.md"
+    root_cause.write_text("# Root Cause\n\nStale cache entry.\n", encoding="utf-8")
+
+    log.write_text(RERUN, encoding="utf-8")
+    fingerprint.write_text('{"python_version": "3.12"}\n', encoding="utf-8")
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=tmp_path)
+
+    assert "(occurrence 2," in out.stdout
+    assert "Environment changed since the previous occurrence:" in out.stdout
+    assert "python_version: 3.11 -> 3.12" in out.stdout
+    assert "Stale cache entry." in root_cause.read_text(encoding="utf-8")
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+import io
+import logging
 import os
+from dataclasses import FrozenInstanceError
 
 import pytest
 
-from app.settings import Settings
+from app.logging_config import configure_logging
+from app.settings import (
+    Settings,
+    SettingsReloader,
+    get_settings,
+    invalidate_settings,
+    subscribe,
+)
 
 
 def test_settings_loads_without_secrets():
@@ -107,3 +117,130 @@ def test_settings_all_fields_accessible():
     assert hasattr(s, "namesilo_account_url")
     assert hasattr(s, "namesilo_site_builder_url")
 
+
+
+def test_settings_groups_load_lazily():
+    """A group should read its env vars on first access, then stay fixed."""
+    os.environ["DO_PG_HOST"] = "first.example"
+    s = Settings.load()
+    os.environ["DO_PG_HOST"] = "second.example"
+
+    assert s.do_pg_host == "second.example"
+    os.environ["DO_PG_HOST"] = "third.example"
+    assert s.do_pg_host == "second.example"
+    assert s.do_pg.host == "second.example"
+
+    del os.environ["DO_PG_HOST"]
+
+
+def test_settings_are_immutable_and_slotted():
+    """Settings instances should reject assignment and have no __dict__."""
+    s = Settings.load()
+
+    with pytest.raises(FrozenInstanceError):
+        s.app_env = "prod"  # type: ignore[misc]
+    assert not hasattr(s, "__dict__")
+
+
+def test_settings_accepts_flat_field_keywords():
+    """Constructing with flat field names should keep working."""
+    s = Settings(app_env="test", postgres_port=5433, hf_token="tok")
+
+    assert s.app_env == "test"
+    assert s.postgres_port == 5433
+    assert s.require_hf_token() == "tok"
+    assert s.do_pg_host is None
+
+
+def test_settings_hash_matches_equality():
+    """Equal Settings hash alike, so they work as dict keys and with lru_cache."""
+    a = Settings(app_env="test", postgres_port=5433)
+    b = Settings(app_env="test", postgres_port=5433)
+    c = Settings(app_env="test", postgres_port=5434)
+
+    assert a == b and hash(a) == hash(b)
+    assert len({a, b, c}) == 2
+    assert hash(get_settings()) == hash(get_settings())
+
+
+def test_get_settings_memoizes_until_invalidated():
+    """get_settings() should return one instance until invalidate_settings()."""
+    invalidate_settings()
+    first = get_settings()
+    assert get_settings() is first
+
+    invalidate_settings()
+    assert get_settings() is not first
+    invalidate_settings()
+
+
+def test_reloader_publishes_new_snapshot_on_file_change(tmp_path):
+    """Changing a .env layer file should swap the published Settings and notify."""
+    env_file = tmp_path / ".env"
+    env_file.write_text("DO_PG_PASSWORD=old-password\n")
+    invalidate_settings()
+    reloader = SettingsReloader(tmp_path, interval=3600)
+    notified: list[tuple[Settings | None, Settings]] = []
+    unsubscribe = subscribe(lambda old, new: notified.append((old, new)))
+    try:
+        assert reloader.check() is False
+
+        env_file.write_text("DO_PG_PASSWORD=new-password-rotated\n")
+        assert reloader.check() is True
+
+        current = get_settings()
+        assert current.do_pg_password == "new-password-rotated"
+        assert notified == [(notified[0][0], current)]
+        assert reloader.check() is False
+    finally:
+        unsubscribe()
+        invalidate_settings()
+
+
+def test_reloader_catches_a_write_that_lands_during_reload(tmp_path, monkeypatch):
+    """An edit made while a reload is reading the files is picked up by the next check."""
+    env_file = tmp_path / ".env"
+    env_file.write_text("DO_PG_PASSWORD=first\n")
+    invalidate_settings()
+    reloader = SettingsReloader(tmp_path, interval=3600)
+    reload = reloader.reload
+
+    def reload_then_edit() -> Settings:
+        new = reload()
+        env_file.write_text("DO_PG_PASSWORD=third-and-longer\n")
+        return new
+
+    try:
+        env_file.write_text("DO_PG_PASSWORD=second\n")
+        monkeypatch.setattr(reloader, "reload", reload_then_edit)
+        assert reloader.check() is True
+        assert get_settings().do_pg_password == "second"
+
+        monkeypatch.setattr(reloader, "reload", reload)
+        assert reloader.check() is True
+        assert get_settings().do_pg_password == "third-and-longer"
+        assert reloader.check() is False
+    finally:
+        invalidate_settings()
+
+
+def test_reload_refreshes_configured_redaction(tmp_path, monkeypatch):
+    """A published snapshot should update the secrets configure_logging redacts."""
+    monkeypatch.chdir(tmp_path)
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+    try:
+        configure_logging("INFO")
+        stream = io.StringIO()
+        root.handlers[0].setStream(stream)  # type: ignore[attr-defined]
+
+        (tmp_path / ".env").write_text("GITHUB_TOKEN=rotated-token-value\n")
+        SettingsReloader(tmp_path).reload()
+        logging.getLogger("app.reload").warning("token rotated-token-value")
+
+        assert "rotated-token-value" not in stream.getvalue()
+    finally:
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+        invalidate_settings()
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.settings import Settings
+from app.ssh_runner import MAX_LINE_CHARS, SSHRunner, SSHTarget, _pump, targets_from_settings
+
+LAN = SSHTarget("lan.example", 22, "ops")
+TAILNET = SSHTarget("box.tailnet.ts.net", 22, "ops")
+
+
+class FakeSession:
+    def __init__(self, transport: FakeTransport, target: SSHTarget) -> None:
+        self.transport = transport
+        self.target = target
+        self.closed = False
+
+    async def execute(self, command, on_line):
+        t = self.transport
+        t.running += 1
+        t.peak = max(t.peak, t.running)
+        try:
+            if self.target in t.drop_on_execute:
+                t.drop_on_execute.discard(self.target)
+                raise ConnectionError("session lost")
+            for i in range(3):
+                on_line("stdout", f"{command}:{i}")
+                await asyncio.sleep(0.001)
+            on_line("stderr", f"{command}:done")
+            return 1 if command == "false" else 0
+        finally:
+            t.running -= 1
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeTransport:
+    """In-process transport with configurable latency and failures per target."""
+
+    def __init__(self, latency: dict[SSHTarget, float | None]) -> None:
+        self.latency = latency
+        self.refuse_open: set[SSHTarget] = set()
+        self.drop_on_execute: set[SSHTarget] = set()
+        self.opened: list[SSHTarget] = []
+        self.running = 0
+        self.peak = 0
+
+    async def probe(self, target):
+        latency = self.latency.get(target)
+        if latency is None:
+            raise ConnectionRefusedError(f"{target} unreachable")
+        await asyncio.sleep(latency)
+        return latency
+
+    async def open(self, target):
+        if target in self.refuse_open:
+            raise ConnectionError("handshake failed")
+        self.opened.append(target)
+        return FakeSession(self, target)
+
+
+def test_runner_reuses_one_session_and_bounds_parallelism():
+    """A batch shares one session, runs at most max_parallel commands at once and streams lines."""
+    transport = FakeTransport({LAN: 0.001, TAILNET: 0.02})
+    lines = []
+
+    async def main():
+        async with SSHRunner([LAN, TAILNET], transport, max_parallel=3) as runner:
+            return await runner.run_batch(
+                [f"cmd{i}" for i in range(10)] + ["false"], on_output=lines.append
+            )
+
+    results = asyncio.run(main())
+    assert transport.opened == [LAN]
+    assert transport.peak == 3
+    assert [r.command for r in results][:2] == ["cmd0", "cmd1"]
+    assert results[-1].exit_code == 1 and not results[-1].ok
+    assert all(r.target == LAN for r in results)
+    assert len(lines) == 11 * 4
+    assert {line.stream for line in lines} == {"stdout", "stderr"}
+
+
+def test_runner_prefers_lowest_latency_target():
+    """The fastest reachable target is used; unreachable ones are skipped."""
+    transport = FakeTransport({LAN: None, TAILNET: 0.001})
+
+    async def main():
+        async with SSHRunner([LAN, TAILNET], transport) as runner:
+            result = await runner.run("uptime")
+            return result, runner.latencies
+
+    result, latencies = asyncio.run(main())
+    assert result.target == TAILNET
+    assert set(latencies) == {TAILNET}
+
+
+def test_runner_fails_over_when_open_or_session_fails():
+    """Handshake failures fail over; a lost session is retried only with retry=True."""
+    transport = FakeTransport({LAN: 0.001, TAILNET: 0.01})
+    transport.refuse_open.add(LAN)
+
+    async def refused():
+        async with SSHRunner([LAN, TAILNET], transport) as runner:
+            return await runner.run("uptime")
+
+    assert asyncio.run(refused()).target == TAILNET
+
+    transport = FakeTransport({LAN: 0.001, TAILNET: 0.01})
+    transport.drop_on_execute.add(LAN)
+
+    async def dropped(retry):
+        async with SSHRunner([LAN, TAILNET], transport) as runner:
+            return await runner.run("uptime", retry=retry)
+
+    with pytest.raises(ConnectionError, match="session lost"):
+        asyncio.run(dropped(retry=False))
+    assert transport.opened == [LAN]
+
+    transport.opened.clear()
+    transport.drop_on_execute.add(LAN)
+    assert asyncio.run(dropped(retry=True)).target == TAILNET
+    assert transport.opened == [LAN, TAILNET]
+
+
+def test_runner_raises_when_no_target_reachable():
+    """With every target down, run() raises ConnectionError naming the failures."""
+    transport = FakeTransport({LAN: None, TAILNET: None})
+
+    async def main():
+        async with SSHRunner([LAN, TAILNET], transport) as runner:
+            await runner.run("uptime")
+
+    with pytest.raises(ConnectionError, match="No Lunaverse SSH target reachable"):
+        asyncio.run(main())
+
+
+def test_pump_splits_long_lines_and_multibyte_chunks():
+    """Lines beyond the StreamReader limit arrive in pieces; split UTF-8 is not mangled."""
+    long_line = "x" * (MAX_LINE_CHARS + 10)
+    data = f"{long_line}\né ✓\r\ntail".encode()
+    lines = []
+
+    async def feed(reader):
+        reader.feed_data(data[: len(long_line)])
+        for i in range(len(long_line), len(data)):  # byte by byte, splitting "é" and "✓"
+            await asyncio.sleep(0)
+            reader.feed_data(data[i : i + 1])
+        reader.feed_eof()
+
+    async def main():
+        reader = asyncio.StreamReader()
+        await asyncio.gather(
+            feed(reader), _pump(reader, "stdout", lambda stream, text: lines.append(text))
+        )
+
+    asyncio.run(main())
+    assert lines == ["x" * MAX_LINE_CHARS, "x" * 10, "é ✓", "tail"]
+
+
+def test_targets_from_settings():
+    """LAN and Tailscale hosts become targets sharing the SSH user and port."""
+    s = Settings(
+        lunaverse_host="lan.example",
+        lunaverse_ssh_tailscale_host="box.tailnet.ts.net",
+        lunaverse_ssh_user="ops",
+    )
+    assert targets_from_settings(s) == [LAN, TAILNET]
+
+    with pytest.raises(RuntimeError, match="LUNAVERSE_HOST"):
+        targets_from_settings(Settings())
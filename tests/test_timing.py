@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import logging
+
+from app import timing
+from app.timing import Histogram, TimingRegistry, timed
+
+
+def test_histogram_percentiles_within_bucket_error():
+    """Percentiles should be close to exact values and clamped to min/max."""
+    h = Histogram()
+    for v in range(1, 10_001):
+        h.observe(v * 1000)
+
+    snap = h.snapshot()
+
+    assert snap["count"] == 10_000
+    assert snap["min"] == 1000 and snap["max"] == 10_000_000
+    assert abs(snap["p50"] - 5_000_000) / 5_000_000 < 0.07
+    assert abs(snap["p99"] - 9_900_000) / 9_900_000 < 0.07
+    assert snap["p99"] <= snap["max"]
+
+
+def test_registry_emits_one_summary_per_region(caplog, monkeypatch):
+    """flush() should log one record per region, then reset."""
+    reg = TimingRegistry(interval=3600)
+    monkeypatch.setattr(timing, "registry", reg)
+    monkeypatch.setattr(timing, "_enabled", True)
+
+    @timed("decorated")
+    def work() -> int:
+        return 42
+
+    for _ in range(5):
+        assert work() == 42
+        with timed("block"):
+            pass
+
+    with caplog.at_level(logging.INFO, logger="app.timing"):
+        assert caplog.records == []
+        reg.flush()
+
+    regions = {r.region: r for r in caplog.records}  # type: ignore[attr-defined]
+    assert set(regions) == {"decorated", "block"}
+    assert regions["block"].count == 5  # type: ignore[attr-defined]
+    assert reg.snapshot()["block"]["count"] == 0
+
+
+def test_disabled_timing_is_noop(monkeypatch):
+    """When disabled, decorating returns the original function untouched."""
+    monkeypatch.setattr(timing, "_enabled", False)
+
+    def work() -> None:
+        return None
+
+    assert timed("off")(work) is work
+    with timed("off"):
+        pass
+    assert "off" not in timing.registry.snapshot()